@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for the payments hot paths.
+
+Runs each case against a throwaway test database built from the configured
+one (the local SQLite file, or DATABASE_URL for Postgres), so it works
+offline and leaves real data alone:
+
+    xendit_callback            one PAID invoice callback, processed inline
+    xendit_callback_duplicate  the same callback again (already PAID)
+    xendit_callback_queued     enqueue-and-ack with XENDIT_WEBHOOK_QUEUE
+    check_payment_status       one poll, status cached
+    check_payment_status_cold  one poll after the cache entry is dropped
+    generate_qr_code_image     data URI for a new QR string
+    generate_test_qris_string
+    user_access_is_valid       UserAccess.is_valid() on a loaded row
+    user_access_cached         payments.cache.get_user_access()
+    access_token_verify        payments.access.verify_token()
+    home_page                  GET / with --packages active packages
+
+Run with:
+    python benchmarks/hot_paths.py --json before.json
+    python benchmarks/hot_paths.py --json after.json --compare before.json
+    DATABASE_URL=postgres://... python benchmarks/hot_paths.py --only xendit_callback,home_page
+
+--compare prints the p50 change per case and exits with status 1 when any
+case is more than --threshold percent slower.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import django
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from payments import cache as payment_cache
+from payments.access import AccessGrant, issue_token, verify_token
+from payments.models import Package, Transaction, UserAccess
+from payments.services import XenditService
+
+
+def measure(fn, repeat, setup=None, warmup=5):
+    # setup(i) prepares the arguments for call i outside the timed section.
+    timings = []
+    for i in range(warmup + repeat):
+        args = setup(i) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = (time.perf_counter() - start) * 1_000_000
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    return {
+        'p50_us': round(statistics.median(timings), 1),
+        'p95_us': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+        'mean_us': round(statistics.fmean(timings), 1),
+        'ops_per_sec': round(1_000_000 / statistics.fmean(timings), 1),
+    }
+
+
+class Fixtures:
+    def __init__(self, packages):
+        self.counter = itertools.count()
+        self.package = Package.objects.create(
+            name='Benchmark Package', description='benchmarks/hot_paths.py', price=50000, duration_days=30
+        )
+        Package.objects.bulk_create([
+            Package(name=f'Package {i}', description='Synthetic package for the home page benchmark',
+                    price=10000 + i, duration_days=30)
+            for i in range(max(packages - 1, 0))
+        ])
+
+    def transaction(self, **fields):
+        n = next(self.counter)
+        return Transaction.objects.create(
+            package=self.package,
+            external_id=f'bench_{n}_{uuid.uuid4().hex[:8]}',
+            invoice_id=f'inv_bench_{n}',
+            session_key=f'bench_session_{n}',
+            amount=self.package.price,
+            **fields
+        )
+
+    def user_access(self):
+        transaction = self.transaction(status='PAID', paid_at=timezone.now())
+        return UserAccess.objects.create(session_key=transaction.session_key, **transaction.access_defaults())
+
+
+def invoice_callback(transaction):
+    return json.dumps({
+        'id': transaction.invoice_id,
+        'external_id': transaction.external_id,
+        'status': 'PAID',
+        'amount': float(transaction.amount),
+        'payment_method': 'BANK_TRANSFER',
+        'paid_at': timezone.now().isoformat(),
+    })
+
+
+def build_cases(fixtures, client, args):
+    service = XenditService()
+    cases = {}
+
+    def post_callback(body):
+        client.post('/callback/xendit/', body, content_type='application/json')
+
+    cases['xendit_callback'] = (post_callback, lambda i: (invoice_callback(fixtures.transaction()),))
+
+    paid = fixtures.transaction()
+    paid_body = invoice_callback(paid)
+    post_callback(paid_body)
+    cases['xendit_callback_duplicate'] = (post_callback, lambda i: (paid_body,))
+
+    def post_queued(body):
+        settings.XENDIT_WEBHOOK_QUEUE = True
+        try:
+            post_callback(body)
+        finally:
+            settings.XENDIT_WEBHOOK_QUEUE = False
+
+    cases['xendit_callback_queued'] = (post_queued, lambda i: (invoice_callback(fixtures.transaction()),))
+
+    # PAID stays cached for PAYMENTS_CACHE_TIMEOUT, so every cached call is a
+    # hit; a PENDING entry would lapse every couple of seconds mid-run.
+    status_url = f'/check-payment/{paid.id}/'
+    cases['check_payment_status'] = (lambda: client.get(status_url), None)
+
+    def drop_status(i):
+        payment_cache.invalidate_transaction(paid.id)
+        return ()
+
+    cases['check_payment_status_cold'] = (lambda: client.get(status_url), drop_status)
+
+    cases['generate_qr_code_image'] = (
+        service.generate_qr_code_image,
+        lambda i: (service.generate_test_qris_string(amount=50000 + i, reference_id=f'bench_{i:08x}'),),
+    )
+    cases['generate_test_qris_string'] = (
+        lambda i: service.generate_test_qris_string(amount=50000 + i, reference_id=f'bench_{i:08x}'),
+        lambda i: (i,),
+    )
+
+    user_access = fixtures.user_access()
+    cases['user_access_is_valid'] = (user_access.is_valid, None)
+    cases['user_access_cached'] = (lambda: payment_cache.get_user_access(user_access.session_key), None)
+
+    token = issue_token(AccessGrant.from_user_access(user_access))
+    cases['access_token_verify'] = (lambda: verify_token(token, user_access.session_key), None)
+
+    cases['home_page'] = (lambda: client.get('/'), None)
+
+    if args.only:
+        unknown = set(args.only) - set(cases)
+        if unknown:
+            raise SystemExit(f"Unknown case(s): {', '.join(sorted(unknown))}")
+        cases = {name: case for name, case in cases.items() if name in args.only}
+    return cases
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n📊 Compared with {baseline_path} ({baseline['meta'].get('commit') or 'unknown commit'})\n")
+    print(f'{"case":<28}{"before µs":>12}{"after µs":>12}{"change":>10}')
+    regressions = []
+    for name, result in results['cases'].items():
+        before = baseline['cases'].get(name)
+        if not before:
+            print(f'{name:<28}{"-":>12}{result["p50_us"]:>12}{"new":>10}')
+            continue
+        change = (result['p50_us'] - before['p50_us']) / before['p50_us'] * 100 if before['p50_us'] else 0
+        flag = ' ⚠️' if change > threshold else ''
+        print(f'{name:<28}{before["p50_us"]:>12}{result["p50_us"]:>12}{change:>+9.1f}%{flag}')
+        if change > threshold:
+            regressions.append(name)
+    if regressions:
+        print(f"\n❌ {len(regressions)} case(s) slower than {threshold:g}%: {', '.join(regressions)}")
+    else:
+        print(f"\n✅ No case slower than {threshold:g}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--packages', type=int, default=20, help='Active packages on the home page')
+    parser.add_argument('--only', type=lambda value: value.split(','), help='Comma-separated case names')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Earlier --json output to compare against')
+    parser.add_argument('--threshold', type=float, default=10, help='Regression threshold in percent')
+    parser.add_argument('--verbose', action='store_true', help='Keep INFO logging from the app')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    setup_test_environment()
+    # Callbacks are benchmarked without the token check and the queue.
+    settings.XENDIT_CALLBACK_TOKEN = ''
+    settings.XENDIT_WEBHOOK_QUEUE = False
+    settings.PAYMENTS_PRECREATE = False
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+
+    try:
+        client = Client()
+        cases = build_cases(Fixtures(args.packages), client, args)
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeat': args.repeat,
+                'packages': args.packages,
+            },
+            'cases': {},
+        }
+
+        print(f"⏱️  {args.repeat} runs per case on {connection.vendor}\n")
+        print(f'{"case":<28}{"p50 µs":>12}{"p95 µs":>12}{"ops/s":>12}')
+        for name, (fn, setup) in cases.items():
+            result = measure(fn, args.repeat, setup)
+            results['cases'][name] = result
+            print(f'{name:<28}{result["p50_us"]:>12}{result["p95_us"]:>12}{result["ops_per_sec"]:>12}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\n📝 Results written to {args.json}')
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+Load test for the checkout funnel against a local fake Xendit.
+
+Each virtual user walks the whole funnel on its own session:
+
+    buy_package -> payment_methods -> process_qr / process_va / process_card
+    -> Xendit callback -> check_payment_status (polled until PAID)
+
+The fake Xendit server (payments.testing.fake_xendit) runs inside this
+process; after a QR or VA is created it is paid on the fake side and the
+matching callback is POSTed to the app, timed as "xendit_callback". Card
+payments are settled synchronously by process_card, so they skip that step.
+
+Start the app against the fake server first, e.g.:
+
+    XENDIT_API_BASE_URL=http://127.0.0.1:8765 XENDIT_CALLBACK_TOKEN=loadtest \\
+        python manage.py runserver --noreload
+
+then run:
+
+    python benchmarks/load_test.py --users 10 --iterations 20 --callback-token loadtest
+    python benchmarks/load_test.py --iterations 0 --duration 60 --mix qr=6,va=3,card=1 --latency-ms 150 --json load.json
+
+Reports p50/p95/p99 latency and requests/sec per endpoint, plus the number of
+funnels that ended PAID.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+
+from payments.testing.fake_xendit import WebhookSender, add_fault_arguments, faults_from_arguments, start_fake_xendit
+
+METHODS = ('qr', 'va', 'card')
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.funnels = defaultdict(int)
+
+    def record(self, endpoint, seconds, ok=True):
+        with self.lock:
+            self.timings[endpoint].append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def funnel(self, outcome):
+        with self.lock:
+            self.funnels[outcome] += 1
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+class VirtualUser:
+    def __init__(self, args, recorder, fake, webhooks):
+        self.args = args
+        self.recorder = recorder
+        self.fake = fake
+        self.webhooks = webhooks
+        self.session = requests.Session()
+
+    def call(self, endpoint, method, path, ok_statuses=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.args.target + path, timeout=self.args.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(endpoint, time.perf_counter() - start, ok=False)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - start, ok=response.status_code in ok_statuses)
+        return response if response.status_code in ok_statuses else None
+
+    def run_funnel(self, method):
+        # A fresh session per funnel, like a new visitor.
+        self.session.cookies.clear()
+        response = self.call('buy_package', 'GET', f'/buy/{self.args.package_id}/', ok_statuses=(302,), allow_redirects=False)
+        match = response and re.search(r'/payment/methods/([0-9a-f-]{36})/', response.headers.get('Location', ''))
+        if not match:
+            return 'failed_buy'
+        transaction_id = match.group(1)
+
+        if not self.call('payment_methods', 'GET', f'/payment/methods/{transaction_id}/'):
+            return 'failed_methods'
+
+        if method == 'qr':
+            data = self._json(self.call('process_qr', 'POST', f'/payment/qr/{transaction_id}/', data={'qr_type': 'QRIS_GENERAL'}))
+            if not data.get('success'):
+                return 'failed_process'
+            callback = self.fake.state.pay_qr_code(data['qr_id'])
+        elif method == 'va':
+            data = self._json(self.call('process_va', 'POST', f'/payment/va/{transaction_id}/', data={'bank_code': 'BCA'}))
+            if not data.get('success'):
+                return 'failed_process'
+            callback = self.fake.state.pay_virtual_account(data['va_number'])
+        else:
+            data = self._json(self.call('process_card', 'POST', f'/payment/card/{transaction_id}/', data={
+                'card_number': '4000000000000010',
+                'exp_month': '12',
+                'exp_year': '2030',
+                'cvn': '123',
+                'card_holder_name': 'Load Test',
+            }))
+            if not data.get('success'):
+                return 'failed_process'
+            callback = None
+
+        if callback is not None:
+            status, seconds = self.webhooks.deliver(callback)
+            self.recorder.record('xendit_callback', seconds, ok=status == 200)
+
+        deadline = time.monotonic() + self.args.settle_timeout
+        while time.monotonic() < deadline:
+            data = self._json(self.call('check_payment_status', 'GET', f'/check-payment/{transaction_id}/'))
+            if data.get('paid'):
+                return 'paid'
+            time.sleep(self.args.poll_interval)
+        return 'not_settled'
+
+    @staticmethod
+    def _json(response):
+        try:
+            return response.json() if response is not None else {}
+        except ValueError:
+            return {}
+
+    def run(self, methods, stop_at):
+        for i in range(self.args.iterations or sys.maxsize):
+            if stop_at and time.monotonic() >= stop_at:
+                break
+            self.recorder.funnel(self.run_funnel(random.choice(methods)))
+
+
+def parse_mix(value):
+    methods = []
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in METHODS:
+            raise argparse.ArgumentTypeError(f'unknown payment method {name!r}')
+        methods.extend([name] * int(weight or 1))
+    return methods
+
+
+def report(recorder, elapsed):
+    endpoints = {}
+    for endpoint, timings in sorted(recorder.timings.items()):
+        timings = sorted(timings)
+        endpoints[endpoint] = {
+            'requests': len(timings),
+            'errors': recorder.errors[endpoint],
+            'rps': round(len(timings) / elapsed, 2),
+            'p50_ms': round(percentile(timings, 50), 1),
+            'p95_ms': round(percentile(timings, 95), 1),
+            'p99_ms': round(percentile(timings, 99), 1),
+        }
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'funnels': dict(recorder.funnels),
+        'endpoints': endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the checkout funnel against a fake Xendit')
+    parser.add_argument('--target', default='http://127.0.0.1:8000', help='Base URL of the running app')
+    parser.add_argument('--package-id', type=int, default=1)
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=10, help='Funnels per user; 0 runs until --duration')
+    parser.add_argument('--duration', type=float, default=0, help='Stop after this many seconds')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('qr=5,va=4,card=1'),
+                        help='Weighted payment methods, e.g. qr=5,va=4,card=1')
+    parser.add_argument('--poll-interval', type=float, default=0.2)
+    parser.add_argument('--settle-timeout', type=float, default=10, help='Give up polling after this many seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout')
+    parser.add_argument('--fake-host', default='127.0.0.1')
+    parser.add_argument('--fake-port', type=int, default=8765, help='Where the app expects XENDIT_API_BASE_URL')
+    parser.add_argument('--callback-token', default='', help="The app's XENDIT_CALLBACK_TOKEN")
+    add_fault_arguments(parser)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    args.target = args.target.rstrip('/')
+    if not args.iterations and not args.duration:
+        parser.error('--iterations 0 needs --duration')
+
+    fake = start_fake_xendit(args.fake_host, args.fake_port, faults=faults_from_arguments(args))
+    webhooks = WebhookSender(f'{args.target}/callback/xendit/', args.callback_token, timeout=args.timeout)
+    print(f"🧪 Fake Xendit on {fake.url}, target {args.target}")
+    print(f"👥 {args.users} user(s), {args.iterations or 'unlimited'} funnel(s) each"
+          + (f", {args.duration:g}s max" if args.duration else ''))
+
+    recorder = Recorder()
+    stop_at = time.monotonic() + args.duration if args.duration else None
+    users = [VirtualUser(args, recorder, fake, webhooks) for _ in range(args.users)]
+    threads = [threading.Thread(target=user.run, args=(args.mix, stop_at)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results = report(recorder, time.perf_counter() - start)
+    fake.shutdown()
+
+    print(f"\n{'endpoint':<22}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, row in results['endpoints'].items():
+        print(f"{endpoint:<22}{row['requests']:>9}{row['errors']:>8}{row['rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+    funnels = results['funnels']
+    print(f"\n✅ {funnels.get('paid', 0)} paid of {sum(funnels.values())} funnel(s) in {results['elapsed_seconds']}s")
+    for outcome, count in sorted(funnels.items()):
+        if outcome != 'paid':
+            print(f"⚠️  {outcome}: {count}")
+    injected = dict(fake.faults.injected)
+    if injected:
+        results['injected_errors'] = injected
+        print(f"💥 Injected Xendit errors: {injected}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
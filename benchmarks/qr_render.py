@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for QR code rendering on the checkout path.
+
+Compares the old inline PNG/base64 data URI (box_size=10) with the
+payments.qr renderers: compact PNG, run-length SVG, and the memoised path
+the qr_code_image view serves from.
+
+Run with:
+    python benchmarks/qr_render.py
+    python benchmarks/qr_render.py --repeat 500 --json qr.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+import django
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
+django.setup()
+
+import qrcode
+
+from payments import qr
+from payments.services import XenditService
+
+
+def legacy_data_uri(qr_string):
+    # The pre-payments.qr implementation of XenditService.generate_qr_code_image.
+    code = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    code.add_data(qr_string)
+    code.make(fit=True)
+    buffered = BytesIO()
+    code.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}".encode()
+
+
+def measure(fn, qr_strings, repeat):
+    timings = []
+    output = b''
+    for i in range(repeat):
+        qr_string = qr_strings[i % len(qr_strings)]
+        start = time.perf_counter()
+        output = fn(qr_string)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return {
+        'p50_us': round(statistics.median(timings), 1),
+        'p95_us': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+        'bytes': len(output),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=50,
+                        help='Distinct QR strings cycled through by the uncached runs')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    service = XenditService()
+    qr_strings = [
+        service.generate_test_qris_string(amount=50000 + i, reference_id=f'payment_{i:08x}_1')
+        for i in range(args.distinct)
+    ]
+
+    cases = {
+        'legacy_png_base64': (lambda s: legacy_data_uri(s), qr_strings),
+        'png_compact': (lambda s: qr._render(s, 'png', 8), qr_strings),
+        'svg': (lambda s: qr._render(s, 'svg', 8), qr_strings),
+        # Retries and page reloads for one transaction hit the same string.
+        'svg_cached': (lambda s: qr.render_qr(s, 'svg'), qr_strings[:1]),
+        'png_cached': (lambda s: qr.render_qr(s, 'png'), qr_strings[:1]),
+    }
+
+    qr.clear_render_cache()
+    results = {'repeat': args.repeat, 'cases': {}}
+    print(f'🔳 {args.repeat} renders per case\n')
+    print(f'{"case":<20}{"p50 µs":>12}{"p95 µs":>12}{"bytes":>10}')
+    for name, (fn, strings) in cases.items():
+        result = measure(fn, strings, args.repeat)
+        results['cases'][name] = result
+        print(f'{name:<20}{result["p50_us"]:>12}{result["p95_us"]:>12}{result["bytes"]:>10}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\n📝 Results written to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+Query plan and latency benchmark for the payment hot paths.
+
+Fills the configured database (DATABASE_URL, or the local SQLite file) with
+synthetic Transaction/UserAccess rows, then prints the query plan and
+p50/p95 latency of each lookup the views, webhooks and sweeps perform.
+
+Run with:
+    python benchmarks/query_plans.py --rows 10000000
+    python benchmarks/query_plans.py --skip-load --json after.json
+
+To compare against the schema without the hot path indexes:
+    python manage.py migrate payments 0005
+    python benchmarks/query_plans.py --skip-load --json before.json
+    python manage.py migrate payments
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+import django
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
+django.setup()
+
+from django.db import connection
+from django.utils import timezone
+
+from payments.models import Package, Transaction, UserAccess
+
+PREFIX = 'bench_'
+STATUSES = ['PAID'] * 70 + ['EXPIRED'] * 25 + ['FAILED'] * 3 + ['PENDING'] * 2
+
+
+def benchmark_package():
+    package, _ = Package.objects.get_or_create(
+        name='Benchmark Package',
+        defaults={'description': 'Synthetic rows for benchmarks/query_plans.py',
+                  'price': 50000, 'duration_days': 30, 'is_active': False}
+    )
+    return package
+
+
+def load_postgres(package, rows):
+    # generate_series keeps a 10M row load to minutes instead of hours.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO payments_transaction (
+                id, package_id, external_id, invoice_id, xendit_qr_id, session_key,
+                amount, status, payment_method, created_at, updated_at, expires_at
+            )
+            SELECT
+                md5(random()::text || g)::uuid,
+                %s,
+                '{PREFIX}' || g,
+                CASE WHEN g %% 4 = 0 THEN 'inv_' || g END,
+                CASE WHEN g %% 3 = 0 THEN 'qr_' || g END,
+                'session_' || (g %% %s),
+                50000,
+                CASE
+                    WHEN g %% 100 < 70 THEN 'PAID'
+                    WHEN g %% 100 < 95 THEN 'EXPIRED'
+                    WHEN g %% 100 < 98 THEN 'FAILED'
+                    ELSE 'PENDING'
+                END,
+                '',
+                now() - (g %% 365) * interval '1 day',
+                now(),
+                now() - (g %% 365) * interval '1 day' + interval '1 day'
+            FROM generate_series(1, %s) AS g
+            """,
+            [package.id, max(rows // 3, 1), rows]
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO payments_useraccess (session_key, package_id, transaction_id, granted_at, expires_at, is_active)
+            SELECT DISTINCT ON (session_key) session_key, package_id, id, created_at, created_at + interval '30 days',
+                   created_at + interval '30 days' > now()
+            FROM payments_transaction
+            WHERE external_id LIKE '{PREFIX}%%' AND status = 'PAID'
+            ORDER BY session_key, created_at DESC
+            ON CONFLICT (session_key) DO NOTHING
+            """
+        )
+        cursor.execute('ANALYZE payments_transaction')
+        cursor.execute('ANALYZE payments_useraccess')
+
+
+def load_generic(package, rows, batch_size):
+    now = timezone.now()
+    sessions = max(rows // 3, 1)
+    for start in range(0, rows, batch_size):
+        batch = []
+        for g in range(start, min(start + batch_size, rows)):
+            created = now - timezone.timedelta(days=g % 365)
+            batch.append(Transaction(
+                id=uuid.uuid4(),
+                package=package,
+                external_id=f'{PREFIX}{g}',
+                invoice_id=f'inv_{g}' if g % 4 == 0 else None,
+                xendit_qr_id=f'qr_{g}' if g % 3 == 0 else None,
+                session_key=f'session_{g % sessions}',
+                amount=50000,
+                status=STATUSES[g % 100],
+                expires_at=created + timezone.timedelta(days=1),
+            ))
+        Transaction.objects.bulk_create(batch, batch_size=batch_size)
+        print(f'   inserted {min(start + batch_size, rows):,} / {rows:,}', end='\r')
+    print()
+
+    accesses = [
+        UserAccess(session_key=t.session_key, package=package, transaction_id=t.id,
+                   expires_at=now + timezone.timedelta(days=30))
+        for t in Transaction.objects.filter(external_id__startswith=PREFIX, status='PAID')
+        .only('id', 'session_key')[:sessions]
+    ]
+    UserAccess.objects.bulk_create(accesses, batch_size=batch_size, ignore_conflicts=True)
+
+
+def hot_queries(rows):
+    now = timezone.now()
+    g = random.randrange(rows)
+    return {
+        'transaction_by_external_id': lambda: Transaction.objects.filter(external_id=f'{PREFIX}{g}'),
+        'transactions_by_session': lambda: Transaction.objects.filter(
+            session_key=f'session_{g % max(rows // 3, 1)}'
+        ).order_by('-created_at')[:10],
+        'pending_expiry_sweep': lambda: Transaction.objects.filter(
+            status='PENDING', expires_at__lt=now
+        ).order_by('expires_at').values_list('id', flat=True)[:1000],
+        'transaction_by_qr_id': lambda: Transaction.objects.filter(xendit_qr_id=f'qr_{g - g % 3}'),
+        'transaction_by_invoice_id': lambda: Transaction.objects.filter(invoice_id=f'inv_{g - g % 4}'),
+        'active_access_by_session': lambda: UserAccess.objects.filter(
+            session_key=f'session_{g % max(rows // 3, 1)}', is_active=True
+        ),
+        'expired_access_sweep': lambda: UserAccess.objects.filter(
+            is_active=True, expires_at__lt=now
+        ).values_list('id', flat=True)[:1000],
+    }
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def measure(build_queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        queryset = build_queryset()
+        start = time.perf_counter()
+        list(queryset)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--batch-size', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--skip-load', action='store_true', help='Reuse rows from a previous run')
+    parser.add_argument('--cleanup', action='store_true', help='Delete the synthetic rows and exit')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    synthetic = Transaction.objects.filter(external_id__startswith=PREFIX)
+
+    if args.cleanup:
+        UserAccess.objects.filter(transaction__external_id__startswith=PREFIX).delete()
+        deleted, _ = synthetic.delete()
+        print(f'🧹 Deleted {deleted:,} synthetic rows')
+        return
+
+    if not args.skip_load:
+        package = benchmark_package()
+        print(f'📦 Loading {args.rows:,} transactions into {connection.vendor}...')
+        start = time.perf_counter()
+        if connection.vendor == 'postgresql':
+            load_postgres(package, args.rows)
+        else:
+            load_generic(package, args.rows, args.batch_size)
+        print(f'   loaded in {time.perf_counter() - start:.1f}s')
+
+    rows = synthetic.count()
+    print(f'\n🔎 {rows:,} synthetic transactions, {args.repeat} runs per query\n')
+
+    results = {'vendor': connection.vendor, 'rows': rows, 'queries': {}}
+    for name, build_queryset in hot_queries(rows).items():
+        plan = explain(build_queryset())
+        timing = measure(lambda: hot_queries(rows)[name](), args.repeat)
+        results['queries'][name] = {'plan': plan, **timing}
+
+        print(f'== {name}: p50 {timing["p50_ms"]} ms, p95 {timing["p95_ms"]} ms')
+        print('   ' + plan.replace('\n', '\n   '))
+        print()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'📝 Results written to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
 
 application = get_asgi_application()
+
+from payments.scheduler import start_sweeper
+
+start_sweeper()
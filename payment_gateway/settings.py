@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,7 +58,9 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'payments.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'payments.access.AccessTokenMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -70,7 +72,7 @@ ROOT_URLCONF = 'payment_gateway.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'payments.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -108,6 +110,37 @@ else:
     }
 
 
+# Cache
+# Local memory by default so no external service is needed. Local memory is
+# per worker process; point CACHE_BACKEND at FileBasedCache (or Redis) to share
+# entries and invalidations between gunicorn workers.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='simple-payment'),
+    },
+    # cached_db sessions; a miss falls through to the database, so a
+    # per-worker cache is still correct
+    'sessions': {
+        'BACKEND': config('SESSION_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('SESSION_CACHE_LOCATION', default='simple-payment-sessions'),
+    },
+}
+
+# Session storage: db (a session SELECT per request that reads the session),
+# cached_db (reads served from the 'sessions' cache, writes go to both), or
+# signed_cookies (no server-side storage; payment rows are keyed by an id kept
+# in the cookie, see payments/sessions.py)
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+PAYMENTS_SESSION_MODE = config('PAYMENTS_SESSION_MODE', default='db')
+SESSION_ENGINE = SESSION_ENGINES[PAYMENTS_SESSION_MODE]
+SESSION_CACHE_ALIAS = 'sessions'
+PAYMENTS_SESSION_CLEANUP_BATCH_SIZE = config('PAYMENTS_SESSION_CLEANUP_BATCH_SIZE', default=1000, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -161,6 +194,113 @@ XENDIT_SECRET_KEY = config('XENDIT_SECRET_KEY', default='')
 XENDIT_PUBLIC_KEY = config('XENDIT_PUBLIC_KEY', default='')
 XENDIT_CALLBACK_TOKEN = config('XENDIT_CALLBACK_TOKEN', default='')
 APP_URL = config('APP_URL', default='http://localhost:8000')
+XENDIT_API_BASE_URL = config('XENDIT_API_BASE_URL', default='https://api.xendit.co')
+
+# Outbound HTTP pool for Xendit calls (one keep-alive pool per worker process)
+XENDIT_POOL_SIZE = config('XENDIT_POOL_SIZE', default=10, cast=int)
+XENDIT_POOL_BLOCK = config('XENDIT_POOL_BLOCK', default=False, cast=bool)
+XENDIT_CONNECT_TIMEOUT = config('XENDIT_CONNECT_TIMEOUT', default=5, cast=float)
+XENDIT_READ_TIMEOUT = config('XENDIT_READ_TIMEOUT', default=30, cast=float)
+
+# Per-endpoint circuit breakers and bulkheads (payments/resilience.py)
+XENDIT_BREAKER_FAILURE_THRESHOLD = config('XENDIT_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+XENDIT_BREAKER_RECOVERY_SECONDS = config('XENDIT_BREAKER_RECOVERY_SECONDS', default=30, cast=float)
+XENDIT_BREAKER_HALF_OPEN_CALLS = config('XENDIT_BREAKER_HALF_OPEN_CALLS', default=1, cast=int)
+XENDIT_BULKHEAD_SIZE = config('XENDIT_BULKHEAD_SIZE', default=10, cast=int)
+XENDIT_BULKHEAD_WAIT = config('XENDIT_BULKHEAD_WAIT', default=0.5, cast=float)
+# e.g. "card=4,qr_code=20" to override XENDIT_BULKHEAD_SIZE per endpoint group
+XENDIT_BULKHEAD_LIMITS = {
+    name.strip(): int(limit)
+    for name, limit in (item.split('=') for item in config('XENDIT_BULKHEAD_LIMITS', default='', cast=Csv()))
+}
+
+# Retries for Xendit GETs and idempotency-keyed writes (VA, invoice, card charge)
+XENDIT_RETRY_MAX_ATTEMPTS = config('XENDIT_RETRY_MAX_ATTEMPTS', default=3, cast=int)
+XENDIT_RETRY_BASE_DELAY = config('XENDIT_RETRY_BASE_DELAY', default=0.2, cast=float)
+XENDIT_RETRY_MAX_DELAY = config('XENDIT_RETRY_MAX_DELAY', default=2.0, cast=float)
+XENDIT_RETRY_DEADLINE = config('XENDIT_RETRY_DEADLINE', default=15.0, cast=float)
+
+# Identical concurrent Xendit GETs share one request; successful responses are
+# reused for this many seconds (0 = coalesce only)
+XENDIT_READ_CACHE_TTL = config('XENDIT_READ_CACHE_TTL', default=2.0, cast=float)
+
+# Async mode: serve VA/QR/card creation with async views + AsyncXenditService.
+# Only worth enabling when running under ASGI (see README "Deployment").
+PAYMENTS_ASYNC_VIEWS = config('PAYMENTS_ASYNC_VIEWS', default=False, cast=bool)
+XENDIT_ASYNC_POOL_SIZE = config('XENDIT_ASYNC_POOL_SIZE', default=100, cast=int)
+
+# Webhook ingestion. With XENDIT_WEBHOOK_QUEUE enabled the callback view only
+# verifies the token and stores the raw body; run `manage.py process_webhooks`
+# alongside the web process to apply queued events.
+XENDIT_WEBHOOK_QUEUE = config('XENDIT_WEBHOOK_QUEUE', default=False, cast=bool)
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=50, cast=int)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=8, cast=int)
+WEBHOOK_RETRY_BASE_SECONDS = config('WEBHOOK_RETRY_BASE_SECONDS', default=5, cast=int)
+WEBHOOK_RETRY_MAX_SECONDS = config('WEBHOOK_RETRY_MAX_SECONDS', default=600, cast=int)
+WEBHOOK_LEASE_SECONDS = config('WEBHOOK_LEASE_SECONDS', default=300, cast=int)
+
+# Read-through cache for the status/access polling endpoints; final answers
+# are kept for PAYMENTS_CACHE_TIMEOUT, other statuses for ..._PENDING_TIMEOUT
+# (0 disables) and unknown ids for ..._NEGATIVE_TIMEOUT
+PAYMENTS_CACHE_ALIAS = config('PAYMENTS_CACHE_ALIAS', default='default')
+PAYMENTS_CACHE_TIMEOUT = config('PAYMENTS_CACHE_TIMEOUT', default=300, cast=int)
+PAYMENTS_CACHE_PENDING_TIMEOUT = config('PAYMENTS_CACHE_PENDING_TIMEOUT', default=2, cast=int)
+PAYMENTS_CACHE_NEGATIVE_TIMEOUT = config('PAYMENTS_CACHE_NEGATIVE_TIMEOUT', default=5, cast=int)
+
+# Push payment status to checkout pages over Server-Sent Events instead of
+# 3-second polling. Each open stream holds a connection, so this needs ASGI.
+PAYMENTS_EVENT_STREAM = config('PAYMENTS_EVENT_STREAM', default=PAYMENTS_ASYNC_VIEWS, cast=bool)
+PAYMENTS_EVENT_STREAM_RESYNC = config('PAYMENTS_EVENT_STREAM_RESYNC', default=30, cast=int)
+PAYMENTS_EVENT_STREAM_MAX_AGE = config('PAYMENTS_EVENT_STREAM_MAX_AGE', default=600, cast=int)
+
+# Expiry sweeper: `manage.py sweep_expired`, or in-process every N seconds when > 0
+PAYMENTS_SWEEP_INTERVAL = config('PAYMENTS_SWEEP_INTERVAL', default=0, cast=int)
+PAYMENTS_SWEEP_CHUNK_SIZE = config('PAYMENTS_SWEEP_CHUNK_SIZE', default=1000, cast=int)
+
+# Archival of settled transactions into TransactionArchive (`manage.py archive_transactions`)
+PAYMENTS_ARCHIVE_AFTER_DAYS = config('PAYMENTS_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+PAYMENTS_ARCHIVE_BATCH_SIZE = config('PAYMENTS_ARCHIVE_BATCH_SIZE', default=500, cast=int)
+
+# Signed premium-access cookies, re-issued from the database at least this
+# often; revocations are re-read from the database every ..._DENYLIST_SYNC seconds
+PAYMENTS_ACCESS_COOKIE_NAME = config('PAYMENTS_ACCESS_COOKIE_NAME', default='premium_access')
+PAYMENTS_ACCESS_TOKEN_MAX_AGE = config('PAYMENTS_ACCESS_TOKEN_MAX_AGE', default=86400, cast=int)
+PAYMENTS_ACCESS_DENYLIST_SYNC = config('PAYMENTS_ACCESS_DENYLIST_SYNC', default=30, cast=int)
+
+# Per-view request, DB, Xendit and template metrics served at /metrics/ in
+# Prometheus format (bearer PAYMENTS_METRICS_TOKEN, or DEBUG/staff); set
+# PAYMENTS_METRICS_DIR to aggregate gunicorn workers
+PAYMENTS_METRICS = config('PAYMENTS_METRICS', default=True, cast=bool)
+PAYMENTS_METRICS_TOKEN = config('PAYMENTS_METRICS_TOKEN', default='')
+PAYMENTS_METRICS_DIR = config('PAYMENTS_METRICS_DIR', default='')
+PAYMENTS_METRICS_FLUSH_INTERVAL = config('PAYMENTS_METRICS_FLUSH_INTERVAL', default=1, cast=float)
+
+# Reconciliation of PENDING transactions against Xendit (`manage.py reconcile_payments`)
+RECONCILE_BATCH_SIZE = config('RECONCILE_BATCH_SIZE', default=200, cast=int)
+RECONCILE_MAX_WORKERS = config('RECONCILE_MAX_WORKERS', default=8, cast=int)
+RECONCILE_RATE_LIMIT = config('RECONCILE_RATE_LIMIT', default=10, cast=float)
+RECONCILE_MIN_AGE_SECONDS = config('RECONCILE_MIN_AGE_SECONDS', default=60, cast=int)
+
+# Payment method catalog: bank list refreshed from Xendit in the background
+PAYMENT_CATALOG_REMOTE = config('PAYMENT_CATALOG_REMOTE', default=True, cast=bool)
+PAYMENT_CATALOG_TTL = config('PAYMENT_CATALOG_TTL', default=3600, cast=int)
+
+# Payment instruments: serve a VA/QR already created for the transaction while
+# it stays valid this long, cap how long a request creating one may hold the
+# transaction's lease (0 derives it from the Xendit timeouts) and how long a
+# concurrent request waits for it, and optionally pre-create the popular ones
+# ("QR:<qr type>" / "VA:<bank code>") right after checkout starts
+PAYMENTS_INSTRUMENT_MIN_VALIDITY = config('PAYMENTS_INSTRUMENT_MIN_VALIDITY', default=300, cast=int)
+PAYMENTS_INSTRUMENT_LOCK_TIMEOUT = config('PAYMENTS_INSTRUMENT_LOCK_TIMEOUT', default=0, cast=int)
+PAYMENTS_INSTRUMENT_WAIT = config('PAYMENTS_INSTRUMENT_WAIT', default=15, cast=float)
+PAYMENTS_PRECREATE = config('PAYMENTS_PRECREATE', default=False, cast=bool)
+PAYMENTS_PRECREATE_METHODS = config('PAYMENTS_PRECREATE_METHODS', default='QR:QRIS_GENERAL,VA:BCA', cast=Csv())
+PAYMENTS_PRECREATE_WORKERS = config('PAYMENTS_PRECREATE_WORKERS', default=4, cast=int)
+
+# QR images for /payment/qr/<id>/image/ (png, or svg which gzips better), memoised per process
+QR_IMAGE_FORMAT = config('QR_IMAGE_FORMAT', default='png')
+QR_IMAGE_SCALE = config('QR_IMAGE_SCALE', default=8, cast=int)
+QR_IMAGE_CACHE_SIZE = config('QR_IMAGE_CACHE_SIZE', default=512, cast=int)
 
 # Enhanced test mode configuration for production demo
 XENDIT_TEST_MODE = config('XENDIT_TEST_MODE', default=True, cast=bool)
@@ -189,20 +329,44 @@ if not DEBUG:
 # CSRF Settings for webhook
 CSRF_TRUSTED_ORIGINS = ['https://gateway.xendit.co']
 
-# Logging configuration
+# Logging configuration: PAYMENTS_LOG_FORMAT=json writes one JSON object per
+# line; with PAYMENTS_LOG_QUEUE the console is written from a background
+# thread (records are dropped, not waited on, past PAYMENTS_LOG_QUEUE_SIZE);
+# PAYMENTS_LOG_SAMPLE_RATE keeps that share of duplicate, ignored and waiting
+# callbacks and of QR codes served
+PAYMENTS_LOG_FORMAT = config('PAYMENTS_LOG_FORMAT', default='text')
+PAYMENTS_LOG_LEVEL = config('PAYMENTS_LOG_LEVEL', default='INFO')
+PAYMENTS_LOG_QUEUE = config('PAYMENTS_LOG_QUEUE', default=True, cast=bool)
+PAYMENTS_LOG_QUEUE_SIZE = config('PAYMENTS_LOG_QUEUE_SIZE', default=10000, cast=int)
+PAYMENTS_LOG_SAMPLE_RATE = config('PAYMENTS_LOG_SAMPLE_RATE', default=1.0, cast=float)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'text': {
+            'format': '%(message)s',
+        },
+        'json': {
+            '()': 'payments.log.JsonFormatter',
+        },
+    },
     'handlers': {
         'console': {
-            'level': 'INFO',
-            'class': 'logging.StreamHandler',
+            'level': PAYMENTS_LOG_LEVEL,
+            'formatter': PAYMENTS_LOG_FORMAT,
+            **({
+                'class': 'payments.log.QueueingHandler',
+                'queue_size': PAYMENTS_LOG_QUEUE_SIZE,
+            } if PAYMENTS_LOG_QUEUE else {
+                'class': 'logging.StreamHandler',
+            }),
         },
     },
     'loggers': {
         'payments': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': PAYMENTS_LOG_LEVEL,
             'propagate': True,
         },
     },
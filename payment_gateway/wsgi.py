@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
 
 application = get_wsgi_application()
+
+from payments.scheduler import start_sweeper
+
+start_sweeper()
@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import RevokedAccess, UserAccess
+from .sessions import payment_session_key
+
+# Signed access tokens for premium content. The first page view that finds a
+# valid UserAccess issues a cookie signed with SECRET_KEY over the session
+# key, package and expiry; after that, page views are authorised from the
+# cookie alone, without a database or cache lookup. Tokens are bound to the
+# session key and live at most PAYMENTS_ACCESS_TOKEN_MAX_AGE seconds.
+#
+# Any change to a session's UserAccess (renewal, deactivation, deletion)
+# records a RevokedAccess row; each process keeps the recent ones in memory,
+# re-read every PAYMENTS_ACCESS_DENYLIST_SYNC seconds, and rejects tokens
+# issued before the revocation so they are re-issued from the database.
+
+SALT = 'payments.access-token'
+
+AccessPackage = namedtuple('AccessPackage', ['id', 'name', 'duration_days'])
+
+
+def _max_age():
+    return getattr(settings, 'PAYMENTS_ACCESS_TOKEN_MAX_AGE', 86400)
+
+
+def cookie_name():
+    return getattr(settings, 'PAYMENTS_ACCESS_COOKIE_NAME', 'premium_access')
+
+
+class AccessGrant:
+    # Read-only stand-in for UserAccess in views and templates.
+    def __init__(self, session_key, package, granted_at, expires_at, issued_at=None):
+        self.session_key = session_key
+        self.package = package
+        self.granted_at = granted_at
+        self.expires_at = expires_at
+        self.issued_at = issued_at if issued_at is not None else time.time()
+
+    @classmethod
+    def from_user_access(cls, user_access, issued_at=None):
+        package = user_access.package
+        return cls(
+            user_access.session_key,
+            AccessPackage(package.id, package.name, package.duration_days),
+            user_access.granted_at,
+            user_access.expires_at,
+            issued_at=issued_at,
+        )
+
+    def is_valid(self):
+        return timezone.now() <= self.expires_at
+
+
+def _datetime(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
+def issue_token(grant):
+    return signing.dumps({
+        's': grant.session_key,
+        'p': list(grant.package),
+        'g': grant.granted_at.timestamp(),
+        'e': grant.expires_at.timestamp(),
+        'i': grant.issued_at,
+    }, salt=SALT, compress=True)
+
+
+def verify_token(token, session_key):
+    try:
+        claims = signing.loads(token, salt=SALT, max_age=_max_age())
+    except signing.BadSignature:
+        return None
+    if claims.get('s') != session_key:
+        return None
+
+    grant = AccessGrant(
+        session_key,
+        AccessPackage(*claims['p']),
+        _datetime(claims['g']),
+        _datetime(claims['e']),
+        issued_at=claims['i'],
+    )
+    if not grant.is_valid() or denylist.is_revoked(session_key, grant.issued_at):
+        return None
+    return grant
+
+
+class Denylist:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.revoked = {}
+        self.synced_at = None
+
+    def _sync(self):
+        since = timezone.now() - timezone.timedelta(seconds=_max_age())
+        rows = (
+            RevokedAccess.objects.filter(revoked_at__gte=since)
+            .values('session_key').annotate(revoked_at=Max('revoked_at'))
+        )
+        self.revoked = {row['session_key']: row['revoked_at'].timestamp() for row in rows}
+
+    def is_revoked(self, session_key, issued_at):
+        interval = getattr(settings, 'PAYMENTS_ACCESS_DENYLIST_SYNC', 30)
+        now = time.monotonic()
+        if self.synced_at is None or now - self.synced_at >= interval:
+            with self.lock:
+                if self.synced_at is None or now - self.synced_at >= interval:
+                    self._sync()
+                    self.synced_at = now
+        revoked_at = self.revoked.get(session_key)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def add(self, session_keys, revoked_at):
+        with self.lock:
+            revoked = dict(self.revoked)
+            for session_key in session_keys:
+                revoked[session_key] = max(revoked.get(session_key, 0), revoked_at)
+            self.revoked = revoked
+
+
+denylist = Denylist()
+
+
+def revoke_access(session_keys):
+    session_keys = list(session_keys)
+    if not session_keys:
+        return
+    now = timezone.now()
+    RevokedAccess.objects.bulk_create([
+        RevokedAccess(session_key=session_key, revoked_at=now) for session_key in session_keys
+    ])
+    denylist.add(session_keys, now.timestamp())
+
+
+def purge_revocations(now=None):
+    cutoff = (now or timezone.now()) - timezone.timedelta(seconds=_max_age())
+    deleted, _ = RevokedAccess.objects.filter(revoked_at__lt=cutoff).delete()
+    return deleted
+
+
+def get_request_access(request):
+    # Returns an AccessGrant for the request's session, or None. Set-Cookie
+    # changes are applied by AccessTokenMiddleware.
+    if hasattr(request, '_premium_access'):
+        return request._premium_access
+
+    grant = None
+    session_key = payment_session_key(request)
+    token = request.COOKIES.get(cookie_name())
+    if session_key and token:
+        grant = verify_token(token, session_key)
+
+    # Without a valid token, one database read decides. The polling cache is
+    # skipped because it doesn't cache "no access" anyway, and a token must
+    # come from a fresh read. The token is timestamped before the read, so a
+    # revocation committed meanwhile still applies to it.
+    if grant is None and session_key:
+        issued_at = time.time()
+        user_access = UserAccess.objects.select_related('package').filter(
+            session_key=session_key,
+            is_active=True
+        ).first()
+        if user_access and user_access.is_valid():
+            grant = AccessGrant.from_user_access(user_access, issued_at=issued_at)
+            request._premium_access_token = issue_token(grant)
+
+    if grant is None and token:
+        request._premium_access_token = None
+    request._premium_access = grant
+    return grant
+
+
+class AccessTokenMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_premium_access_token'):
+            return response
+
+        token = request._premium_access_token
+        if token is None:
+            response.delete_cookie(cookie_name(), samesite='Lax')
+        else:
+            response.set_cookie(
+                cookie_name(),
+                token,
+                max_age=_max_age(),
+                httponly=True,
+                samesite='Lax',
+                secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+            )
+        return response
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Package, Transaction, UserAccess
+from django.utils import timezone
+from django.utils.html import format_html
+import json
+from .archive import load_row
+from .models import Package, Transaction, TransactionArchive, UserAccess, WebhookEvent
 
 @admin.register(Package)
 class PackageAdmin(admin.ModelAdmin):
@@ -18,9 +22,45 @@ class TransactionAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    list_display = ['external_id', 'package', 'amount', 'status', 'payment_method', 'created_at', 'archived_at']
+    list_filter = ['status', 'payment_method', 'created_at']
+    search_fields = ['external_id', 'invoice_id', 'xendit_qr_id', 'session_key']
+    exclude = ['data']
+    readonly_fields = ['id', 'package', 'external_id', 'invoice_id', 'xendit_qr_id', 'session_key', 'amount',
+                       'status', 'payment_method', 'paid_at', 'created_at', 'archived_at', 'archived_row']
+    
+    @admin.display(description='Archived row')
+    def archived_row(self, obj):
+        return format_html('<pre>{}</pre>', json.dumps(load_row(obj), indent=2))
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(UserAccess)
 class UserAccessAdmin(admin.ModelAdmin):
     list_display = ['session_key', 'package', 'granted_at', 'expires_at', 'is_active']
     list_filter = ['is_active', 'granted_at', 'expires_at']
     search_fields = ['session_key']
     readonly_fields = ['granted_at']
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_key', 'external_id', 'status', 'state', 'outcome', 'attempts', 'received_at']
+    list_filter = ['state', 'outcome', 'status', 'received_at']
+    search_fields = ['event_key', 'external_id']
+    readonly_fields = ['event_key', 'external_id', 'status', 'transaction', 'outcome', 'payload',
+                       'attempts', 'last_error', 'received_at', 'processed_at']
+    actions = ['requeue']
+    
+    @admin.action(description='Requeue selected events')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(payload='').update(state='QUEUED', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} event(s) requeued.')
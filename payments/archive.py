@@ -0,0 +1,137 @@
+import datetime
+import json
+import logging
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Transaction, TransactionArchive, UserAccess, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# Hot/cold split for transactions. Settled transactions that haven't changed
+# for PAYMENTS_ARCHIVE_AFTER_DAYS move to TransactionArchive in batches: the
+# lookup columns stay queryable and the whole row (payment_details,
+# xendit_callback_data, ...) is kept as compressed JSON. Transactions still
+# referenced by a UserAccess row or a queued webhook stay in the hot table,
+# since deleting them would cascade or lose the link. get_transaction()
+# falls back to the archive, so callers don't have to know where a row lives.
+
+SETTLED_STATUSES = ('PAID', 'FAILED', 'EXPIRED')
+
+# Lookups get_transaction() can serve from the archive.
+ARCHIVE_LOOKUPS = ('id', 'external_id', 'invoice_id', 'xendit_qr_id')
+
+
+class _RowEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder truncates datetimes to milliseconds.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def compress_row(transaction):
+    row = {field.attname: field.value_from_object(transaction) for field in Transaction._meta.concrete_fields}
+    return zlib.compress(json.dumps(row, cls=_RowEncoder, separators=(',', ':')).encode())
+
+
+def load_row(archive):
+    return json.loads(zlib.decompress(bytes(archive.data)))
+
+
+def restore_transaction(archive):
+    # An unsaved, read-only Transaction rebuilt from the archived row.
+    row = load_row(archive)
+    transaction = Transaction(**{
+        field.attname: field.to_python(row.get(field.attname))
+        for field in Transaction._meta.concrete_fields
+    })
+    transaction.is_archived = True
+    return transaction
+
+
+def _to_archive(transaction):
+    return TransactionArchive(
+        id=transaction.id,
+        package_id=transaction.package_id,
+        external_id=transaction.external_id,
+        invoice_id=transaction.invoice_id,
+        xendit_qr_id=transaction.xendit_qr_id,
+        session_key=transaction.session_key,
+        amount=transaction.amount,
+        status=transaction.status,
+        payment_method=transaction.payment_method,
+        paid_at=transaction.paid_at,
+        created_at=transaction.created_at,
+        data=compress_row(transaction),
+    )
+
+
+def archivable_transactions(older_than_days=None, now=None):
+    days = older_than_days if older_than_days is not None else getattr(settings, 'PAYMENTS_ARCHIVE_AFTER_DAYS', 90)
+    cutoff = (now or timezone.now()) - timezone.timedelta(days=days)
+    return (
+        Transaction.objects.with_payloads()
+        .filter(status__in=SETTLED_STATUSES, updated_at__lt=cutoff)
+        .filter(~Exists(UserAccess.objects.filter(transaction=OuterRef('pk'))))
+        .filter(~Exists(WebhookEvent.objects.filter(
+            transaction=OuterRef('pk'), state__in=['QUEUED', 'PROCESSING']
+        )))
+    )
+
+
+def archive_transactions(older_than_days=None, batch_size=None, limit=None, now=None):
+    batch_size = batch_size or getattr(settings, 'PAYMENTS_ARCHIVE_BATCH_SIZE', 500)
+    total = 0
+
+    while limit is None or total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        with db_transaction.atomic():
+            batch = list(
+                archivable_transactions(older_than_days, now)
+                .select_for_update(skip_locked=True)
+                .order_by('updated_at')[:size]
+            )
+            if not batch:
+                break
+
+            ids = [transaction.id for transaction in batch]
+            TransactionArchive.objects.bulk_create(
+                [_to_archive(transaction) for transaction in batch],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts hides rows that failed to insert; only drop the
+            # hot rows the archive now holds.
+            archived = list(TransactionArchive.objects.filter(id__in=ids).values_list('id', flat=True))
+            Transaction.objects.filter(id__in=archived).delete()
+
+        total += len(archived)
+        logger.info(f"Archived {len(archived)} transaction(s)")
+        if len(archived) < len(batch):
+            logger.warning(f"Kept {len(batch) - len(archived)} transaction(s) the archive did not accept")
+            break
+
+    return total
+
+
+def get_transaction(**lookup):
+    # Hot table first, then the archive. Raises Transaction.DoesNotExist if
+    # neither has the row.
+    try:
+        return Transaction.objects.get(**lookup)
+    except Transaction.DoesNotExist:
+        if set(lookup) - set(ARCHIVE_LOOKUPS):
+            raise
+        archive = TransactionArchive.objects.filter(**lookup).first()
+        if archive is None:
+            raise
+        return restore_transaction(archive)
+
+
+def is_archived(**lookup):
+    return TransactionArchive.objects.filter(**lookup).exists()
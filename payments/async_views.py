@@ -0,0 +1,281 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from django.utils import timezone
+from django.urls import reverse
+from django.conf import settings
+import asyncio
+import json
+import logging
+
+from .events import access_channel, access_event, broker, transaction_channel, transaction_event
+from .instruments import InstrumentBusy, aobtain_instrument, instrument_generation, qr_key, va_key
+from .log import log_event
+from .models import Transaction, UserAccess
+from .resilience import ProviderUnavailable
+from .services import get_async_xendit_service
+from .sessions import payment_session_key
+from .views import (
+    _provider_unavailable,
+    _card_fields,
+    _card_payment_details,
+    _charge_generation,
+    _instrument_busy,
+    _qr_error_message,
+    _qr_is_active,
+    _qr_response,
+    _va_response,
+)
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the payment creation views in views.py. They are
+# routed instead of the sync ones when PAYMENTS_ASYNC_VIEWS is enabled and the
+# app is served through payment_gateway.asgi, so a slow Xendit round trip
+# only parks a coroutine rather than a whole worker.
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def process_virtual_account(request, transaction_id):
+    try:
+        transaction = await Transaction.objects.with_payloads('payment_details').aget(id=transaction_id)
+        bank_code = request.POST.get('bank_code')
+        customer_name = request.POST.get('customer_name', 'Customer')
+
+        if not bank_code:
+            return JsonResponse({'success': False, 'message': 'Please select a bank'})
+
+        xendit_service = get_async_xendit_service()
+        va_data = await aobtain_instrument(
+            transaction, va_key(bank_code), f'VA_{bank_code}',
+            lambda: xendit_service.create_virtual_account(
+                external_id=transaction.external_id,
+                amount=transaction.amount,
+                bank_code=bank_code,
+                customer_name=customer_name,
+                generation=instrument_generation(transaction, va_key(bank_code))
+            )
+        )
+
+        if va_data:
+            return _va_response(transaction_id, va_data)
+        else:
+            return JsonResponse({'success': False, 'message': 'Failed to create Virtual Account'})
+
+    except Transaction.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Transaction not found'})
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
+    except InstrumentBusy as e:
+        return _instrument_busy(e)
+    except Exception as e:
+        logger.error(f"Error processing VA payment: {str(e)}")
+        return JsonResponse({'success': False, 'message': 'An error occurred'})
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def process_qr_payment(request, transaction_id):
+    try:
+        transaction = await Transaction.objects.with_payloads('payment_details').aget(id=transaction_id)
+
+        if transaction.status == 'PAID':
+            return JsonResponse({
+                'success': False,
+                'message': 'Transaction already paid'
+            })
+
+        qr_type = request.POST.get('qr_type', 'QRIS_GENERAL')
+
+        xendit_service = get_async_xendit_service()
+
+        qr_data = await aobtain_instrument(
+            transaction, qr_key(qr_type), 'QRIS',
+            lambda: xendit_service.create_qr_code_by_type(
+                external_id=transaction.external_id,
+                amount=transaction.amount,
+                qr_code_type=qr_type
+            ),
+            accept=_qr_is_active
+        )
+
+        if qr_data and qr_data.get('status') == 'ACTIVE':
+            log_event(
+                logger, 'payment.qr_ready', sampled=True,
+                transaction_id=str(transaction_id),
+                external_id=transaction.external_id,
+                qr_id=qr_data.get('id'),
+                qr_type=qr_type,
+                channel=qr_data.get('channel_code'),
+            )
+
+            return _qr_response(transaction_id, qr_type, qr_data)
+        else:
+            error_msg = _qr_error_message(qr_data)
+            logger.error(f"❌ {error_msg} for transaction {transaction_id}")
+            return JsonResponse({
+                'success': False,
+                'message': error_msg
+            })
+
+    except Transaction.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'message': 'Transaction not found'
+        })
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
+    except InstrumentBusy as e:
+        return _instrument_busy(e)
+    except Exception as e:
+        logger.error(f"Error processing QR payment: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'message': 'An error occurred while creating QR code'
+        })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def process_credit_card(request, transaction_id):
+    try:
+        transaction = await Transaction.objects.with_payloads('payment_details').select_related('package').aget(id=transaction_id)
+
+        card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name = _card_fields(request)
+
+        if not all([card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name]):
+            return JsonResponse({'success': False, 'message': 'All card details are required'})
+
+        xendit_service = get_async_xendit_service()
+
+        token_data = await xendit_service.tokenize_card(
+            card_number=card_number,
+            card_exp_month=card_exp_month,
+            card_exp_year=card_exp_year,
+            card_cvn=card_cvn,
+            card_holder_name=card_holder_name
+        )
+
+        if not token_data:
+            return JsonResponse({'success': False, 'message': 'Invalid card details'})
+
+        charge_data = await xendit_service.charge_credit_card(
+            external_id=transaction.external_id,
+            amount=transaction.amount,
+            token_id=token_data.get('id'),
+            description=f"Payment for {transaction.package.name}",
+            generation=_charge_generation(transaction)
+        )
+
+        if charge_data:
+            transaction.payment_method = 'CREDIT_CARD'
+            transaction.payment_details = _card_payment_details(charge_data, card_number)
+
+            if charge_data.get('status') in ['CAPTURED', 'COMPLETED']:
+                transaction.status = 'PAID'
+                transaction.paid_at = timezone.now()
+
+                user_access, created = await UserAccess.objects.aupdate_or_create(
+                    session_key=transaction.session_key,
+                    defaults=transaction.access_defaults()
+                )
+
+                await transaction.asave()
+
+                return JsonResponse({
+                    'success': True,
+                    'message': 'Payment successful!',
+                    'redirect_url': reverse('paid_content')
+                })
+            else:
+                await transaction.asave()
+                return JsonResponse({
+                    'success': False,
+                    'message': f'Payment failed: {charge_data.get("failure_reason", "Unknown error")}'
+                })
+        else:
+            return JsonResponse({'success': False, 'message': 'Payment processing failed'})
+
+    except Transaction.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Transaction not found'})
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
+    except Exception as e:
+        logger.error(f"Error processing credit card payment: {str(e)}")
+        return JsonResponse({'success': False, 'message': 'An error occurred during payment processing'})
+
+
+# Server-Sent Events endpoints. The page opens one stream and receives one
+# event per status change (published from the post_save signals in
+# signals.py) instead of polling check_payment_status every few seconds.
+
+def _sse_message(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+async def _event_stream(subscription, event, resync, is_final):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'PAYMENTS_EVENT_STREAM_MAX_AGE', 600)
+    resync_interval = getattr(settings, 'PAYMENTS_EVENT_STREAM_RESYNC', 30)
+    
+    try:
+        yield f"retry: 3000\n{_sse_message(event)}"
+        
+        while not is_final(event) and loop.time() < deadline:
+            pushed = await subscription.get(timeout=resync_interval)
+            if pushed is None:
+                # No local event: the change may have been handled by another
+                # worker, so fall back to one cheap read per resync interval.
+                pushed = await resync()
+                if pushed == event:
+                    yield ": keep-alive\n\n"
+                    continue
+            event = pushed
+            yield _sse_message(event)
+    finally:
+        subscription.close()
+
+def _event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def _transaction_event(transaction_id):
+    transaction = await Transaction.objects.only('id', 'status').filter(id=transaction_id).afirst()
+    return transaction_event(transaction) if transaction else None
+
+async def _access_event(session_key):
+    user_access = await UserAccess.objects.select_related('package').filter(
+        session_key=session_key,
+        is_active=True
+    ).afirst()
+    return access_event(user_access)
+
+@require_http_methods(["GET"])
+async def payment_events(request, transaction_id):
+    # Subscribe before the first read so a change landing in between is not lost.
+    subscription = broker.subscribe(transaction_channel(transaction_id))
+    event = await _transaction_event(transaction_id)
+    if event is None:
+        subscription.close()
+        return JsonResponse({'error': 'Transaction not found'}, status=404)
+    
+    async def resync():
+        return await _transaction_event(transaction_id) or event
+    
+    return _event_stream_response(_event_stream(
+        subscription, event, resync,
+        is_final=lambda e: e['status'] != 'PENDING'
+    ))
+
+@require_http_methods(["GET"])
+async def access_events(request):
+    session_key = payment_session_key(request)
+    if not session_key:
+        return JsonResponse({'has_access': False})
+    
+    subscription = broker.subscribe(access_channel(session_key))
+    event = await _access_event(session_key)
+    
+    return _event_stream_response(_event_stream(
+        subscription, event, lambda: _access_event(session_key),
+        is_final=lambda e: e['has_access']
+    ))
@@ -0,0 +1,123 @@
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Transaction, UserAccess
+
+# Read-through cache for the polling endpoints (check_payment_status and
+# check_user_access).
+#
+# Entries are dropped by the on_commit receivers in signals.py, but those only
+# run in the process that made the write. The default cache is per worker,
+# and process_webhooks, reconcile_payments and sweep_expired write from other
+# processes, so how long an entry is kept depends on what a missed
+# invalidation would cost:
+#
+# - PAID is final and an access grant is re-checked by get_request_access(),
+#   so both are kept for PAYMENTS_CACHE_TIMEOUT.
+# - Any other status (mostly PENDING, which is what checkout pages poll) is
+#   kept for PAYMENTS_CACHE_PENDING_TIMEOUT seconds, which bounds how late a
+#   payment made in another process is noticed.
+# - Unknown ids are kept for PAYMENTS_CACHE_NEGATIVE_TIMEOUT seconds.
+
+_MISS = object()
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'PAYMENTS_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PAYMENTS_CACHE_TIMEOUT', 300)
+
+
+def _pending_timeout():
+    return getattr(settings, 'PAYMENTS_CACHE_PENDING_TIMEOUT', 2)
+
+
+def _negative_timeout():
+    return getattr(settings, 'PAYMENTS_CACHE_NEGATIVE_TIMEOUT', 5)
+
+
+def _record(name, hit):
+    with _stats_lock:
+        _stats[f'{name}_hits' if hit else f'{name}_misses'] += 1
+
+
+def get_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    for name in ('transaction_status', 'user_access'):
+        hits = stats.setdefault(f'{name}_hits', 0)
+        misses = stats.setdefault(f'{name}_misses', 0)
+        stats[f'{name}_hit_ratio'] = round(hits / (hits + misses), 4) if hits + misses else None
+    return stats
+
+
+def transaction_status_key(transaction_id):
+    return f'payments:transaction-status:{transaction_id}'
+
+
+def user_access_key(session_key):
+    return f'payments:user-access:{session_key}'
+
+
+def get_transaction_status(transaction_id):
+    key = transaction_status_key(transaction_id)
+    status = _cache().get(key, _MISS)
+    if status is not _MISS:
+        _record('transaction_status', hit=True)
+        return status or None
+
+    _record('transaction_status', hit=False)
+    status = Transaction.objects.filter(id=transaction_id).values_list('status', flat=True).first()
+    if status == 'PAID':
+        _cache().set(key, status, _timeout())
+    elif status is None:
+        # Unknown ids are cached briefly as '' so repeated polls stay cheap.
+        _cache().set(key, '', _negative_timeout())
+    elif _pending_timeout():
+        _cache().set(key, status, _pending_timeout())
+    return status
+
+
+# Returns a small snapshot dict of the session's active UserAccess, or None.
+# "No access" is never cached: a payment applied by another process would
+# otherwise keep a paying user out until the entry expired. A stale positive
+# snapshot only costs the DB read get_request_access() does before trusting it.
+def get_user_access(session_key):
+    key = user_access_key(session_key)
+    snapshot = _cache().get(key, _MISS)
+    if snapshot is not _MISS:
+        _record('user_access', hit=True)
+        return snapshot
+
+    _record('user_access', hit=False)
+    user_access = UserAccess.objects.select_related('package').filter(
+        session_key=session_key,
+        is_active=True
+    ).first()
+
+    if user_access is None:
+        return None
+    snapshot = {
+        'id': user_access.id,
+        'package_id': user_access.package_id,
+        'package_name': user_access.package.name,
+        'expires_at': user_access.expires_at,
+    }
+    _cache().set(key, snapshot, _timeout())
+    return snapshot
+
+
+def invalidate_transaction(transaction_id):
+    _cache().delete(transaction_status_key(transaction_id))
+
+
+def invalidate_user_access(session_key):
+    _cache().delete(user_access_key(session_key))
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide, read-only registry of the payment methods offered at checkout.
+# Lookups by code are dict hits; the bank list is refreshed from Xendit's
+# available banks API on a background thread once the TTL passes, and the
+# whole catalog is swapped in one assignment so readers never see a partial
+# update. Until the first refresh succeeds the static lists below are served.
+
+DEFAULT_BANKS = (
+    {"code": "BCA", "name": "Bank Central Asia", "fee": 0},
+    {"code": "BNI", "name": "Bank Negara Indonesia", "fee": 0},
+    {"code": "BRI", "name": "Bank Rakyat Indonesia", "fee": 0},
+    {"code": "MANDIRI", "name": "Bank Mandiri", "fee": 0},
+    {"code": "PERMATA", "name": "Bank Permata", "fee": 0},
+    {"code": "BSI", "name": "Bank Syariah Indonesia", "fee": 0},
+)
+
+DEFAULT_QR_TYPES = (
+    {
+        "code": "QRIS_GENERAL",
+        "channel_code": "ID_DANA",
+        "name": "QRIS Universal",
+        "description": "Universal QRIS - Works with GoPay, OVO, DANA, ShopeePay, LinkAja, BCA Mobile, Mandiri Livin, and all QRIS apps",
+        "icon": "🏷️",
+        "popular": True
+    },
+    {
+        "code": "DANA_QR",
+        "channel_code": "ID_DANA",
+        "name": "DANA QR Code",
+        "description": "DANA-optimized QRIS - Works with DANA and all other QRIS-enabled apps",
+        "icon": "💙",
+        "popular": True
+    },
+    {
+        "code": "LINKAJA_QR",
+        "channel_code": "ID_LINKAJA",
+        "name": "LinkAja QR Code",
+        "description": "LinkAja-optimized QRIS - Works with LinkAja and all other QRIS-enabled apps",
+        "icon": "🔗",
+        "popular": True
+    },
+    {
+        "code": "GOPAY_COMPATIBLE",
+        "channel_code": "ID_DANA",
+        "name": "GoPay Compatible",
+        "description": "QRIS code compatible with GoPay, DANA, OVO, and all QRIS network apps",
+        "icon": "�",
+        "popular": True
+    },
+)
+
+
+class PaymentCatalog:
+    def __init__(self, banks, qr_types, source='static'):
+        self.banks = tuple(MappingProxyType(dict(bank)) for bank in banks)
+        self.qr_types = tuple(MappingProxyType(dict(qr_type)) for qr_type in qr_types)
+        self._banks_by_code = MappingProxyType({bank['code']: bank for bank in self.banks})
+        self._qr_types_by_code = MappingProxyType({qr_type['code']: qr_type for qr_type in self.qr_types})
+        self.source = source
+        self.loaded_at = time.monotonic()
+
+    def bank(self, code):
+        return self._banks_by_code.get(code)
+
+    def qr_type(self, code):
+        return self._qr_types_by_code.get(code)
+
+
+_catalog = PaymentCatalog(DEFAULT_BANKS, DEFAULT_QR_TYPES)
+_last_attempt = None
+_refresh_lock = threading.Lock()
+
+
+def _banks_from_xendit(remote_banks):
+    # Keep our display names and ordering for known banks, append any other
+    # bank Xendit has activated for the account.
+    known = {bank['code']: bank for bank in DEFAULT_BANKS}
+    active = [
+        bank for bank in remote_banks
+        if bank.get('code') and bank.get('is_activated', True)
+    ]
+    active_codes = {bank['code'] for bank in active}
+    banks = [bank for bank in DEFAULT_BANKS if bank['code'] in active_codes]
+    banks += [
+        {'code': bank['code'], 'name': bank.get('name') or bank['code'], 'fee': 0}
+        for bank in active if bank['code'] not in known
+    ]
+    return banks
+
+
+def refresh_catalog():
+    global _catalog
+    from .services import get_xendit_service
+
+    remote_banks = get_xendit_service().fetch_available_banks()
+    if not remote_banks:
+        logger.warning("Payment catalog refresh failed; keeping the current catalog")
+        return False
+
+    banks = _banks_from_xendit(remote_banks)
+    if not banks:
+        logger.warning("Xendit returned no active banks; keeping the current catalog")
+        return False
+
+    _catalog = PaymentCatalog(banks, DEFAULT_QR_TYPES, source='xendit')
+    logger.info(f"Payment catalog refreshed from Xendit ({len(banks)} banks)")
+    return True
+
+
+def _refresh_in_background():
+    try:
+        refresh_catalog()
+    except Exception as e:
+        logger.error(f"Error refreshing payment catalog: {str(e)}")
+    finally:
+        _refresh_lock.release()
+
+
+def get_catalog():
+    global _last_attempt
+    if not getattr(settings, 'PAYMENT_CATALOG_REMOTE', True):
+        return _catalog
+
+    ttl = getattr(settings, 'PAYMENT_CATALOG_TTL', 3600)
+    now = time.monotonic()
+    # Failed refreshes are retried once per TTL as well, not on every request.
+    if _last_attempt is None or now - _last_attempt >= ttl:
+        if _refresh_lock.acquire(blocking=False):
+            if _last_attempt is not None and now - _last_attempt < ttl:
+                _refresh_lock.release()
+            else:
+                _last_attempt = now
+                threading.Thread(target=_refresh_in_background, name='payment-catalog-refresh', daemon=True).start()
+    return _catalog
+
+
+def get_catalog_stats():
+    return {
+        'source': _catalog.source,
+        'banks': len(_catalog.banks),
+        'qr_types': len(_catalog.qr_types),
+        'age_seconds': round(time.monotonic() - _catalog.loaded_at, 1),
+    }
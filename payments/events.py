@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.urls import reverse
+
+
+def transaction_channel(transaction_id):
+    return f"transaction:{transaction_id}"
+
+
+def access_channel(session_key):
+    return f"access:{session_key}"
+
+
+def status_event(status):
+    # Same shape as the check_payment_status JSON so the page can handle
+    # pushed events and polled responses with one code path.
+    paid = status == 'PAID'
+    return {
+        'status': status,
+        'paid': paid,
+        'redirect_url': reverse('paid_content') if paid else None
+    }
+
+
+def transaction_event(transaction):
+    return status_event(transaction.status)
+
+
+def access_event(user_access):
+    if user_access is None or not user_access.is_valid():
+        return {'has_access': False}
+    return {
+        'has_access': True,
+        'package_name': user_access.package.name,
+        'expires_at': user_access.expires_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'redirect_url': reverse('paid_content')
+    }
+
+
+class Subscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, event):
+        # Publishers are sync views running on another thread, so the
+        # subscriber is woken through its own event loop.
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            self.close()
+
+    async def get(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+# In-process fan-out of payment status changes to open event streams. Each
+# worker process has its own broker; streams held by another worker pick the
+# change up on their next periodic resync instead.
+class PaymentEventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return channel in self._subscribers
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+broker = PaymentEventBroker()
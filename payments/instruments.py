@@ -0,0 +1,373 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .catalog import get_catalog
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Payment instruments (VAs and QR codes) created for a transaction live in
+# Transaction.payment_details:
+#
+#   {<fields of the active instrument>, 'instruments': {'VA:BCA': {...}, 'QR:ID_DANA': {...}}}
+#
+# The top level is the instrument the checkout page is currently showing
+# (reconciliation and the QR image view read it); 'instruments' keeps every
+# VA/QR created for the transaction so a still-valid one can be served again
+# without another Xendit call. Creation is serialised per transaction by a
+# lease on the transaction row (instrument_locked_until), taken with one
+# conditional UPDATE so it holds across worker processes. A double click or a
+# refresh while the first request is still waiting on Xendit polls the lease
+# for up to PAYMENTS_INSTRUMENT_WAIT seconds and then serves the first
+# request's result instead of creating a second VA/QR; only if the lease is
+# still held after that does it get InstrumentBusy.
+
+
+def parse_details(value):
+    # Older rows (and rows archived before migration 0009) hold the JSON
+    # encoded as a string.
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def load_details(transaction):
+    return parse_details(transaction.payment_details)
+
+
+INSTRUMENT_FIELDS = [
+    'payment_method', 'payment_details', 'xendit_qr_id',
+    'va_account_number', 'va_bank_code', 'instrument_expires_at',
+]
+
+
+def va_key(bank_code):
+    return f"VA:{bank_code}"
+
+
+def qr_key(qr_type):
+    # QR types that share a Xendit channel can share one QR code.
+    qr_type_info = get_catalog().qr_type(qr_type)
+    return f"QR:{qr_type_info['channel_code'] if qr_type_info else qr_type}"
+
+
+def instrument_expiry(data):
+    return parse_datetime(data.get('expiration_date') or data.get('expires_at') or '')
+
+
+def is_usable(data):
+    if not data or data.get('status') not in ('ACTIVE', 'PENDING'):
+        return False
+    expires_at = instrument_expiry(data)
+    margin = timezone.timedelta(seconds=getattr(settings, 'PAYMENTS_INSTRUMENT_MIN_VALIDITY', 300))
+    return expires_at is not None and expires_at > timezone.now() + margin
+
+
+def _active_key(details):
+    # Transactions written before instruments were tracked only have the
+    # active instrument at the top level.
+    if details.get('qr_string'):
+        return f"QR:{details.get('channel_code')}"
+    if details.get('account_number'):
+        return va_key(details.get('bank_code'))
+    return None
+
+
+def find_instrument(transaction, key):
+    details = load_details(transaction)
+    data = details.get('instruments', {}).get(key)
+    if data is None and _active_key(details) == key:
+        data = {k: v for k, v in details.items() if k != 'instruments'}
+    return data if is_usable(data) else None
+
+
+def instrument_generation(transaction, key):
+    # Id of the earlier instrument stored for key, '' before the first one.
+    # Goes into the create's idempotency key, so replacing an expired VA
+    # isn't answered with the expired one.
+    details = load_details(transaction)
+    data = details.get('instruments', {}).get(key)
+    if data is None and _active_key(details) == key:
+        data = details
+    return (data or {}).get('id') or ''
+
+
+def activate_instrument(transaction, key, data, payment_method):
+    # Returns the fields to save, or [] when data is already active.
+    details = load_details(transaction)
+    if transaction.payment_method == payment_method and details.get('id') == data.get('id') and 'instruments' in details:
+        return []
+
+    instruments = dict(details.get('instruments') or {})
+    instruments[key] = data
+    transaction.payment_method = payment_method
+    transaction.payment_details = {**data, 'instruments': instruments}
+    transaction.instrument_expires_at = instrument_expiry(data)
+    # The VA and QR columns are left alone when switching to the other kind:
+    # the earlier instrument can still be paid.
+    if key.startswith('QR:'):
+        transaction.xendit_qr_id = data.get('id')
+    else:
+        transaction.va_account_number = data.get('account_number')
+        transaction.va_bank_code = data.get('bank_code') or key.split(':', 1)[1]
+    return INSTRUMENT_FIELDS + ['updated_at']
+
+
+def store_instrument(transaction_id, key, data):
+    # Adds a prepared instrument without touching the active one; re-read
+    # under lock so it can't overwrite a concurrent activation.
+    with db_transaction.atomic():
+        transaction = Transaction.objects.with_payloads('payment_details').select_for_update().get(id=transaction_id)
+        details = load_details(transaction)
+        instruments = details.setdefault('instruments', {})
+        if is_usable(instruments.get(key)):
+            return False
+        instruments[key] = data
+        transaction.payment_details = details
+        transaction.save(update_fields=['payment_details', 'updated_at'])
+    return True
+
+
+class InstrumentBusy(Exception):
+    # Another request is creating an instrument for the transaction.
+    pass
+
+
+# How often a waiting request re-tries a held lease, in seconds.
+LEASE_POLL_INTERVAL = 0.25
+
+
+def _lease_timeout():
+    # Must outlive the slowest create, or a second request could take over
+    # the lease mid-create. A QR code falls back from DANA to LinkAja, so that
+    # is two Xendit calls, each bounded by the retry deadline plus one connect
+    # timeout started just before the deadline. 0 derives it from those.
+    seconds = getattr(settings, 'PAYMENTS_INSTRUMENT_LOCK_TIMEOUT', 0)
+    if not seconds:
+        per_call = getattr(settings, 'XENDIT_RETRY_DEADLINE', 15.0) + getattr(settings, 'XENDIT_CONNECT_TIMEOUT', 5)
+        seconds = 2 * per_call + 5
+    return timezone.timedelta(seconds=seconds)
+
+
+def _wait_timeout():
+    return getattr(settings, 'PAYMENTS_INSTRUMENT_WAIT', 15)
+
+
+def _lease(transaction_id):
+    # Returns the claim query and the lease end, which doubles as the token
+    # that releases it. A lease left behind by a crashed worker lapses.
+    now = timezone.now()
+    until = now + _lease_timeout()
+    claim = Transaction.objects.filter(
+        Q(instrument_locked_until__isnull=True) | Q(instrument_locked_until__lte=now),
+        id=transaction_id,
+    )
+    return claim, until
+
+
+def _release(transaction_id, until):
+    return Transaction.objects.filter(id=transaction_id, instrument_locked_until=until)
+
+
+# Waits up to wait seconds for a held lease before raising InstrumentBusy.
+@contextmanager
+def instrument_lock(transaction_id, wait=0):
+    give_up = time.monotonic() + wait
+    while True:
+        claim, until = _lease(transaction_id)
+        if claim.update(instrument_locked_until=until):
+            break
+        if time.monotonic() >= give_up:
+            raise InstrumentBusy(f"Transaction {transaction_id} is creating an instrument")
+        time.sleep(LEASE_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        _release(transaction_id, until).update(instrument_locked_until=None)
+
+
+@asynccontextmanager
+async def ainstrument_lock(transaction_id, wait=0):
+    give_up = time.monotonic() + wait
+    while True:
+        claim, until = _lease(transaction_id)
+        if await claim.aupdate(instrument_locked_until=until):
+            break
+        if time.monotonic() >= give_up:
+            raise InstrumentBusy(f"Transaction {transaction_id} is creating an instrument")
+        await asyncio.sleep(LEASE_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        await _release(transaction_id, until).aupdate(instrument_locked_until=None)
+
+
+def obtain_instrument(transaction, key, payment_method, create, accept=bool):
+    # Returns a still-valid instrument for key, creating it with create() only
+    # if no other request has. A created response that accept() rejects is
+    # returned without being stored, for the caller's error message. While
+    # another request holds the lease it waits for it, then reuses what that
+    # request stored; raises InstrumentBusy if the wait runs out.
+    data = find_instrument(transaction, key)
+    if data is None:
+        with instrument_lock(transaction.id, wait=_wait_timeout()):
+            transaction.refresh_from_db(fields=INSTRUMENT_FIELDS)
+            data = find_instrument(transaction, key)
+            if data is None:
+                data = create()
+                if not accept(data):
+                    return data
+            else:
+                logger.info(f"Reusing {key} created concurrently for transaction {transaction.external_id}")
+            _save_active(transaction, key, data, payment_method)
+        return data
+
+    logger.info(f"Reusing {key} for transaction {transaction.external_id}")
+    _save_active(transaction, key, data, payment_method)
+    return data
+
+
+async def aobtain_instrument(transaction, key, payment_method, create, accept=bool):
+    # Async counterpart of obtain_instrument; create is a coroutine function.
+    data = find_instrument(transaction, key)
+    if data is None:
+        async with ainstrument_lock(transaction.id, wait=_wait_timeout()):
+            await transaction.arefresh_from_db(fields=INSTRUMENT_FIELDS)
+            data = find_instrument(transaction, key)
+            if data is None:
+                data = await create()
+                if not accept(data):
+                    return data
+            else:
+                logger.info(f"Reusing {key} created concurrently for transaction {transaction.external_id}")
+            await _asave_active(transaction, key, data, payment_method)
+        return data
+
+    logger.info(f"Reusing {key} for transaction {transaction.external_id}")
+    await _asave_active(transaction, key, data, payment_method)
+    return data
+
+
+def _save_active(transaction, key, data, payment_method):
+    update_fields = activate_instrument(transaction, key, data, payment_method)
+    if update_fields:
+        transaction.save(update_fields=update_fields)
+
+
+async def _asave_active(transaction, key, data, payment_method):
+    update_fields = activate_instrument(transaction, key, data, payment_method)
+    if update_fields:
+        await transaction.asave(update_fields=update_fields)
+
+
+# Speculative pre-creation. With PAYMENTS_PRECREATE enabled, buy_package
+# queues the instruments listed in PAYMENTS_PRECREATE_METHODS on a small
+# thread pool, so by the time the user picks one of them it is usually
+# already in payment_details. Pre-creation takes the same lease as a user
+# request, which waits for it like for any other request and then serves or
+# creates its instrument. Instruments the user never picks simply expire at
+# Xendit.
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PAYMENTS_PRECREATE_WORKERS', 4),
+                    thread_name_prefix='payments-precreate',
+                )
+                _executor_pid = pid
+    return _executor
+
+
+# method is 'QR:<qr type code>' or 'VA:<bank code>'.
+def instrument_key(method):
+    kind, code = method.split(':', 1)
+    return qr_key(code) if kind == 'QR' else va_key(code)
+
+
+def create_instrument(service, transaction, method):
+    kind, code = method.split(':', 1)
+    if kind == 'QR':
+        data = service.create_qr_code_by_type(
+            external_id=transaction.external_id,
+            amount=transaction.amount,
+            qr_code_type=code
+        )
+        return data if data and data.get('status') == 'ACTIVE' else None
+
+    return service.create_virtual_account(
+        external_id=transaction.external_id,
+        amount=transaction.amount,
+        bank_code=code,
+        generation=instrument_generation(transaction, va_key(code))
+    )
+
+
+def precreate_instrument(transaction_id, method):
+    from .services import get_xendit_service
+
+    transaction = Transaction.objects.only('id', 'external_id', 'amount', 'status').get(id=transaction_id)
+    if transaction.status != 'PENDING':
+        return
+
+    key = instrument_key(method)
+    with instrument_lock(transaction_id):
+        transaction.refresh_from_db(fields=['payment_details'])
+        if find_instrument(transaction, key):
+            return
+        data = create_instrument(get_xendit_service(), transaction, method)
+        if data and store_instrument(transaction_id, key, data):
+            logger.info(f"Pre-created {key} for transaction {transaction.external_id}")
+
+
+def precreate_instruments(transaction_id, methods):
+    # One task per transaction: the methods share the transaction's lease,
+    # so they are created one after the other.
+    close_old_connections()
+    try:
+        for i, method in enumerate(methods):
+            if i:
+                # Let a user request waiting for the lease claim it before
+                # the next pre-creation does.
+                time.sleep(2 * LEASE_POLL_INTERVAL)
+            try:
+                precreate_instrument(transaction_id, method)
+            except InstrumentBusy:
+                # The user picked a method meanwhile; leave the rest to them.
+                logger.info(f"Stopped pre-creating for transaction {transaction_id}: instrument in progress")
+                return
+            except Exception as e:
+                logger.warning(f"Pre-creating {method} for transaction {transaction_id} failed: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_precreate(transaction_id):
+    if not getattr(settings, 'PAYMENTS_PRECREATE', False):
+        return
+
+    methods = list(getattr(settings, 'PAYMENTS_PRECREATE_METHODS', []))
+    db_transaction.on_commit(lambda: _get_executor().submit(precreate_instruments, transaction_id, methods))
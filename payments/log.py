@@ -0,0 +1,137 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueListener
+
+from django.conf import settings
+
+# Logging for the payment path. log_event() emits one structured record per
+# payment operation (QR created, callback applied, ...) instead of a run of
+# f-string lines: nothing is formatted unless a handler accepts the record,
+# and high-volume no-op events (duplicate, ignored and waiting callbacks,
+# QR codes served) can be sampled with PAYMENTS_LOG_SAMPLE_RATE. Events that
+# change state are never sampled. JsonFormatter writes every record as one JSON
+# line, with the event fields as keys. QueueingHandler hands records to a
+# background thread that formats and writes them, so a request never waits
+# on stdout; when the queue is full, records are dropped and counted rather
+# than blocking. It is a plain Handler that owns its queue and listener:
+# since Python 3.12, dictConfig builds QueueHandler subclasses itself and
+# expects queue/listener settings that a drop-in StreamHandler can't give.
+
+
+class EventMessage:
+    # The record's msg; rendered as "event key=value ..." only when needed.
+    def __init__(self, event, fields):
+        self.event = event
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join([self.event] + [f'{key}={value}' for key, value in self.fields.items()])
+
+
+def log_event(logger, event, level=logging.INFO, sampled=False, **fields):
+    # sampled marks routine high-volume events; only PAYMENTS_LOG_SAMPLE_RATE
+    # of them are kept, and those carry the rate so counts can be scaled back.
+    if not logger.isEnabledFor(level):
+        return
+    if sampled:
+        rate = getattr(settings, 'PAYMENTS_LOG_SAMPLE_RATE', 1.0)
+        if rate < 1:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+    logger.log(level, EventMessage(event, fields), stacklevel=2)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=dt_timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        if isinstance(record.msg, EventMessage):
+            data['event'] = record.msg.event
+            data.update(record.msg.fields)
+        else:
+            data['message'] = record.getMessage()
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class QueueingHandler(logging.Handler):
+    # Drop-in for StreamHandler in LOGGING; the formatter and stream belong
+    # to the handler the listener thread writes through.
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__()
+        self.queue_size = queue_size
+        self.queue = queue.Queue(queue_size)
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve %-args now, while they still hold the values being logged;
+        # events keep their fields for the formatter.
+        record = copy.copy(record)
+        if not isinstance(record.msg, EventMessage):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            # Forked (e.g. gunicorn --preload): the listener thread stayed
+            # in the parent.
+            with self.start_lock:
+                if self.pid != os.getpid():
+                    self.queue = queue.Queue(self.queue_size)
+                    self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+
+def get_log_stats():
+    handlers = [
+        handler for handler in logging.getLogger('payments').handlers + logging.getLogger().handlers
+        if isinstance(handler, QueueingHandler)
+    ]
+    return {
+        'queued': sum(handler.queue.qsize() for handler in handlers),
+        'dropped': sum(handler.dropped for handler in handlers),
+    }
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.archive import archivable_transactions, archive_transactions
+
+class Command(BaseCommand):
+    help = 'Move settled transactions older than --days into the compressed archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PAYMENTS_ARCHIVE_AFTER_DAYS,
+                            help='Archive settled transactions not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.PAYMENTS_ARCHIVE_BATCH_SIZE,
+                            help='Transactions moved per database transaction')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after archiving this many transactions')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the transactions that would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_transactions(options['days']).count()
+            self.stdout.write(f"🔍 {count} transaction(s) would be archived")
+            return
+
+        archived = archive_transactions(
+            older_than_days=options['days'],
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"📦 Archived {archived} transaction(s)"))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.sessions import cleanup_sessions
+
+class Command(BaseCommand):
+    help = 'Delete expired rows from the session table in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PAYMENTS_SESSION_CLEANUP_BATCH_SIZE,
+                            help='Sessions deleted per statement')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE.endswith('signed_cookies'):
+            self.stdout.write("🍪 Sessions live in signed cookies; only rows left from an earlier mode are removed")
+
+        deleted = cleanup_sessions(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f"🧹 Deleted {deleted} expired session(s)"))
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.webhooks import process_queue
+
+class Command(BaseCommand):
+    help = 'Apply queued Xendit webhook events in batches, with retry/backoff and dead-lettering'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.WEBHOOK_BATCH_SIZE)
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Process a single batch and exit')
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.stdout.write(f'Processing webhook queue (batch size {batch_size})...')
+        
+        try:
+            while True:
+                close_old_connections()
+                counts = process_queue(batch_size)
+                processed = sum(counts.values())
+                
+                if processed:
+                    self.stdout.write(
+                        f"   done={counts['done']} retried={counts['retried']} dead={counts['dead']}"
+                    )
+                
+                if options['once']:
+                    break
+                if processed < batch_size:
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS('Webhook worker stopped.'))
@@ -0,0 +1,61 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.reconciliation import reconcile_pending
+
+class Command(BaseCommand):
+    help = 'Reconcile PENDING transactions against Xendit and apply missed payments in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.RECONCILE_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.RECONCILE_MAX_WORKERS,
+                            help='Concurrent Xendit lookups')
+        parser.add_argument('--rate', type=float, default=settings.RECONCILE_RATE_LIMIT,
+                            help='Max Xendit requests per second (0 = unlimited)')
+        parser.add_argument('--min-age', type=int, default=settings.RECONCILE_MIN_AGE_SECONDS,
+                            help='Skip transactions created less than this many seconds ago')
+        parser.add_argument('--limit', type=int, help='Check at most this many transactions')
+        parser.add_argument('--loop', action='store_true', help='Keep reconciling every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300)
+        parser.add_argument('--json', help='Write the run report to this file')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                report = reconcile_pending(
+                    batch_size=options['batch_size'],
+                    max_workers=options['workers'],
+                    rate=options['rate'],
+                    min_age=options['min_age'],
+                    limit=options['limit'],
+                )
+                self._print_report(report)
+
+                if options['json']:
+                    with open(options['json'], 'w') as f:
+                        json.dump(report, f, indent=2)
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"🔄 Checked {report['checked']} pending transaction(s) in {report['duration_seconds']}s"
+        )
+        self.stdout.write(
+            f"   paid={report['paid']} expired={report['expired']} failed={report['failed']} "
+            f"still_pending={report['still_pending']} skipped={report['skipped']} errors={report['errors']}"
+        )
+        for entry in report['reconciled']:
+            self.stdout.write(f"   ✅ {entry['external_id']} -> {entry['status']} (via {entry['source']})")
+        for external_id in report['error_external_ids']:
+            self.stdout.write(self.style.WARNING(f"   ⚠️  {external_id}: lookup failed"))
+        self.stdout.write(self.style.SUCCESS('Reconciliation complete.'))
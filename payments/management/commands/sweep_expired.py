@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.sweeper import sweep_expired
+
+class Command(BaseCommand):
+    help = 'Expire overdue PENDING transactions and deactivate lapsed user access in batched updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.PAYMENTS_SWEEP_CHUNK_SIZE,
+                            help='Rows updated per statement')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping every --interval seconds')
+        parser.add_argument('--interval', type=float, default=settings.PAYMENTS_SWEEP_INTERVAL or 60,
+                            help='Seconds between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                counts = sweep_expired(options['chunk_size'])
+                self.stdout.write(
+                    f"🧹 Expired {counts['transactions_expired']} transaction(s), "
+                    f"deactivated {counts['access_deactivated']} access row(s)"
+                )
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Sweep complete.'))
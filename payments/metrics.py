@@ -0,0 +1,317 @@
+import contextvars
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template as DjangoTemplate
+
+logger = logging.getLogger(__name__)
+
+# Per-view request metrics in Prometheus text format, kept in process memory
+# and served by the /metrics/ view. MetricsMiddleware times each request, sync
+# or async; its DB queries are counted by an execute_wrapper installed on
+# every connection as it opens, which reports to the request in the current
+# context. asgiref copies that context into the threads the async ORM runs
+# queries on, so async views are counted too. XenditService._send and
+# InstrumentedDjangoTemplates report upstream calls and template renders,
+# labelled with the view that made them (or "none" outside a request).
+#
+# Under gunicorn each worker has its own counters. With PAYMENTS_METRICS_DIR
+# set, workers write a snapshot to <dir>/payments-<pid>.json at most every
+# PAYMENTS_METRICS_FLUSH_INTERVAL seconds, and /metrics/ sums the snapshots
+# of every worker, including ones that have exited, so counters never go
+# backwards. Empty the directory when the server starts.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (type, help, label names, histogram buckets)
+METRICS = {
+    'payments_http_requests_total': (
+        'counter', 'HTTP requests by view, method and status.', ('view', 'method', 'status'), None),
+    'payments_http_request_duration_seconds': (
+        'histogram', 'Wall time of HTTP requests by view.', ('view',), DURATION_BUCKETS),
+    'payments_db_queries_total': (
+        'counter', 'Database queries run while serving each view.', ('view',), None),
+    'payments_db_query_seconds_total': (
+        'counter', 'Time spent in database queries while serving each view.', ('view',), None),
+    'payments_xendit_requests_total': (
+        'counter', 'Xendit API attempts by view, endpoint group and status.', ('view', 'endpoint', 'status'), None),
+    'payments_xendit_request_duration_seconds': (
+        'histogram', 'Latency of Xendit API attempts by view and endpoint group.', ('view', 'endpoint'),
+        DURATION_BUCKETS),
+    'payments_template_render_seconds': (
+        'histogram', 'Template render time by view and template.', ('view', 'template'), DURATION_BUCKETS),
+}
+
+NO_VIEW = 'none'
+
+
+class RequestState:
+    def __init__(self):
+        self.view = 'unmatched'
+        self.status = 500
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_state = contextvars.ContextVar('payments_metrics_request', default=None)
+
+
+def current_view():
+    state = _request_state.get()
+    return state.view if state is not None else NO_VIEW
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+            counts = histogram[0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), list(counts), total]
+                    for (name, labels), (counts, total) in self.histograms.items()
+                ],
+            }
+
+
+registry = Registry()
+
+
+def observe_request(view, method, status, seconds, queries, db_seconds):
+    registry.inc('payments_http_requests_total', (view, method, str(status)))
+    registry.observe('payments_http_request_duration_seconds', (view,), seconds)
+    registry.inc('payments_db_queries_total', (view,), queries)
+    registry.inc('payments_db_query_seconds_total', (view,), db_seconds)
+
+
+def observe_xendit_call(endpoint, status, seconds):
+    # status is the HTTP status, or None when no response came back.
+    view = current_view()
+    registry.inc('payments_xendit_requests_total', (view, endpoint, str(status) if status else 'error'))
+    registry.observe('payments_xendit_request_duration_seconds', (view, endpoint), seconds)
+
+
+def observe_template(template_name, seconds):
+    registry.observe('payments_template_render_seconds', (current_view(), template_name or '<string>'), seconds)
+
+
+# Multiprocess aggregation
+
+_flushed_at = None
+_flush_lock = threading.Lock()
+
+
+def _metrics_dir():
+    return getattr(settings, 'PAYMENTS_METRICS_DIR', '')
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'payments-{pid}.json')
+
+
+def flush(force=False):
+    global _flushed_at
+    directory = _metrics_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    interval = getattr(settings, 'PAYMENTS_METRICS_FLUSH_INTERVAL', 1)
+    if not force and _flushed_at is not None and now - _flushed_at < interval:
+        return
+    with _flush_lock:
+        _flushed_at = now
+        path = _snapshot_path(directory, os.getpid())
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(registry.snapshot(), f, separators=(',', ':'))
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot {path}: {str(e)}")
+
+
+def collect():
+    # This process's live metrics, plus the other workers' snapshots.
+    snapshots = [registry.snapshot()]
+    directory = _metrics_dir()
+    if directory:
+        own = _snapshot_path(directory, os.getpid())
+        for path in glob.glob(os.path.join(directory, 'payments-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {path}: {str(e)}")
+
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, label_names, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+            continue
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(label_names, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(label_names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# Collectors
+
+def count_query(execute, sql, params, many, context):
+    state = _request_state.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.db_seconds += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # First in the list: connection.execute_wrapper() pops the last entry,
+    # and connections often open inside such a block.
+    if getattr(settings, 'PAYMENTS_METRICS', True) and count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PAYMENTS_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure(request) as state:
+            response = self.get_response(request)
+            state.status = response.status_code
+        return response
+
+    async def __acall__(self, request):
+        with self.measure(request) as state:
+            response = await self.get_response(request)
+            state.status = response.status_code
+        return response
+
+    @contextmanager
+    def measure(self, request):
+        state = RequestState()
+        token = _request_state.set(state)
+        start = time.perf_counter()
+        try:
+            yield state
+        finally:
+            observe_request(
+                state.view, request.method, state.status, time.perf_counter() - start, state.queries, state.db_seconds
+            )
+            _request_state.reset(token)
+            flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _request_state.get()
+        match = request.resolver_match
+        if state is not None and match is not None:
+            state.view = match.view_name or match.url_name or NO_VIEW
+
+
+class InstrumentedTemplate(DjangoTemplate):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            observe_template(self.origin.template_name, time.perf_counter() - start)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    # TEMPLATES backend that times each top-level render; included templates
+    # count towards the template that includes them.
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_transaction_xendit_payment_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_key', models.CharField(max_length=255, unique=True)),
+                ('external_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('outcome', models.CharField(choices=[('APPLIED', 'Applied'), ('IGNORED', 'Ignored')], max_length=20)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.transaction')),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_webhookevent_queue'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='webhookevent',
+            name='webhook_queue_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['session_key', '-created_at'], name='txn_session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['expires_at'], name='txn_pending_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('xendit_qr_id__isnull', False)), fields=['xendit_qr_id'], name='txn_qr_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('invoice_id__isnull', False)), fields=['invoice_id'], name='txn_invoice_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useraccess',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['expires_at'], name='access_active_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('state__in', ['QUEUED', 'PROCESSING'])), fields=['next_attempt_at'], name='webhook_queue_idx'),
+        ),
+    ]
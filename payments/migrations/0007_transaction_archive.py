@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('external_id', models.CharField(max_length=255, unique=True)),
+                ('invoice_id', models.CharField(blank=True, db_index=True, max_length=255, null=True)),
+                ('xendit_qr_id', models.CharField(blank=True, db_index=True, max_length=100, null=True)),
+                ('session_key', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid'), ('FAILED', 'Failed'), ('EXPIRED', 'Expired')], max_length=20)),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('data', models.BinaryField()),
+                ('package', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.package')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='txn_archive_created_idx')],
+            },
+        ),
+    ]
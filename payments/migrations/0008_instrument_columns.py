@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='instrument_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='va_account_number',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='va_bank_code',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('va_account_number__isnull', False)), fields=['va_account_number'], name='txn_va_account_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import json
+
+from django.db import migrations
+from django.utils.dateparse import parse_datetime
+
+BATCH_SIZE = 500
+
+
+def _decode(value):
+    # A string that isn't JSON is kept as it is rather than lost.
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def decode_payment_details(apps, schema_editor):
+    # payment_details used to be written as json.dumps(...) into a JSONField,
+    # i.e. a JSON string holding JSON. Store the object itself and fill the
+    # instrument columns from it.
+    Transaction = apps.get_model('payments', 'Transaction')
+    fields = ['payment_details', 'va_account_number', 'va_bank_code', 'instrument_expires_at']
+    batch = []
+
+    rows = Transaction.objects.filter(payment_details__isnull=False).only('id', 'payment_method', 'payment_details')
+    for transaction in rows.iterator(chunk_size=BATCH_SIZE):
+        details = _decode(transaction.payment_details)
+        transaction.payment_details = details
+        if isinstance(details, dict):
+            if (transaction.payment_method or '').startswith('VA_') and details.get('account_number'):
+                transaction.va_account_number = str(details['account_number'])[:50]
+                transaction.va_bank_code = (details.get('bank_code') or transaction.payment_method[3:])[:20]
+            expires_at = details.get('expiration_date') or details.get('expires_at')
+            transaction.instrument_expires_at = parse_datetime(expires_at) if isinstance(expires_at, str) else None
+        batch.append(transaction)
+
+        if len(batch) >= BATCH_SIZE:
+            Transaction.objects.bulk_update(batch, fields)
+            batch = []
+
+    if batch:
+        Transaction.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_instrument_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(decode_payment_details, migrations.RunPython.noop),
+    ]
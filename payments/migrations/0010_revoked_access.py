@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_decode_payment_details'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(db_index=True, max_length=255)),
+                ('revoked_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
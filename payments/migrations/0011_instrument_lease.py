@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_revoked_access'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='instrument_locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -13,6 +13,20 @@ class Package(models.Model):
     def __str__(self):
         return f"{self.name} - Rp {self.price}"
 
+# The JSON payloads are the bulk of a Transaction row but only a few code
+# paths read them, so the default manager defers them; call with_payloads()
+# (optionally naming the payloads) where they are needed.
+PAYLOAD_FIELDS = ('payment_details', 'xendit_callback_data')
+
+class TransactionQuerySet(models.QuerySet):
+    def with_payloads(self, *fields):
+        fields = fields or PAYLOAD_FIELDS
+        return self.defer(None).defer(*[field for field in PAYLOAD_FIELDS if field not in fields])
+
+class TransactionManager(models.Manager.from_queryset(TransactionQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer(*PAYLOAD_FIELDS)
+
 class Transaction(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -39,6 +53,13 @@ class Transaction(models.Model):
     invoice_id = models.CharField(max_length=255, blank=True, null=True)
     xendit_qr_id = models.CharField(max_length=100, blank=True, null=True)
     xendit_payment_id = models.CharField(max_length=100, blank=True, null=True)
+    # Copied from payment_details when a VA/QR is shown, so webhooks and
+    # reconciliation can look instruments up through an index.
+    va_account_number = models.CharField(max_length=50, blank=True, null=True)
+    va_bank_code = models.CharField(max_length=20, blank=True, null=True)
+    instrument_expires_at = models.DateTimeField(blank=True, null=True)
+    # Lease taken while a VA/QR is being created, see payments/instruments.py.
+    instrument_locked_until = models.DateTimeField(blank=True, null=True)
     session_key = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
@@ -53,17 +74,92 @@ class Transaction(models.Model):
     
     xendit_callback_data = models.JSONField(blank=True, null=True)
     
+    objects = TransactionManager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_key', '-created_at'], name='txn_session_created_idx'),
+            # Expiry sweeps only ever look at PENDING rows, which stay a small
+            # slice of the table, so a partial index keeps the sweep cheap.
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='PENDING'),
+                name='txn_pending_expiry_idx',
+            ),
+            models.Index(
+                fields=['xendit_qr_id'],
+                condition=models.Q(xendit_qr_id__isnull=False),
+                name='txn_qr_id_idx',
+            ),
+            models.Index(
+                fields=['invoice_id'],
+                condition=models.Q(invoice_id__isnull=False),
+                name='txn_invoice_id_idx',
+            ),
+            models.Index(
+                fields=['va_account_number'],
+                condition=models.Q(va_account_number__isnull=False),
+                name='txn_va_account_idx',
+            ),
+        ]
+    
     def __str__(self):
         return f"Transaction {self.external_id} - {self.status}"
     
+    # Webhooks can arrive late or out of order; a status may only move forward
+    # in this order, and PAID is final.
+    STATUS_ORDER = {
+        'PENDING': 0,
+        'FAILED': 1,
+        'EXPIRED': 1,
+        'PAID': 2,
+    }
+    
     def is_paid(self):
         return self.status == 'PAID'
     
+    def can_transition_to(self, status):
+        return self.STATUS_ORDER[status] > self.STATUS_ORDER[self.status]
+    
+    def access_defaults(self):
+        return {
+            'package': self.package,
+            'transaction': self,
+            'expires_at': timezone.now() + timezone.timedelta(days=self.package.duration_days),
+            'is_active': True
+        }
+    
     def is_expired(self):
         if self.expires_at:
             return timezone.now() > self.expires_at
         return False
 
+class TransactionArchive(models.Model):
+    # Settled transactions moved out of the hot table by payments.archive.
+    # Lookup columns are kept as-is; the full row, including the JSON
+    # payloads, is stored as zlib-compressed JSON in `data`.
+    id = models.UUIDField(primary_key=True, editable=False)
+    package = models.ForeignKey(Package, on_delete=models.SET_NULL, blank=True, null=True)
+    external_id = models.CharField(max_length=255, unique=True)
+    invoice_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    xendit_qr_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    session_key = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, blank=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='txn_archive_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived transaction {self.external_id} - {self.status}"
+
 class UserAccess(models.Model):
     session_key = models.CharField(max_length=255, unique=True)
     package = models.ForeignKey(Package, on_delete=models.CASCADE)
@@ -72,6 +168,17 @@ class UserAccess(models.Model):
     expires_at = models.DateTimeField()
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        # Lookups by (session_key, is_active) are already served by the unique
+        # index on session_key; this one backs deactivation sweeps.
+        indexes = [
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(is_active=True),
+                name='access_active_expiry_idx',
+            ),
+        ]
+    
     def __str__(self):
         return f"Access for {self.session_key} - {self.package.name}"
     
@@ -82,3 +189,49 @@ class UserAccess(models.Model):
         if not self.expires_at:
             self.expires_at = timezone.now() + timezone.timedelta(days=self.package.duration_days)
         super().save(*args, **kwargs)
+
+class RevokedAccess(models.Model):
+    # Access tokens issued for session_key before revoked_at are no longer
+    # honoured; see payments.access.
+    session_key = models.CharField(max_length=255, db_index=True)
+    revoked_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Access revoked for {self.session_key} at {self.revoked_at}"
+
+class WebhookEvent(models.Model):
+    STATE_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('DEAD', 'Dead letter'),
+    ]
+    OUTCOME_CHOICES = [
+        ('APPLIED', 'Applied'),
+        ('IGNORED', 'Ignored'),
+    ]
+    
+    event_key = models.CharField(max_length=255, unique=True)
+    external_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=50, blank=True)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, blank=True, null=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='DONE')
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True)
+    payload = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(state__in=['QUEUED', 'PROCESSING']),
+                name='webhook_queue_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Webhook {self.event_key} - {self.state}"
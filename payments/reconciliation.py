@@ -0,0 +1,282 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .access import revoke_access
+from .events import access_event
+from .instruments import load_details
+from .models import Transaction, UserAccess
+from .resilience import ProviderUnavailable
+from .services import get_xendit_service
+from .signals import notify_transactions, notify_user_access
+from .webhooks import CALLBACK_STATUS_MAP
+
+logger = logging.getLogger(__name__)
+
+# Batch reconciliation of PENDING transactions against Xendit, for payments
+# whose webhook never arrived. Remote lookups run on a bounded thread pool
+# behind a shared rate limit; the resulting state changes are applied per
+# page with one bulk_update and one UserAccess upsert.
+
+REMOTE_STATUS_MAP = {
+    **CALLBACK_STATUS_MAP,
+    'SUCCEEDED': 'PAID',
+    'PENDING': 'PENDING',
+    'UNPAID': 'PENDING',
+    'ACTIVE': 'PENDING',
+}
+
+
+class RateLimiter:
+    # Token bucket shared by the lookup threads; rate is requests per second
+    # and 0 disables limiting.
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def remote_reference(transaction):
+    if transaction.invoice_id:
+        return 'invoice', transaction.invoice_id
+    if transaction.xendit_qr_id:
+        return 'qr', transaction.xendit_qr_id
+    if (transaction.payment_method or '').startswith('VA_'):
+        va_id = load_details(transaction).get('id')
+        if va_id:
+            return 'va', va_id
+    return None
+
+
+def _fetch_virtual_account_status(service, transaction, va_id):
+    # Xendit also marks our single-use VAs INACTIVE when they are paid, so
+    # INACTIVE alone proves nothing. A payment found by its payment_id (set
+    # by the VA callback or a simulation) or in the Transactions API under
+    # the VA's external_id settles the transaction; only when neither turns
+    # one up is it EXPIRED once expiration_date has passed.
+    if transaction.xendit_payment_id:
+        payment = service.get_virtual_account_payment(transaction.xendit_payment_id)
+        if payment is None:
+            return None, None
+        if REMOTE_STATUS_MAP.get(str(payment.get('status') or 'COMPLETED').upper()) == 'PAID':
+            return 'PAID', payment
+
+    external_id = load_details(transaction).get('external_id') or transaction.external_id
+    payments = service.get_virtual_account_transactions(external_id)
+    if payments is None:
+        return None, None
+    for payment in payments:
+        if REMOTE_STATUS_MAP.get(str(payment.get('status', '')).upper()) == 'PAID':
+            return 'PAID', payment
+
+    virtual_account = service.get_virtual_account(va_id)
+    if virtual_account is None:
+        return None, None
+    expiration = parse_datetime(virtual_account.get('expiration_date') or '')
+    if (
+        str(virtual_account.get('status', '')).upper() == 'INACTIVE'
+        and expiration is not None and expiration <= timezone.now()
+    ):
+        return 'EXPIRED', virtual_account
+    return 'PENDING', None
+
+
+# Returns (status, remote_data) where status is a Transaction status, or
+# (None, None) when Xendit could not be asked.
+def fetch_remote_status(service, transaction):
+    reference = remote_reference(transaction)
+    if reference is None:
+        return None, None
+    kind, remote_id = reference
+
+    if kind == 'invoice':
+        invoice = service.get_invoice(remote_id)
+        if invoice is None:
+            return None, None
+        return REMOTE_STATUS_MAP.get(str(invoice.get('status', '')).upper(), 'PENDING'), invoice
+
+    if kind == 'qr':
+        payments = service.get_qr_code_payments(remote_id)
+        if payments is None:
+            return None, None
+        for payment in payments:
+            if REMOTE_STATUS_MAP.get(str(payment.get('status', '')).upper()) == 'PAID':
+                return 'PAID', payment
+        return 'PENDING', None
+
+    return _fetch_virtual_account_status(service, transaction, remote_id)
+
+
+# Applies a list of (transaction, status, remote_data) results. Rows are
+# re-read under lock and only PENDING ones are moved, so a webhook landing
+# mid-run wins. Returns a Counter of applied statuses and the list of rows
+# that changed.
+def apply_remote_statuses(results):
+    wanted = {t.id: (status, data) for t, status, data in results if status and status != 'PENDING'}
+    counts = Counter()
+    changed = []
+    if not wanted:
+        return counts, changed
+
+    now = timezone.now()
+    with db_transaction.atomic():
+        locked = (
+            Transaction.objects.with_payloads('xendit_callback_data')
+            .select_for_update(skip_locked=True)
+            .select_related('package')
+            .filter(id__in=list(wanted), status='PENDING')
+            .order_by('id')
+        )
+        grants = {}
+        for transaction in locked:
+            status, data = wanted[transaction.id]
+            transaction.status = status
+            transaction.updated_at = now
+            if data:
+                transaction.xendit_callback_data = data
+            if status == 'PAID':
+                transaction.paid_at = now
+                transaction.payment_method = transaction.payment_method or str(
+                    (data or {}).get('payment_method') or 'UNKNOWN'
+                ).upper()[:20]
+                grants[transaction.session_key] = UserAccess(
+                    session_key=transaction.session_key, **transaction.access_defaults()
+                )
+            changed.append(transaction)
+            counts[status] += 1
+
+        Transaction.objects.bulk_update(
+            changed, ['status', 'paid_at', 'payment_method', 'xendit_callback_data', 'updated_at']
+        )
+        if grants:
+            UserAccess.objects.bulk_create(
+                list(grants.values()),
+                update_conflicts=True,
+                unique_fields=['session_key'],
+                update_fields=['package', 'transaction', 'expires_at', 'is_active'],
+            )
+
+        by_status = {}
+        for transaction in changed:
+            by_status.setdefault(transaction.status, []).append(transaction.id)
+        access_events = {session_key: access_event(access) for session_key, access in grants.items()}
+
+        def notify():
+            for status, ids in by_status.items():
+                notify_transactions(ids, status)
+            notify_user_access(access_events)
+            # Upserted grants may replace an existing access for the session.
+            revoke_access(access_events)
+
+        db_transaction.on_commit(notify)
+
+    counts['skipped'] = len(wanted) - len(changed)
+    return counts, changed
+
+
+def _check(service, limiter, transaction):
+    limiter.acquire()
+    try:
+        status, data = fetch_remote_status(service, transaction)
+    except ProviderUnavailable as e:
+        logger.warning(f"Skipping transaction {transaction.external_id}: {e}")
+        status, data = None, None
+    except Exception as e:
+        logger.error(f"Error reconciling transaction {transaction.external_id}: {str(e)}")
+        status, data = None, None
+    return transaction, status, data
+
+
+def reconcile_pending(batch_size=None, max_workers=None, rate=None, min_age=None, limit=None):
+    batch_size = batch_size or getattr(settings, 'RECONCILE_BATCH_SIZE', 200)
+    max_workers = max_workers or getattr(settings, 'RECONCILE_MAX_WORKERS', 8)
+    rate = rate if rate is not None else getattr(settings, 'RECONCILE_RATE_LIMIT', 10)
+    min_age = min_age if min_age is not None else getattr(settings, 'RECONCILE_MIN_AGE_SECONDS', 60)
+
+    started = timezone.now()
+    # Leave freshly created transactions alone: their webhook is likely
+    # still on its way.
+    cutoff = started - timezone.timedelta(seconds=min_age)
+    pending = (
+        Transaction.objects.with_payloads('payment_details')
+        .filter(status='PENDING', created_at__lte=cutoff)
+        .filter(Q(invoice_id__isnull=False) | Q(xendit_qr_id__isnull=False) | Q(payment_method__startswith='VA_'))
+        .only(
+            'id', 'external_id', 'invoice_id', 'xendit_qr_id', 'xendit_payment_id', 'payment_method',
+            'payment_details',
+        )
+        .order_by('id')
+    )
+
+    service = get_xendit_service()
+    limiter = RateLimiter(rate)
+    counts = Counter()
+    reconciled = []
+    errors = []
+    last_id = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while limit is None or counts['checked'] < limit:
+            page_size = batch_size if limit is None else min(batch_size, limit - counts['checked'])
+            page = list((pending.filter(id__gt=last_id) if last_id else pending)[:page_size])
+            if not page:
+                break
+            last_id = page[-1].id
+
+            results = list(executor.map(lambda t: _check(service, limiter, t), page))
+            counts['checked'] += len(results)
+            for transaction, status, _ in results:
+                if status is None:
+                    errors.append(transaction.external_id)
+                elif status == 'PENDING':
+                    counts['still_pending'] += 1
+
+            applied, changed = apply_remote_statuses(results)
+            counts.update(applied)
+            reconciled.extend(
+                {'external_id': t.external_id, 'status': t.status, 'source': remote_reference(t)[0]}
+                for t in changed
+            )
+
+    report = {
+        'started_at': started.isoformat(),
+        'duration_seconds': round((timezone.now() - started).total_seconds(), 3),
+        'checked': counts['checked'],
+        'paid': counts['PAID'],
+        'expired': counts['EXPIRED'],
+        'failed': counts['FAILED'],
+        'still_pending': counts['still_pending'],
+        'skipped': counts['skipped'],
+        'errors': len(errors),
+        'reconciled': reconciled,
+        'error_external_ids': errors,
+    }
+    logger.info(
+        f"Reconciliation checked {report['checked']} transaction(s): {report['paid']} paid, "
+        f"{report['expired']} expired, {report['failed']} failed, {report['errors']} error(s)"
+    )
+    return report
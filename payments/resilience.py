@@ -0,0 +1,257 @@
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+
+# Per-endpoint circuit breakers, bulkheads and retries for Xendit calls. Every
+# XenditService request goes through guard_for(path): the bulkhead caps how
+# many calls to one endpoint group can be in flight in this process (so slow
+# card charges can't use up capacity needed for QR/VA creation), and the
+# breaker stops calling an endpoint group that keeps failing until a
+# half-open probe succeeds. Both raise ProviderUnavailable, which the views
+# turn into a 503. RetryPolicy decides whether and when a failed attempt is
+# repeated.
+
+ENDPOINT_PREFIXES = [
+    ('/callback_virtual_accounts', 'virtual_account'),
+    ('/available_virtual_account_banks', 'virtual_account'),
+    ('/qr_codes', 'qr_code'),
+    ('/v1/credit_card', 'card'),
+    ('/v2/invoices', 'invoice'),
+]
+
+
+class ProviderUnavailable(Exception):
+    def __init__(self, endpoint, reason):
+        self.endpoint = endpoint
+        self.reason = reason
+        super().__init__(f"Xendit {endpoint} endpoint unavailable: {reason}")
+
+
+def endpoint_for(path):
+    for prefix, name in ENDPOINT_PREFIXES:
+        if path.startswith(prefix):
+            return name
+    return 'other'
+
+
+def is_provider_failure(status_code):
+    # 4xx means Xendit answered and rejected the request; only throttling and
+    # server errors say anything about the provider's health.
+    return status_code == 429 or status_code >= 500
+
+
+class CircuitBreaker:
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, name, failure_threshold, recovery_timeout, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probes_in_flight = 0
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    raise ProviderUnavailable(self.name, 'circuit open')
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+
+            if self.state == self.HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise ProviderUnavailable(self.name, 'circuit half-open, probe in flight')
+                self.probes_in_flight += 1
+
+    def record(self, success):
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+                if success:
+                    self.state = self.CLOSED
+                    self.consecutive_failures = 0
+                else:
+                    self._trip()
+                return
+
+            if success:
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'circuit_rejected': self.rejected,
+            }
+
+
+class Bulkhead:
+    def __init__(self, name, max_concurrent):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self, wait=0):
+        with self.condition:
+            if self.in_flight >= self.max_concurrent and wait > 0:
+                self.condition.wait_for(lambda: self.in_flight < self.max_concurrent, timeout=wait)
+            if self.in_flight >= self.max_concurrent:
+                self.rejected += 1
+                raise ProviderUnavailable(self.name, f'{self.max_concurrent} calls already in flight')
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'in_flight': self.in_flight,
+                'max_concurrent': self.max_concurrent,
+                'bulkhead_rejected': self.rejected,
+            }
+
+
+class EndpointGuard:
+    def __init__(self, name):
+        limits = getattr(settings, 'XENDIT_BULKHEAD_LIMITS', {})
+        self.name = name
+        self.bulkhead = Bulkhead(name, limits.get(name, getattr(settings, 'XENDIT_BULKHEAD_SIZE', 10)))
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=getattr(settings, 'XENDIT_BREAKER_FAILURE_THRESHOLD', 5),
+            recovery_timeout=getattr(settings, 'XENDIT_BREAKER_RECOVERY_SECONDS', 30),
+            half_open_max_calls=getattr(settings, 'XENDIT_BREAKER_HALF_OPEN_CALLS', 1),
+        )
+        self.retries = 0
+
+    # Sync callers may wait briefly for a bulkhead slot; async callers pass
+    # wait=0 since blocking would stall the event loop.
+    def enter(self, wait=None):
+        wait = getattr(settings, 'XENDIT_BULKHEAD_WAIT', 0.5) if wait is None else wait
+        self.bulkhead.acquire(wait)
+        try:
+            self.breaker.allow()
+        except ProviderUnavailable:
+            self.bulkhead.release()
+            raise
+
+    def exit(self, success):
+        self.bulkhead.release()
+        self.breaker.record(success)
+
+    def record_retry(self):
+        with self.bulkhead.condition:
+            self.retries += 1
+
+    def stats(self):
+        return {**self.breaker.stats(), **self.bulkhead.stats(), 'retries': self.retries}
+
+
+def idempotency_key(external_id, *parts):
+    # Stable for one logical write (same transaction, same operation), so a
+    # retried POST or a resubmitted form is deduplicated by Xendit instead of
+    # creating a second VA, invoice or charge. Callers add a generation part
+    # only where a new write must be allowed once the earlier one is settled,
+    # e.g. the id of an expired VA or of a declined charge.
+    key = ':'.join(str(part) for part in (external_id, *parts) if part)
+    if len(key) > 100:
+        key = f"{external_id[:50]}:{hashlib.sha256(key.encode()).hexdigest()[:40]}"
+    return key
+
+
+class RetryPolicy:
+    # Exponential backoff with full jitter, bounded by a max attempt count and
+    # a total deadline shared by all attempts of one call.
+    def __init__(self, max_attempts, base_delay, max_delay, deadline):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_attempts=getattr(settings, 'XENDIT_RETRY_MAX_ATTEMPTS', 3),
+            base_delay=getattr(settings, 'XENDIT_RETRY_BASE_DELAY', 0.2),
+            max_delay=getattr(settings, 'XENDIT_RETRY_MAX_DELAY', 2.0),
+            deadline=getattr(settings, 'XENDIT_RETRY_DEADLINE', 15.0),
+        )
+
+    def start(self):
+        return time.monotonic() + self.deadline
+
+    def remaining(self, deadline):
+        return deadline - time.monotonic()
+
+    def attempt_timeout(self, timeout, deadline):
+        # Clip the (connect, read) timeout so the last attempt can't overrun
+        # the budget.
+        remaining = max(self.remaining(deadline), 0.1)
+        connect_timeout, read_timeout = timeout
+        return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+    # Returns the delay before the next attempt, or None to give up.
+    def next_delay(self, attempt, deadline, retry_after=None):
+        if attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        try:
+            delay = max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            pass
+        if delay >= self.remaining(deadline):
+            return None
+        return delay
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def guard_for(path):
+    name = endpoint_for(path)
+    guard = _guards.get(name)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(name, EndpointGuard(name))
+    return guard
+
+
+def get_resilience_stats():
+    with _guards_lock:
+        guards = dict(_guards)
+    return {name: guard.stats() for name, guard in sorted(guards.items())}
+
+
+def reset_guards():
+    with _guards_lock:
+        _guards.clear()
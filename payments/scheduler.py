@@ -0,0 +1,48 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .sweeper import sweep_expired
+
+logger = logging.getLogger(__name__)
+
+# Optional in-process runner for the expiry sweep, for deployments without a
+# cron or separate worker. Started from wsgi.py/asgi.py when
+# PAYMENTS_SWEEP_INTERVAL > 0. Every worker process runs its own thread; the
+# sweep skips rows another worker has locked, so overlapping runs are safe.
+
+_thread = None
+_stop = threading.Event()
+_lock = threading.Lock()
+
+
+def _run(interval):
+    while not _stop.wait(interval):
+        close_old_connections()
+        try:
+            sweep_expired()
+        except Exception as e:
+            logger.error(f"Expiry sweep failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+def start_sweeper(interval=None):
+    global _thread
+    interval = interval if interval is not None else getattr(settings, 'PAYMENTS_SWEEP_INTERVAL', 0)
+    if interval <= 0:
+        return None
+
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _stop.clear()
+            _thread = threading.Thread(target=_run, args=(interval,), name='payments-sweeper', daemon=True)
+            _thread.start()
+            logger.info(f"Expiry sweeper started (every {interval}s)")
+    return _thread
+
+
+def stop_sweeper():
+    _stop.set()
@@ -1,28 +1,297 @@
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
 import json
 import base64
+import os
+import threading
+import time
+import weakref
+from functools import partial
+from urllib.parse import urlencode
 from django.conf import settings
 from datetime import datetime, timedelta
 import logging
-import qrcode
-from io import BytesIO
+
+from .catalog import get_catalog
+from .log import log_event
+from .metrics import observe_xendit_call
+from .qr import qr_data_uri
+from .resilience import ProviderUnavailable, RetryPolicy, endpoint_for, guard_for, idempotency_key, is_provider_failure
+from .singleflight import AsyncSingleFlight, SingleFlight
 
 logger = logging.getLogger(__name__)
 
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+_async_http_clients = weakref.WeakKeyDictionary()
+
+
+def _build_http_session():
+    pool_size = getattr(settings, 'XENDIT_POOL_SIZE', 10)
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        pool_block=getattr(settings, 'XENDIT_POOL_BLOCK', False),
+        max_retries=0,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def get_http_session():
+    # One pooled session per worker process. The pid check rebuilds it after a
+    # fork (e.g. gunicorn --preload) so workers never share sockets.
+    global _http_session, _http_session_pid
+    pid = os.getpid()
+    if _http_session is None or _http_session_pid != pid:
+        with _http_session_lock:
+            if _http_session is None or _http_session_pid != pid:
+                _http_session = _build_http_session()
+                _http_session_pid = pid
+    return _http_session
+
+
+def get_pool_stats():
+    stats = {
+        'pid': os.getpid(),
+        'pool_size': getattr(settings, 'XENDIT_POOL_SIZE', 10),
+        'requests': 0,
+        'connections_opened': 0,
+        'connections_reused': 0,
+        'idle_connections': 0,
+    }
+    if _http_session is None or _http_session_pid != stats['pid']:
+        return stats
+
+    for adapter in {id(a): a for a in _http_session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['requests'] += pool.num_requests
+            stats['connections_opened'] += pool.num_connections
+            if pool.pool is not None:
+                stats['idle_connections'] += sum(1 for conn in list(pool.pool.queue) if conn)
+
+    stats['connections_reused'] = max(stats['requests'] - stats['connections_opened'], 0)
+    return stats
+
+
+def get_async_http_client():
+    # httpx.AsyncClient is bound to the event loop that first used it, so keep
+    # one client (and connection pool) per running loop.
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+    if client is None:
+        pool_size = getattr(settings, 'XENDIT_ASYNC_POOL_SIZE', 100)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+            headers={'Connection': 'keep-alive'},
+        )
+        _async_http_clients[loop] = client
+    return client
+
+
+# Shared by every service instance in the process; XENDIT_READ_CACHE_TTL=0
+# keeps the coalescing of concurrent reads but caches nothing.
+_read_flight = SingleFlight(getattr(settings, 'XENDIT_READ_CACHE_TTL', 2.0))
+_async_read_flight = AsyncSingleFlight(getattr(settings, 'XENDIT_READ_CACHE_TTL', 2.0))
+
+
+def _is_cacheable(response):
+    return response.status_code == 200
+
+
+def _invalidate_reads(base_url, path):
+    # A write to /qr_codes/<id>/... drops cached reads of that QR code; a
+    # create (/qr_codes) drops all cached reads of the collection.
+    prefix = f"{base_url}{'/'.join(path.split('/')[:3])}"
+    _read_flight.invalidate(prefix)
+    _async_read_flight.invalidate(prefix)
+
+
+def get_read_stats():
+    return {
+        'sync': _read_flight.get_stats(),
+        'async': _async_read_flight.get_stats(),
+    }
+
+
+_service = None
+_async_service = None
+_service_lock = threading.Lock()
+
+
+def get_xendit_service():
+    # XenditService holds only settings-derived headers, so one instance per
+    # worker is shared by all requests and threads.
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = XenditService()
+    return _service
+
+
+def get_async_xendit_service():
+    global _async_service
+    if _async_service is None:
+        with _service_lock:
+            if _async_service is None:
+                _async_service = AsyncXenditService()
+    return _async_service
+
+
+# Statuses a create call succeeds with.
+CREATED = (200, 201)
+
+
+def _read_json(response):
+    return response.json()
+
+
+def _read_data(response):
+    return response.json().get('data', [])
+
+
+class XenditCall:
+    # One Xendit request and how to read its answer. XenditService and
+    # AsyncXenditService share these and differ only in how they send them.
+    # label and action name the call in error logs; read turns a success
+    # response into the result, and fallback, given a failed response, may
+    # return the next call to make instead.
+    def __init__(self, method, path, label, action, headers=None, payload=None, idempotency_key=None,
+                 ok=(200,), read=_read_json, fallback=None):
+        self.method = method
+        self.path = path
+        self.label = label
+        self.action = action
+        self.headers = headers
+        self.payload = payload
+        self.idempotency_key = idempotency_key
+        self.ok = ok
+        self.read = read
+        self.fallback = fallback
+
+    # Returns (result, next call or None).
+    def outcome(self, response):
+        if response.status_code in self.ok:
+            return self.read(response), None
+        logger.error("%s Error: %s - %s", self.label, response.status_code, response.text)
+        return None, self.fallback(response) if self.fallback else None
+
+    def failed(self, error):
+        logger.error("Error %s: %s", self.action, error)
+
+
 class XenditService:
     def __init__(self):
         self.secret_key = settings.XENDIT_SECRET_KEY
         self.public_key = getattr(settings, 'XENDIT_PUBLIC_KEY', '')
-        self.base_url = "https://api.xendit.co"
+        self.base_url = getattr(settings, 'XENDIT_API_BASE_URL', 'https://api.xendit.co').rstrip('/')
+        self.timeout = (
+            getattr(settings, 'XENDIT_CONNECT_TIMEOUT', 5),
+            getattr(settings, 'XENDIT_READ_TIMEOUT', 30),
+        )
         
         encoded_key = base64.b64encode(f"{self.secret_key}:".encode()).decode()
         self.headers = {
             'Authorization': f'Basic {encoded_key}',
             'Content-Type': 'application/json'
         }
+        self.qr_headers = {**self.headers, 'api-version': '2022-07-31'}
+        
+        encoded_public_key = base64.b64encode(f"{self.public_key}:".encode()).decode()
+        self.public_headers = {
+            'Authorization': f'Basic {encoded_public_key}',
+            'Content-Type': 'application/json'
+        }
+    
+    def _send(self, method, path, headers, payload, timeout):
+        guard = guard_for(path)
+        guard.enter()
+        success = False
+        status = None
+        start = time.perf_counter()
+        try:
+            response = get_http_session().request(
+                method,
+                f"{self.base_url}{path}",
+                headers=headers,
+                data=json.dumps(payload) if payload is not None else None,
+                timeout=timeout,
+            )
+            status = response.status_code
+            success = not is_provider_failure(status)
+            return response
+        finally:
+            guard.exit(success)
+            observe_xendit_call(endpoint_for(path), status, time.perf_counter() - start)
+    
+    def _request(self, method, path, headers=None, payload=None, idempotency_key=None):
+        if method == 'GET':
+            return _read_flight.do(
+                f"{self.base_url}{path}",
+                lambda: self._request_with_retries(method, path, headers, payload, idempotency_key),
+                cacheable=_is_cacheable,
+            )
+        try:
+            return self._request_with_retries(method, path, headers, payload, idempotency_key)
+        finally:
+            _invalidate_reads(self.base_url, path)
+    
+    def _request_headers(self, headers, idempotency_key):
+        headers = dict(headers or self.headers)
+        if idempotency_key:
+            headers['X-IDEMPOTENCY-KEY'] = idempotency_key
+        return headers
     
-    def create_virtual_account(self, external_id, amount, bank_code, customer_name="Customer"):
-        payload = {
+    # Returns the delay before retrying after response, or None to return it.
+    def _response_retry_delay(self, policy, retryable, attempt, deadline, response):
+        if retryable and is_provider_failure(response.status_code):
+            return policy.next_delay(attempt, deadline, response.headers.get('Retry-After'))
+        return None
+    
+    def _request_with_retries(self, method, path, headers=None, payload=None, idempotency_key=None):
+        # GETs are always safe to repeat; writes only when Xendit can
+        # deduplicate them by idempotency key.
+        headers = self._request_headers(headers, idempotency_key)
+        retryable = method == 'GET' or idempotency_key is not None
+        
+        policy = RetryPolicy.from_settings()
+        deadline = policy.start()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._send(method, path, headers, payload, policy.attempt_timeout(self.timeout, deadline))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = policy.next_delay(attempt, deadline) if retryable else None
+                if delay is None:
+                    raise
+                error = str(e)
+            else:
+                delay = self._response_retry_delay(policy, retryable, attempt, deadline, response)
+                if delay is None:
+                    return response
+                error = f"HTTP {response.status_code}"
+            
+            guard_for(path).record_retry()
+            logger.warning("Retrying %s %s in %.2fs after attempt %d: %s", method, path, delay, attempt, error)
+            time.sleep(delay)
+    
+    def _virtual_account_payload(self, external_id, amount, bank_code, customer_name):
+        return {
             "external_id": external_id,
             "bank_code": bank_code,
             "name": customer_name,
@@ -31,28 +300,9 @@ class XenditService:
             "is_closed": True,
             "expiration_date": (datetime.utcnow() + timedelta(hours=24)).isoformat() + "Z"
         }
-        
-        try:
-            logger.info(f"Creating {bank_code} Virtual Account for {external_id}")
-            
-            response = requests.post(
-                f"{self.base_url}/callback_virtual_accounts",
-                headers=self.headers,
-                data=json.dumps(payload)
-            )
-            
-            if response.status_code in [200, 201]:
-                return response.json()
-            else:
-                logger.error(f"VA Creation Error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error creating virtual account: {str(e)}")
-            return None
     
-    def create_qr_code(self, external_id, amount, qr_type="DYNAMIC", channel_code="ID_DANA"):
-        payload = {
+    def _qr_code_payload(self, external_id, amount, qr_type, channel_code):
+        return {
             "reference_id": external_id,
             "type": qr_type,
             "currency": "IDR",
@@ -60,137 +310,9 @@ class XenditService:
             "channel_code": channel_code,
             "expires_at": (datetime.utcnow() + timedelta(hours=24)).isoformat() + "Z"
         }
-        
-        headers = {
-            'Authorization': f'Basic {base64.b64encode(f"{self.secret_key}:".encode()).decode()}',
-            'Content-Type': 'application/json',
-            'api-version': '2022-07-31'
-        }
-        
-        try:
-            logger.info(f"Creating {qr_type} QR Code with {channel_code} for {external_id}")
-            logger.info(f"Amount: Rp {amount:,}")
-            
-            response = requests.post(
-                f"{self.base_url}/qr_codes",
-                headers=headers,
-                data=json.dumps(payload)
-            )
-            
-            logger.info(f"QR API Response Status: {response.status_code}")
-            
-            if response.status_code in [200, 201]:
-                qr_data = response.json()
-                
-                qr_string = qr_data.get('qr_string', '')
-                logger.info(f"✅ QR Code created successfully!")
-                logger.info(f"   QR ID: {qr_data.get('id')}")
-                logger.info(f"   Status: {qr_data.get('status')}")
-                logger.info(f"   Channel: {qr_data.get('channel_code')}")
-                logger.info(f"   Amount: Rp {qr_data.get('amount'):,}")
-                logger.info(f"   QR String Length: {len(qr_string)} characters")
-                logger.info(f"   QR String Preview: {qr_string[:100]}...")
-                
-                qr_string = qr_data.get('qr_string', '')
-                
-                if qr_string == "some-random-qr-string":
-                    logger.info("   Detected test mode - generating realistic test QR code")
-                    test_qris_string = self.generate_test_qris_string(
-                        amount=qr_data.get('amount', 1000),
-                        merchant_name="Test Merchant",
-                        reference_id=qr_data.get('reference_id', 'test')
-                    )
-                    qr_data['qr_code_image'] = self.generate_qr_code_image(test_qris_string)
-                    qr_data['qr_string'] = test_qris_string
-                    qr_data['test_mode'] = True
-                    logger.info(f"   Generated test QRIS string: {test_qris_string[:50]}...")
-                    
-                elif qr_string and len(qr_string) > 10:  # Valid QRIS string should be longer
-                    qr_data['qr_code_image'] = self.generate_qr_code_image(qr_string)
-                    logger.info("   QR Code image generated successfully")
-                    
-                else:
-                    logger.warning(f"   Invalid or empty QR string received: '{qr_string}'")
-                    fallback_data = f"PAYMENT:{qr_data.get('id')}:IDR:{qr_data.get('amount')}:{qr_data.get('reference_id')}"
-                    qr_data['qr_code_image'] = self.generate_qr_code_image(fallback_data)
-                    qr_data['qr_string'] = fallback_data
-                    qr_data['fallback_mode'] = True
-                    logger.info("   Generated fallback QR code")
-                
-                return qr_data
-            else:
-                logger.error(f"QR Creation Error: {response.status_code}")
-                logger.error(f"Response: {response.text}")
-                
-                if channel_code == "ID_DANA":
-                    logger.info("Trying ID_LINKAJA as fallback...")
-                    return self._create_qr_code_with_linkaja(external_id, amount, qr_type)
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error creating QR code: {str(e)}")
-            return None
-    
-    def _create_qr_code_with_linkaja(self, external_id, amount, qr_type):
-        payload = {
-            "reference_id": external_id,
-            "type": qr_type,
-            "currency": "IDR",
-            "amount": int(float(amount)),
-            "channel_code": "ID_LINKAJA",
-            "expires_at": (datetime.utcnow() + timedelta(hours=24)).isoformat() + "Z"
-        }
-        
-        headers = {
-            'Authorization': f'Basic {base64.b64encode(f"{self.secret_key}:".encode()).decode()}',
-            'Content-Type': 'application/json',
-            'api-version': '2022-07-31'
-        }
-        
-        try:
-            logger.info(f"Trying ID_LINKAJA QR for {external_id}")
-            response = requests.post(
-                f"{self.base_url}/qr_codes",
-                headers=headers,
-                data=json.dumps(payload)
-            )
-            
-            if response.status_code in [200, 201]:
-                qr_data = response.json()
-                
-                qr_string = qr_data.get('qr_string', '')
-                
-                if qr_string == "some-random-qr-string":
-                    logger.info("   LinkAja test mode - generating realistic test QR code")
-                    test_qris_string = self.generate_test_qris_string(
-                        amount=qr_data.get('amount', 1000),
-                        merchant_name="LinkAja Test Merchant",
-                        reference_id=qr_data.get('reference_id', 'linkaja_test')
-                    )
-                    qr_data['qr_code_image'] = self.generate_qr_code_image(test_qris_string)
-                    qr_data['qr_string'] = test_qris_string
-                    qr_data['test_mode'] = True
-                    
-                elif qr_string and len(qr_string) > 10:
-                    qr_data['qr_code_image'] = self.generate_qr_code_image(qr_string)
-                    
-                else:
-                    fallback_data = f"LINKAJA_PAYMENT:{qr_data.get('id')}:IDR:{qr_data.get('amount')}"
-                    qr_data['qr_code_image'] = self.generate_qr_code_image(fallback_data)
-                    qr_data['qr_string'] = fallback_data
-                    qr_data['fallback_mode'] = True
-                    
-                return qr_data
-            else:
-                logger.error(f"LINKAJA QR Creation Error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error with LINKAJA QR endpoint: {str(e)}")
-            return None
     
-    def tokenize_card(self, card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name):
-        payload = {
+    def _card_token_payload(self, card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name):
+        return {
             "card_number": card_number,
             "card_exp_month": card_exp_month,
             "card_exp_year": card_exp_year,
@@ -198,129 +320,18 @@ class XenditService:
             "card_holder_name": card_holder_name,
             "is_multiple_use": False
         }
-        
-        headers = {
-            'Authorization': f'Basic {base64.b64encode(f"{self.public_key}:".encode()).decode()}',
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/v1/credit_card_tokens",
-                headers=headers,
-                data=json.dumps(payload)
-            )
-            
-            if response.status_code in [200, 201]:
-                return response.json()
-            else:
-                logger.error(f"Card Tokenization Error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error tokenizing card: {str(e)}")
-            return None
     
-    def charge_credit_card(self, external_id, amount, token_id, description):
-        payload = {
+    def _card_charge_payload(self, external_id, amount, token_id, description):
+        return {
             "token_id": token_id,
             "external_id": external_id,
             "amount": float(amount),
             "description": description,
             "currency": "IDR"
         }
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}/v1/credit_card_charges",
-                headers=self.headers,
-                data=json.dumps(payload)
-            )
-            
-            if response.status_code in [200, 201]:
-                return response.json()
-            else:
-                logger.error(f"Card Charge Error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error charging card: {str(e)}")
-            return None
-    
-    def get_available_banks(self):
-        banks = [
-            {"code": "BCA", "name": "Bank Central Asia", "fee": 0},
-            {"code": "BNI", "name": "Bank Negara Indonesia", "fee": 0},
-            {"code": "BRI", "name": "Bank Rakyat Indonesia", "fee": 0},
-            {"code": "MANDIRI", "name": "Bank Mandiri", "fee": 0},
-            {"code": "PERMATA", "name": "Bank Permata", "fee": 0},
-            {"code": "BSI", "name": "Bank Syariah Indonesia", "fee": 0},
-        ]
-        return banks    
-    
-    def get_available_qr_types(self):
-        qr_types = [
-            {
-                "code": "QRIS_GENERAL",
-                "channel_code": "ID_DANA", 
-                "name": "QRIS Universal",
-                "description": "Universal QRIS - Works with GoPay, OVO, DANA, ShopeePay, LinkAja, BCA Mobile, Mandiri Livin, and all QRIS apps",
-                "icon": "🏷️",
-                "popular": True
-            },
-            {
-                "code": "DANA_QR",
-                "channel_code": "ID_DANA",
-                "name": "DANA QR Code", 
-                "description": "DANA-optimized QRIS - Works with DANA and all other QRIS-enabled apps",
-                "icon": "💙",
-                "popular": True
-            },
-            {
-                "code": "LINKAJA_QR", 
-                "channel_code": "ID_LINKAJA",
-                "name": "LinkAja QR Code",
-                "description": "LinkAja-optimized QRIS - Works with LinkAja and all other QRIS-enabled apps", 
-                "icon": "🔗",
-                "popular": True
-            },
-            {
-                "code": "GOPAY_COMPATIBLE",
-                "channel_code": "ID_DANA",
-                "name": "GoPay Compatible",
-                "description": "QRIS code compatible with GoPay, DANA, OVO, and all QRIS network apps",
-                "icon": "�",
-                "popular": True
-            }
-        ]
-        return qr_types
     
-    def create_qr_code_by_type(self, external_id, amount, qr_code_type="QRIS_GENERAL"):
-        qr_types = self.get_available_qr_types()
-        qr_type_info = next((qt for qt in qr_types if qt["code"] == qr_code_type), None)
-        
-        if not qr_type_info:
-            logger.error(f"Unknown QR code type: {qr_code_type}")
-            return None
-        
-        channel_code = qr_type_info["channel_code"]
-        logger.info(f"Creating {qr_type_info['name']} QR code using channel {channel_code}")
-        
-        return self.create_qr_code(
-            external_id=external_id,
-            amount=amount,
-            qr_type="DYNAMIC",
-            channel_code=channel_code
-        )
-
-    def verify_callback_token(self, callback_token):
-        return callback_token == settings.XENDIT_CALLBACK_TOKEN
-    
-    def validate_webhook_signature(self, raw_request_body, signature):
-        return True
-    
-    def create_invoice(self, external_id, amount, description, customer_email="customer@example.com", customer_name="Customer"):
-        payload = {
+    def _invoice_payload(self, external_id, amount, description, customer_email, customer_name):
+        return {
             "external_id": external_id,
             "amount": int(float(amount)),
             "description": description,
@@ -338,97 +349,249 @@ class XenditService:
             "success_redirect_url": f"{settings.APP_URL}/payment/success/",
             "failure_redirect_url": f"{settings.APP_URL}/payment/failed/"
         }
+    
+    def _prepare_qr_data(self, qr_data):
+        # Sandbox keys return a placeholder qr_string; swap in a scannable test
+        # QRIS payload (or a fallback string) so the checkout page can render it.
+        # The image itself is rendered on demand by the qr_code_image view.
+        qr_string = qr_data.get('qr_string', '')
+        is_linkaja = qr_data.get('channel_code') == 'ID_LINKAJA'
         
-        try:
-            logger.info(f"Creating invoice for {external_id} - Amount: {amount}")
-            response = requests.post(
-                f"{self.base_url}/v2/invoices",
-                headers=self.headers,
-                data=json.dumps(payload)
+        if qr_string == "some-random-qr-string":
+            test_qris_string = self.generate_test_qris_string(
+                amount=qr_data.get('amount', 1000),
+                merchant_name="LinkAja Test Merchant" if is_linkaja else "Test Merchant",
+                reference_id=qr_data.get('reference_id', 'linkaja_test' if is_linkaja else 'test')
             )
+            qr_data['qr_string'] = test_qris_string
+            qr_data['test_mode'] = True
             
-            if response.status_code in [200, 201]:
-                return response.json()
+        elif not (qr_string and len(qr_string) > 10):  # Valid QRIS string should be longer
+            logger.warning("Invalid or empty QR string received: %r", qr_string)
+            if is_linkaja:
+                fallback_data = f"LINKAJA_PAYMENT:{qr_data.get('id')}:IDR:{qr_data.get('amount')}"
             else:
-                logger.error(f"Invoice Creation Error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error creating invoice: {str(e)}")
+                fallback_data = f"PAYMENT:{qr_data.get('id')}:IDR:{qr_data.get('amount')}:{qr_data.get('reference_id')}"
+            qr_data['qr_string'] = fallback_data
+            qr_data['fallback_mode'] = True
+        
+        return qr_data
+    
+    def _log_qr_created(self, external_id, qr_data):
+        log_event(
+            logger, 'xendit.qr_created',
+            external_id=external_id,
+            qr_id=qr_data.get('id'),
+            status=qr_data.get('status'),
+            channel=qr_data.get('channel_code'),
+            amount=qr_data.get('amount'),
+            mode='test' if qr_data.get('test_mode') else 'fallback' if qr_data.get('fallback_mode') else 'live',
+        )
+    
+    def _log_va_created(self, external_id, va_data):
+        log_event(
+            logger, 'xendit.va_created',
+            external_id=external_id,
+            va_id=va_data.get('id'),
+            bank=va_data.get('bank_code'),
+            amount=va_data.get('expected_amount'),
+        )
+    
+    def _read_virtual_account(self, external_id, response):
+        va_data = response.json()
+        self._log_va_created(external_id, va_data)
+        return va_data
+    
+    def _read_qr_code(self, external_id, response):
+        qr_data = self._prepare_qr_data(response.json())
+        self._log_qr_created(external_id, qr_data)
+        return qr_data
+    
+    # Request builders: everything about a call except sending it. Each
+    # public method below runs one of them through _execute.
+    
+    def _virtual_account_call(self, external_id, amount, bank_code, customer_name, generation):
+        return XenditCall(
+            'POST', "/callback_virtual_accounts", 'VA Creation', 'creating virtual account',
+            payload=self._virtual_account_payload(external_id, amount, bank_code, customer_name),
+            idempotency_key=idempotency_key(external_id, 'va', bank_code, generation),
+            ok=CREATED,
+            read=partial(self._read_virtual_account, external_id),
+        )
+    
+    def _qr_code_call(self, external_id, amount, qr_type, channel_code):
+        linkaja = channel_code == "ID_LINKAJA"
+        return XenditCall(
+            'POST', "/qr_codes",
+            'LINKAJA QR Creation' if linkaja else 'QR Creation',
+            'with LINKAJA QR endpoint' if linkaja else 'creating QR code',
+            headers=self.qr_headers,
+            payload=self._qr_code_payload(external_id, amount, qr_type, channel_code),
+            ok=CREATED,
+            read=partial(self._read_qr_code, external_id),
+            fallback=partial(self._qr_fallback, external_id, amount, qr_type) if channel_code == "ID_DANA" else None,
+        )
+    
+    def _qr_fallback(self, external_id, amount, qr_type, response):
+        # Only a rejection of the DANA channel is worth a LinkAja retry; on a
+        # 5xx the second call would just add load to a struggling API.
+        if 400 <= response.status_code < 500:
+            logger.info("Trying ID_LINKAJA as fallback...")
+            return self._qr_code_call(external_id, amount, qr_type, "ID_LINKAJA")
+        return None
+    
+    def _qr_code_by_type_call(self, external_id, amount, qr_code_type):
+        qr_type_info = get_catalog().qr_type(qr_code_type)
+        if not qr_type_info:
+            logger.error("Unknown QR code type: %s", qr_code_type)
             return None
+        return self._qr_code_call(external_id, amount, "DYNAMIC", qr_type_info["channel_code"])
     
-    def simulate_qr_payment(self, qr_id, amount=None):
-        payload = {}
-        if amount:
-            payload["amount"] = int(float(amount))
-        
-        headers = {
-            'Authorization': f'Basic {base64.b64encode(f"{self.secret_key}:".encode()).decode()}',
-            'Content-Type': 'application/json',
-            'api-version': '2022-07-31'
-        }
-        
-        try:
-            logger.info(f"Simulating QR payment for {qr_id}")
-            response = requests.post(
-                f"{self.base_url}/qr_codes/{qr_id}/payments/simulate",
-                headers=headers,
-                data=json.dumps(payload)
-            )
-            
-            if response.status_code in [200, 201]:
-                return response.json()
-            else:
-                logger.error(f"QR Payment Simulation Error: {response.status_code} - {response.text}")
+    def _card_token_call(self, card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name):
+        return XenditCall(
+            'POST', "/v1/credit_card_tokens", 'Card Tokenization', 'tokenizing card',
+            headers=self.public_headers,
+            payload=self._card_token_payload(card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name),
+            ok=CREATED,
+        )
+    
+    def _card_charge_call(self, external_id, amount, token_id, description, generation):
+        return XenditCall(
+            'POST', "/v1/credit_card_charges", 'Card Charge', 'charging card',
+            payload=self._card_charge_payload(external_id, amount, token_id, description),
+            idempotency_key=idempotency_key(external_id, 'charge', generation),
+            ok=CREATED,
+        )
+    
+    def _available_banks_call(self):
+        return XenditCall('GET', "/available_virtual_account_banks", 'Get Available Banks', 'getting available banks')
+    
+    def _invoice_call(self, external_id, amount, description, customer_email, customer_name):
+        logger.info("Creating invoice for %s - Amount: %s", external_id, amount)
+        return XenditCall(
+            'POST', "/v2/invoices", 'Invoice Creation', 'creating invoice',
+            payload=self._invoice_payload(external_id, amount, description, customer_email, customer_name),
+            idempotency_key=idempotency_key(external_id, 'invoice'),
+            ok=CREATED,
+        )
+    
+    def _simulate_qr_payment_call(self, qr_id, amount):
+        logger.info("Simulating QR payment for %s", qr_id)
+        return XenditCall(
+            'POST', f"/qr_codes/{qr_id}/payments/simulate", 'QR Payment Simulation', 'simulating QR payment',
+            headers=self.qr_headers,
+            payload={"amount": int(float(amount))} if amount else {},
+            ok=CREATED,
+        )
+    
+    def _qr_code_read_call(self, qr_id):
+        return XenditCall('GET', f"/qr_codes/{qr_id}", 'Get QR Code', 'getting QR code', headers=self.qr_headers)
+    
+    def _qr_code_payments_call(self, qr_id):
+        return XenditCall(
+            'GET', f"/qr_codes/{qr_id}/payments", 'Get QR Payments', 'getting QR payments',
+            headers=self.qr_headers, read=_read_data,
+        )
+    
+    def _invoice_read_call(self, invoice_id):
+        return XenditCall('GET', f"/v2/invoices/{invoice_id}", 'Get Invoice', 'getting invoice')
+    
+    def _virtual_account_read_call(self, va_id):
+        return XenditCall(
+            'GET', f"/callback_virtual_accounts/{va_id}", 'Get Virtual Account', 'getting virtual account'
+        )
+    
+    def _virtual_account_payment_call(self, payment_id):
+        return XenditCall(
+            'GET', f"/callback_virtual_account_payments/payment_id={payment_id}",
+            'Get Virtual Account Payment', 'getting virtual account payment',
+        )
+    
+    def _virtual_account_transactions_call(self, external_id):
+        # Payments into the VAs created with this external_id, from the
+        # Transactions API; the only VA payment lookup that needs no payment_id.
+        query = urlencode({'reference_id': external_id, 'types': 'PAYMENT', 'channel_categories': 'VIRTUAL_ACCOUNT'})
+        return XenditCall(
+            'GET', f"/transactions?{query}", 'Get Virtual Account Transactions', 'getting virtual account transactions',
+            read=_read_data,
+        )
+    
+    def _execute(self, call):
+        # Sends call, and the fallback call it asks for if any; returns the
+        # result, or None if the call failed.
+        result = None
+        while call is not None:
+            try:
+                response = self._request(call.method, call.path, call.headers, call.payload, call.idempotency_key)
+            except ProviderUnavailable:
+                raise
+            except Exception as e:
+                call.failed(e)
                 return None
-                
-        except Exception as e:
-            logger.error(f"Error simulating QR payment: {str(e)}")
-            return None
+            result, call = call.outcome(response)
+        return result
+    
+    def create_virtual_account(self, external_id, amount, bank_code, customer_name="Customer", generation=''):
+        return self._execute(self._virtual_account_call(external_id, amount, bank_code, customer_name, generation))
+    
+    def create_qr_code(self, external_id, amount, qr_type="DYNAMIC", channel_code="ID_DANA"):
+        return self._execute(self._qr_code_call(external_id, amount, qr_type, channel_code))
+    
+    def tokenize_card(self, card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name):
+        return self._execute(
+            self._card_token_call(card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name)
+        )
+    
+    def charge_credit_card(self, external_id, amount, token_id, description, generation=''):
+        return self._execute(self._card_charge_call(external_id, amount, token_id, description, generation))
+    
+    def fetch_available_banks(self):
+        return self._execute(self._available_banks_call())
+    
+    def get_available_banks(self):
+        return get_catalog().banks
+    
+    def get_available_qr_types(self):
+        return get_catalog().qr_types
+    
+    def create_qr_code_by_type(self, external_id, amount, qr_code_type="QRIS_GENERAL"):
+        return self._execute(self._qr_code_by_type_call(external_id, amount, qr_code_type))
+
+    def verify_callback_token(self, callback_token):
+        return callback_token == settings.XENDIT_CALLBACK_TOKEN
+    
+    def validate_webhook_signature(self, raw_request_body, signature):
+        return True
+    
+    def create_invoice(self, external_id, amount, description, customer_email="customer@example.com", customer_name="Customer"):
+        return self._execute(self._invoice_call(external_id, amount, description, customer_email, customer_name))
+    
+    def simulate_qr_payment(self, qr_id, amount=None):
+        return self._execute(self._simulate_qr_payment_call(qr_id, amount))
 
     def get_qr_code_by_id(self, qr_id):
-        headers = {
-            'Authorization': f'Basic {base64.b64encode(f"{self.secret_key}:".encode()).decode()}',
-            'Content-Type': 'application/json',
-            'api-version': '2022-07-31'
-        }
-        
-        try:
-            response = requests.get(
-                f"{self.base_url}/qr_codes/{qr_id}",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Get QR Code Error: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error getting QR code: {str(e)}")
-            return None
+        return self._execute(self._qr_code_read_call(qr_id))
+
+    def get_qr_code_payments(self, qr_id):
+        return self._execute(self._qr_code_payments_call(qr_id))
+    
+    def get_invoice(self, invoice_id):
+        return self._execute(self._invoice_read_call(invoice_id))
+    
+    def get_virtual_account(self, va_id):
+        return self._execute(self._virtual_account_read_call(va_id))
+
+    def get_virtual_account_payment(self, payment_id):
+        return self._execute(self._virtual_account_payment_call(payment_id))
+
+    def get_virtual_account_transactions(self, external_id):
+        return self._execute(self._virtual_account_transactions_call(external_id))
 
     def generate_qr_code_image(self, qr_string):
         try:
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(qr_string)
-            qr.make(fit=True)
-
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_str}"
+            return qr_data_uri(qr_string, 'png')
         except Exception as e:
-            logger.error(f"Error generating QR code image: {str(e)}")
+            logger.error("Error generating QR code image: %s", e)
             return None
     
     def generate_test_qris_string(self, amount, merchant_name="Test Merchant", reference_id="test"):
@@ -458,5 +621,127 @@ class XenditService:
             return test_qris
             
         except Exception as e:
-            logger.error(f"Error generating test QRIS string: {str(e)}")
+            logger.error("Error generating test QRIS string: %s", e)
             return f"TEST_QRIS:{reference_id}:IDR:{amount}:MERCHANT:{merchant_name}"
+
+
+# Same surface as XenditService with awaitable upstream calls, used by the
+# async views so one ASGI worker can keep many Xendit round trips in flight.
+class AsyncXenditService(XenditService):
+    
+    async def _send(self, method, path, headers, payload, timeout):
+        connect_timeout, read_timeout = timeout
+        guard = guard_for(path)
+        guard.enter(wait=0)
+        success = False
+        status = None
+        start = time.perf_counter()
+        try:
+            response = await get_async_http_client().request(
+                method,
+                f"{self.base_url}{path}",
+                headers=headers,
+                content=json.dumps(payload) if payload is not None else None,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+            status = response.status_code
+            success = not is_provider_failure(status)
+            return response
+        finally:
+            guard.exit(success)
+            observe_xendit_call(endpoint_for(path), status, time.perf_counter() - start)
+    
+    async def _request(self, method, path, headers=None, payload=None, idempotency_key=None):
+        if method == 'GET':
+            return await _async_read_flight.do(
+                f"{self.base_url}{path}",
+                lambda: self._request_with_retries(method, path, headers, payload, idempotency_key),
+                cacheable=_is_cacheable,
+            )
+        try:
+            return await self._request_with_retries(method, path, headers, payload, idempotency_key)
+        finally:
+            _invalidate_reads(self.base_url, path)
+    
+    async def _request_with_retries(self, method, path, headers=None, payload=None, idempotency_key=None):
+        headers = self._request_headers(headers, idempotency_key)
+        retryable = method == 'GET' or idempotency_key is not None
+        
+        policy = RetryPolicy.from_settings()
+        deadline = policy.start()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._send(method, path, headers, payload, policy.attempt_timeout(self.timeout, deadline))
+            except httpx.TransportError as e:
+                delay = policy.next_delay(attempt, deadline) if retryable else None
+                if delay is None:
+                    raise
+                error = str(e) or type(e).__name__
+            else:
+                delay = self._response_retry_delay(policy, retryable, attempt, deadline, response)
+                if delay is None:
+                    return response
+                error = f"HTTP {response.status_code}"
+            
+            guard_for(path).record_retry()
+            logger.warning("Retrying %s %s in %.2fs after attempt %d: %s", method, path, delay, attempt, error)
+            await asyncio.sleep(delay)
+    
+    async def _execute(self, call):
+        result = None
+        while call is not None:
+            try:
+                response = await self._request(call.method, call.path, call.headers, call.payload, call.idempotency_key)
+            except ProviderUnavailable:
+                raise
+            except Exception as e:
+                call.failed(e)
+                return None
+            result, call = call.outcome(response)
+        return result
+    
+    async def create_virtual_account(self, external_id, amount, bank_code, customer_name="Customer", generation=''):
+        return await self._execute(self._virtual_account_call(external_id, amount, bank_code, customer_name, generation))
+    
+    async def create_qr_code(self, external_id, amount, qr_type="DYNAMIC", channel_code="ID_DANA"):
+        return await self._execute(self._qr_code_call(external_id, amount, qr_type, channel_code))
+    
+    async def create_qr_code_by_type(self, external_id, amount, qr_code_type="QRIS_GENERAL"):
+        return await self._execute(self._qr_code_by_type_call(external_id, amount, qr_code_type))
+    
+    async def tokenize_card(self, card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name):
+        return await self._execute(
+            self._card_token_call(card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name)
+        )
+    
+    async def charge_credit_card(self, external_id, amount, token_id, description, generation=''):
+        return await self._execute(self._card_charge_call(external_id, amount, token_id, description, generation))
+    
+    async def create_invoice(self, external_id, amount, description, customer_email="customer@example.com", customer_name="Customer"):
+        return await self._execute(self._invoice_call(external_id, amount, description, customer_email, customer_name))
+    
+    async def simulate_qr_payment(self, qr_id, amount=None):
+        return await self._execute(self._simulate_qr_payment_call(qr_id, amount))
+
+    async def get_qr_code_by_id(self, qr_id):
+        return await self._execute(self._qr_code_read_call(qr_id))
+
+    async def get_qr_code_payments(self, qr_id):
+        return await self._execute(self._qr_code_payments_call(qr_id))
+    
+    async def get_invoice(self, invoice_id):
+        return await self._execute(self._invoice_read_call(invoice_id))
+    
+    async def get_virtual_account(self, va_id):
+        return await self._execute(self._virtual_account_read_call(va_id))
+
+    async def get_virtual_account_payment(self, payment_id):
+        return await self._execute(self._virtual_account_payment_call(payment_id))
+
+    async def get_virtual_account_transactions(self, external_id):
+        return await self._execute(self._virtual_account_transactions_call(external_id))
+    
+    async def fetch_available_banks(self):
+        return await self._execute(self._available_banks_call())
@@ -0,0 +1,64 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import signed_cookies
+from django.contrib.sessions.backends.base import VALID_KEY_CHARS
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger(__name__)
+
+# Transactions, UserAccess rows and access tokens are keyed by the visitor's
+# session. With the DB-backed engines (PAYMENTS_SESSION_MODE db or
+# cached_db) that is the session key itself. The signed_cookies engine keeps
+# the whole session in the cookie, so its "session key" is the signed data
+# and changes with every write; there the payment key is a random id stored
+# in the session on first purchase. payment_session_key() hides the
+# difference and never loads a DB-backed session.
+
+PAYMENT_KEY = '_payment_session_key'
+
+
+def payment_session_key(request, create=False):
+    # Returns the key payment rows are stored under, or None when the
+    # visitor has none yet and create is False.
+    session = request.session
+    if isinstance(session, signed_cookies.SessionStore):
+        key = session.get(PAYMENT_KEY)
+        if key is None and create:
+            key = session[PAYMENT_KEY] = get_random_string(32, VALID_KEY_CHARS)
+        return key
+
+    if session.session_key is None and create:
+        session.create()
+    return session.session_key
+
+
+def cleanup_sessions(batch_size=None, pause=0, now=None):
+    # Deletes expired rows of the session table in primary-key batches, so
+    # no single statement holds locks across the whole table the way
+    # `clearsessions` does. Returns the number of rows deleted.
+    batch_size = batch_size or getattr(settings, 'PAYMENTS_SESSION_CLEANUP_BATCH_SIZE', 1000)
+    now = now or timezone.now()
+    total = 0
+
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by('session_key')
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            break
+        deleted, _ = Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()
+        total += deleted
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if total:
+        logger.info(f"Deleted {total} expired session(s)")
+    return total
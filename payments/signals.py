@@ -0,0 +1,59 @@
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .access import revoke_access
+from .cache import invalidate_transaction, invalidate_user_access
+from .events import access_channel, access_event, broker, status_event, transaction_channel, transaction_event
+from .models import Transaction, UserAccess
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction_id = instance.pk
+    db_transaction.on_commit(lambda: invalidate_transaction(transaction_id))
+
+    channel = transaction_channel(transaction_id)
+    if broker.has_subscribers(channel):
+        event = transaction_event(instance)
+        db_transaction.on_commit(lambda: broker.publish(channel, event))
+
+
+@receiver(post_save, sender=UserAccess)
+def user_access_saved(sender, instance, created, **kwargs):
+    session_key = instance.session_key
+    db_transaction.on_commit(lambda: invalidate_user_access(session_key))
+    if not created:
+        # After the cache invalidation, so a token can't be re-issued from a
+        # stale snapshot.
+        db_transaction.on_commit(lambda: revoke_access([session_key]))
+
+    channel = access_channel(session_key)
+    if broker.has_subscribers(channel):
+        event = access_event(instance)
+        db_transaction.on_commit(lambda: broker.publish(channel, event))
+
+
+@receiver(post_delete, sender=UserAccess)
+def user_access_deleted(sender, instance, **kwargs):
+    session_key = instance.session_key
+    db_transaction.on_commit(lambda: invalidate_user_access(session_key))
+    db_transaction.on_commit(lambda: revoke_access([session_key]))
+
+
+# update() and bulk_update() don't send post_save, so bulk writers (the expiry
+# sweep, reconciliation) call these from on_commit instead.
+def notify_transactions(transaction_ids, status):
+    event = status_event(status)
+    for transaction_id in transaction_ids:
+        invalidate_transaction(transaction_id)
+        broker.publish(transaction_channel(transaction_id), event)
+
+
+def notify_user_access(events):
+    # events maps session_key -> access event
+    for session_key, event in events.items():
+        invalidate_user_access(session_key)
+        broker.publish(access_channel(session_key), event)
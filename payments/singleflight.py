@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+# Request coalescing for idempotent Xendit reads. Concurrent callers asking
+# for the same key share one in-flight call and its result, and a successful
+# result is kept for a short TTL, so a burst of status checks or
+# verify_payment clicks for one QR/invoice/VA costs a single upstream request
+# per worker. Writes to a resource drop its cached reads via invalidate().
+
+MAX_CACHED_RESULTS = 1024
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _ResultCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.results = {}
+        self.stats = Counter()
+
+    # Callers hold self.lock.
+    def _cached(self, key):
+        cached = self.results.get(key)
+        if cached is None:
+            return False, None
+        expires_at, result = cached
+        if expires_at <= time.monotonic():
+            del self.results[key]
+            return False, None
+        self.stats['cache_hits'] += 1
+        return True, result
+
+    def _store(self, key, result):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        if len(self.results) >= MAX_CACHED_RESULTS:
+            self.results = {k: v for k, v in self.results.items() if v[0] > now}
+            if len(self.results) >= MAX_CACHED_RESULTS:
+                self.results.clear()
+        self.results[key] = (now + self.ttl, result)
+
+    def invalidate(self, prefix):
+        with self.lock:
+            for key in [key for key in self.results if key.startswith(prefix)]:
+                del self.results[key]
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['cached'] = len(self.results)
+        for name in ('cache_hits', 'coalesced', 'upstream'):
+            stats.setdefault(name, 0)
+        return stats
+
+
+class SingleFlight(_ResultCache):
+    def __init__(self, ttl):
+        super().__init__(ttl)
+        self.calls = {}
+
+    def do(self, key, fn, cacheable=lambda result: True):
+        with self.lock:
+            hit, result = self._cached(key)
+            if hit:
+                return result
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.stats['upstream'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+                if call.error is None and cacheable(call.result):
+                    self._store(key, call.result)
+            call.done.set()
+
+
+class AsyncSingleFlight(_ResultCache):
+    # In-flight calls are futures of the running loop, so they are keyed by
+    # loop as well; the TTL cache is shared.
+    def __init__(self, ttl):
+        super().__init__(ttl)
+        self.calls = {}
+
+    async def do(self, key, fn, cacheable=lambda result: True):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            hit, result = self._cached(key)
+            if hit:
+                return result
+            future = self.calls.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self.calls[(loop, key)] = loop.create_future()
+                self.stats['upstream'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            # shield: a cancelled follower must not cancel the shared call.
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            with self.lock:
+                self.calls.pop((loop, key), None)
+            future.set_exception(e)
+            # Retrieved here so an unawaited future doesn't log a warning.
+            future.exception()
+            raise
+
+        with self.lock:
+            self.calls.pop((loop, key), None)
+            if cacheable(result):
+                self._store(key, result)
+        future.set_result(result)
+        return result
@@ -0,0 +1,99 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .access import purge_revocations
+from .models import Transaction, UserAccess
+from .signals import notify_transactions, notify_user_access
+
+logger = logging.getLogger(__name__)
+
+# Set-based expiry of PENDING transactions and lapsed UserAccess rows. Each
+# chunk picks candidate ids through the partial indexes, locks them in primary
+# key order (skipping rows a webhook is updating right now) and flips them in
+# a single UPDATE, then reports the change through the signals.py notify_*
+# helpers since update() bypasses post_save.
+
+
+def _chunk_size(chunk_size):
+    return chunk_size or getattr(settings, 'PAYMENTS_SWEEP_CHUNK_SIZE', 1000)
+
+
+def expire_pending_transactions(chunk_size=None, now=None):
+    chunk_size = _chunk_size(chunk_size)
+    now = now or timezone.now()
+    total = 0
+
+    while True:
+        candidates = list(
+            Transaction.objects.filter(status='PENDING', expires_at__lt=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not candidates:
+            break
+
+        with db_transaction.atomic():
+            ids = list(
+                Transaction.objects.select_for_update(skip_locked=True)
+                .filter(id__in=candidates, status='PENDING')
+                .order_by('id')
+                .values_list('id', flat=True)
+            )
+            Transaction.objects.filter(id__in=ids).update(status='EXPIRED', updated_at=now)
+            db_transaction.on_commit(lambda ids=ids: notify_transactions(ids, 'EXPIRED'))
+
+        total += len(ids)
+        # Nothing lockable left in this chunk: the remaining rows are held by
+        # concurrent writers and will be picked up on the next sweep.
+        if not ids or len(candidates) < chunk_size:
+            break
+
+    if total:
+        logger.info(f"Expired {total} pending transaction(s)")
+    return total
+
+
+def deactivate_expired_access(chunk_size=None, now=None):
+    chunk_size = _chunk_size(chunk_size)
+    now = now or timezone.now()
+    total = 0
+
+    while True:
+        candidates = list(
+            UserAccess.objects.filter(is_active=True, expires_at__lt=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not candidates:
+            break
+
+        with db_transaction.atomic():
+            rows = list(
+                UserAccess.objects.select_for_update(skip_locked=True)
+                .filter(id__in=candidates, is_active=True, expires_at__lt=now)
+                .order_by('id')
+                .values_list('id', 'session_key')
+            )
+            UserAccess.objects.filter(id__in=[pk for pk, _ in rows]).update(is_active=False)
+            events = {session_key: {'has_access': False} for _, session_key in rows}
+            db_transaction.on_commit(lambda events=events: notify_user_access(events))
+
+        total += len(rows)
+        if not rows or len(candidates) < chunk_size:
+            break
+
+    if total:
+        logger.info(f"Deactivated {total} expired user access row(s)")
+    return total
+
+
+def sweep_expired(chunk_size=None):
+    now = timezone.now()
+    return {
+        'transactions_expired': expire_pending_transactions(chunk_size, now),
+        'access_deactivated': deactivate_expired_access(chunk_size, now),
+        'revocations_purged': purge_revocations(now),
+    }
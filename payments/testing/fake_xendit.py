@@ -0,0 +1,564 @@
+"""
+In-memory stand-in for the parts of the Xendit API this app calls.
+
+Point XENDIT_API_BASE_URL at it to exercise the payment views,
+`manage.py reconcile_payments` and benchmarks without sandbox keys:
+
+    python -m payments.testing.fake_xendit --port 8765
+    XENDIT_API_BASE_URL=http://127.0.0.1:8765 python manage.py runserver
+
+From Python, start_fake_xendit() runs it on a background thread and returns
+the server; server.state exposes the stored objects and mark_* helpers to
+settle payments without sending a webhook (the "missed webhook" case).
+
+With --webhook-url (and --callback-token), paying through the pay_* helpers,
+the QR simulate endpoint or the /_fake/... control routes also POSTs the
+matching Xendit callback to the app:
+
+    python -m payments.testing.fake_xendit --webhook-url http://127.0.0.1:8000/callback/xendit/
+    curl -X POST http://127.0.0.1:8765/_fake/qr_codes/<qr_id>/pay
+
+--latency-ms/--jitter-ms delay every API response and --error-rate answers
+that share of API requests with --error-status instead, to see how the app
+behaves against a slow or failing provider.
+
+Only depends on the standard library so it can run outside Django.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from urllib.parse import parse_qsl
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value=None):
+    return (value or _now()).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _new_id(prefix=''):
+    return f"{prefix}{uuid.uuid4().hex[:24]}"
+
+
+def _not_found(kind):
+    return 404, {'error_code': 'DATA_NOT_FOUND', 'message': f'{kind} not found'}
+
+
+class FakeXenditState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.virtual_accounts = {}
+        self.va_payments = {}
+        self.qr_codes = {}
+        self.qr_payments = defaultdict(list)
+        self.invoices = {}
+        self.card_tokens = {}
+        self.charges = {}
+        self.requests = Counter()
+        self.idempotent_responses = {}
+        # Called with each callback payload produced by the pay_* helpers.
+        self.on_payment = None
+
+        self.routes = [
+            ('POST', r'/callback_virtual_accounts', self.create_virtual_account),
+            ('GET', r'/callback_virtual_accounts/(?P<va_id>[^/]+)', self.get_virtual_account),
+            ('GET', r'/callback_virtual_account_payments/payment_id=(?P<payment_id>[^/]+)', self.get_va_payment),
+            ('GET', r'/available_virtual_account_banks', self.available_banks),
+            ('GET', r'/transactions', self.list_transactions),
+            ('POST', r'/qr_codes', self.create_qr_code),
+            ('GET', r'/qr_codes/(?P<qr_id>[^/]+)', self.get_qr_code),
+            ('GET', r'/qr_codes/(?P<qr_id>[^/]+)/payments', self.get_qr_payments),
+            ('POST', r'/qr_codes/(?P<qr_id>[^/]+)/payments/simulate', self.simulate_qr_payment),
+            ('POST', r'/v2/invoices', self.create_invoice),
+            ('GET', r'/v2/invoices/(?P<invoice_id>[^/]+)', self.get_invoice),
+            ('POST', r'/v1/credit_card_tokens', self.tokenize_card),
+            ('POST', r'/v1/credit_card_charges', self.charge_card),
+            ('POST', r'/_fake/qr_codes/(?P<qr_id>[^/]+)/pay', self.control_pay_qr_code),
+            ('POST', r'/_fake/virtual_accounts/(?P<account_number>[^/]+)/pay', self.control_pay_virtual_account),
+            ('POST', r'/_fake/invoices/(?P<invoice_id>[^/]+)/pay', self.control_pay_invoice),
+        ]
+        self.routes = [(method, re.compile(f'^{pattern}$'), handler) for method, pattern, handler in self.routes]
+
+    def dispatch(self, method, path, body, idempotency_key=None):
+        path, _, query = path.partition('?')
+        path = path.rstrip('/') or '/'
+        if method == 'GET' and query:
+            body = dict(parse_qsl(query))
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                with self.lock:
+                    self.requests[f'{method} {pattern.pattern}'] += 1
+                    # Like Xendit, a repeated write with the same key gets the
+                    # original response instead of creating a second object.
+                    key = (path, idempotency_key)
+                    if idempotency_key and key in self.idempotent_responses:
+                        return self.idempotent_responses[key]
+                    result = handler(body, **match.groupdict())
+                    if idempotency_key and method == 'POST' and result[0] < 300:
+                        self.idempotent_responses[key] = result
+                    return result
+        return 404, {'error_code': 'NOT_FOUND', 'message': f'No route for {method} {path}'}
+
+    # Virtual accounts
+
+    def create_virtual_account(self, body):
+        va_id = _new_id()
+        va = {
+            'id': va_id,
+            'owner_id': 'fake_owner',
+            'external_id': body.get('external_id'),
+            'bank_code': body.get('bank_code'),
+            'merchant_code': '88608',
+            'account_number': f"88608{len(self.virtual_accounts) + 1:011d}",
+            'name': body.get('name'),
+            'expected_amount': body.get('expected_amount'),
+            'is_single_use': body.get('is_single_use', False),
+            'is_closed': body.get('is_closed', False),
+            'expiration_date': body.get('expiration_date') or _timestamp(_now() + timedelta(days=1)),
+            'currency': 'IDR',
+            'status': 'ACTIVE',
+        }
+        self.virtual_accounts[va_id] = va
+        return 200, va
+
+    def get_virtual_account(self, body, va_id):
+        va = self.virtual_accounts.get(va_id)
+        return (200, va) if va else _not_found('Callback virtual account')
+
+    def get_va_payment(self, body, payment_id):
+        payment = self.va_payments.get(payment_id)
+        return (200, payment) if payment else _not_found('Callback virtual account payment')
+
+    def list_transactions(self, body):
+        # Only VA payments are recorded as transactions here.
+        data = [
+            {
+                'id': f"txn_{payment['payment_id']}",
+                'product_id': payment['callback_virtual_account_id'],
+                'type': 'PAYMENT',
+                'status': 'SUCCESS',
+                'channel_category': 'VIRTUAL_ACCOUNT',
+                'channel_code': payment['bank_code'],
+                'reference_id': payment['external_id'],
+                'currency': 'IDR',
+                'amount': payment['amount'],
+                'created': payment['transaction_timestamp'],
+            }
+            for payment in self.va_payments.values()
+            if body.get('reference_id') in (None, payment['external_id'])
+        ]
+        return 200, {'has_more': False, 'data': data}
+
+    def available_banks(self, body):
+        banks = ['BCA', 'BNI', 'BRI', 'MANDIRI', 'PERMATA', 'BSI']
+        return 200, [{'name': code, 'code': code, 'is_activated': True} for code in banks]
+
+    # QR codes
+
+    def create_qr_code(self, body):
+        qr_id = _new_id('qr_')
+        qr = {
+            'id': qr_id,
+            'reference_id': body.get('reference_id'),
+            'business_id': 'fake_business',
+            'type': body.get('type', 'DYNAMIC'),
+            'currency': body.get('currency', 'IDR'),
+            'amount': body.get('amount'),
+            'channel_code': body.get('channel_code'),
+            # Same placeholder the Xendit sandbox returns.
+            'qr_string': 'some-random-qr-string',
+            'status': 'ACTIVE',
+            'expires_at': body.get('expires_at') or _timestamp(_now() + timedelta(days=1)),
+            'created': _timestamp(),
+            'updated': _timestamp(),
+        }
+        self.qr_codes[qr_id] = qr
+        return 201, qr
+
+    def get_qr_code(self, body, qr_id):
+        qr = self.qr_codes.get(qr_id)
+        return (200, qr) if qr else _not_found('QR code')
+
+    def get_qr_payments(self, body, qr_id):
+        if qr_id not in self.qr_codes:
+            return _not_found('QR code')
+        return 200, {'data': self.qr_payments[qr_id], 'has_more': False}
+
+    def simulate_qr_payment(self, body, qr_id):
+        qr = self.qr_codes.get(qr_id)
+        if not qr:
+            return _not_found('QR code')
+        payment = self._pay_qr(qr, body.get('amount'))
+        # dispatch() holds the lock; notify once the response is on its way.
+        threading.Thread(target=self._notify, args=(self.qr_callback(payment),), daemon=True).start()
+        return 200, payment
+
+    def _pay_qr(self, qr, amount=None):
+        payment = {
+            'id': _new_id('qrpy_'),
+            'business_id': qr['business_id'],
+            'currency': qr['currency'],
+            'amount': amount or qr['amount'],
+            'status': 'SUCCEEDED',
+            'created': _timestamp(),
+            'qr_id': qr['id'],
+            'qr_string': qr['qr_string'],
+            'reference_id': qr['reference_id'],
+            'type': qr['type'],
+            'channel_code': qr['channel_code'],
+        }
+        self.qr_payments[qr['id']].append(payment)
+        if qr['type'] == 'DYNAMIC':
+            qr['status'] = 'INACTIVE'
+        return payment
+
+    # Invoices
+
+    def create_invoice(self, body):
+        invoice_id = _new_id()
+        invoice = {
+            'id': invoice_id,
+            'external_id': body.get('external_id'),
+            'user_id': 'fake_user',
+            'status': 'PENDING',
+            'merchant_name': 'Fake Merchant',
+            'amount': body.get('amount'),
+            'description': body.get('description'),
+            'invoice_url': f"https://checkout.fake-xendit.local/web/{invoice_id}",
+            'expiry_date': _timestamp(_now() + timedelta(seconds=body.get('invoice_duration', 86400))),
+            'currency': 'IDR',
+            'created': _timestamp(),
+            'updated': _timestamp(),
+        }
+        self.invoices[invoice_id] = invoice
+        return 200, invoice
+
+    def get_invoice(self, body, invoice_id):
+        invoice = self.invoices.get(invoice_id)
+        return (200, invoice) if invoice else _not_found('Invoice')
+
+    # Cards
+
+    def tokenize_card(self, body):
+        token_id = _new_id()
+        # 4000000000000002 is declined, like in the Xendit sandbox.
+        declined = str(body.get('card_number', '')).endswith('0002')
+        self.card_tokens[token_id] = {'declined': declined}
+        return 200, {
+            'id': token_id,
+            'status': 'VERIFIED',
+            'masked_card_number': f"{str(body.get('card_number', ''))[:6]}XXXXXX{str(body.get('card_number', ''))[-4:]}",
+        }
+
+    def charge_card(self, body):
+        token = self.card_tokens.get(body.get('token_id'))
+        if token is None:
+            return 400, {'error_code': 'TOKEN_NOT_FOUND_ERROR', 'message': 'Token not found'}
+        charge = {
+            'id': _new_id(),
+            'external_id': body.get('external_id'),
+            'capture_amount': body.get('amount'),
+            'currency': body.get('currency', 'IDR'),
+            'status': 'FAILED' if token['declined'] else 'CAPTURED',
+            'failure_reason': 'CARD_DECLINED' if token['declined'] else None,
+            'created': _timestamp(),
+        }
+        self.charges[charge['id']] = charge
+        return 200, charge
+
+    # Control helpers: settle payments on the fake side without a webhook.
+
+    def _find(self, store, external_id, key='external_id'):
+        return next((item for item in store.values() if item.get(key) == external_id), None)
+
+    def mark_invoice_paid(self, external_id, payment_method='BANK_TRANSFER'):
+        with self.lock:
+            invoice = self._find(self.invoices, external_id)
+            if invoice:
+                invoice.update(status='PAID', payment_method=payment_method, paid_at=_timestamp())
+            return invoice
+
+    def mark_qr_paid(self, external_id):
+        with self.lock:
+            qr = self._find(self.qr_codes, external_id, key='reference_id')
+            return self._pay_qr(qr) if qr else None
+
+    def mark_virtual_account_paid(self, external_id):
+        with self.lock:
+            va = self._find(self.virtual_accounts, external_id)
+            if va:
+                va['status'] = 'INACTIVE'
+                self.va_callback(va)
+            return va
+
+    def expire_invoice(self, external_id):
+        with self.lock:
+            invoice = self._find(self.invoices, external_id)
+            if invoice:
+                invoice['status'] = 'EXPIRED'
+            return invoice
+
+    # Callback payloads, shaped like the ones Xendit sends for each product.
+
+    def qr_callback(self, payment):
+        return {
+            'event': 'qr.payment',
+            'api_version': '2022-07-31',
+            'business_id': payment['business_id'],
+            'created': _timestamp(),
+            'data': payment,
+        }
+
+    def va_callback(self, va, amount=None):
+        # Also records the payment for the payment_id lookup.
+        payment = {
+            'id': _new_id(),
+            'payment_id': _new_id('vap_'),
+            'callback_virtual_account_id': va['id'],
+            'owner_id': va['owner_id'],
+            'external_id': va['external_id'],
+            'account_number': va['account_number'],
+            'bank_code': va['bank_code'],
+            'merchant_code': va['merchant_code'],
+            'amount': amount or va['expected_amount'],
+            'transaction_timestamp': _timestamp(),
+        }
+        self.va_payments[payment['payment_id']] = payment
+        return payment
+
+    def invoice_callback(self, invoice):
+        return {
+            'id': invoice['id'],
+            'external_id': invoice['external_id'],
+            'user_id': invoice['user_id'],
+            'status': invoice['status'],
+            'amount': invoice['amount'],
+            'paid_amount': invoice['amount'],
+            'payment_method': invoice.get('payment_method'),
+            'paid_at': invoice.get('paid_at'),
+            'currency': invoice['currency'],
+        }
+
+    def _notify(self, payload):
+        if self.on_payment is not None:
+            self.on_payment(payload)
+
+    # Pay like a customer would: settle on the fake side and return the
+    # callback payload, also handed to on_payment. Return None if unknown.
+
+    def pay_qr_code(self, qr_id):
+        with self.lock:
+            qr = self.qr_codes.get(qr_id)
+            payload = self.qr_callback(self._pay_qr(qr)) if qr else None
+        if payload:
+            self._notify(payload)
+        return payload
+
+    def pay_virtual_account(self, account_number):
+        with self.lock:
+            va = self._find(self.virtual_accounts, account_number, key='account_number')
+            payload = None
+            if va:
+                va['status'] = 'INACTIVE'
+                payload = self.va_callback(va)
+        if payload:
+            self._notify(payload)
+        return payload
+
+    def pay_invoice(self, invoice_id, payment_method='BANK_TRANSFER'):
+        with self.lock:
+            invoice = self.invoices.get(invoice_id)
+            payload = None
+            if invoice:
+                invoice.update(status='PAID', payment_method=payment_method, paid_at=_timestamp())
+                payload = self.invoice_callback(invoice)
+        if payload:
+            self._notify(payload)
+        return payload
+
+    # Control routes for the pay_* helpers, run on a thread for the same
+    # reason.
+
+    def _control_pay(self, pay, *args):
+        threading.Thread(target=pay, args=args, daemon=True).start()
+        return 202, {'message': 'Payment scheduled'}
+
+    def control_pay_qr_code(self, body, qr_id):
+        if qr_id not in self.qr_codes:
+            return _not_found('QR code')
+        return self._control_pay(self.pay_qr_code, qr_id)
+
+    def control_pay_virtual_account(self, body, account_number):
+        if not self._find(self.virtual_accounts, account_number, key='account_number'):
+            return _not_found('Callback virtual account')
+        return self._control_pay(self.pay_virtual_account, account_number)
+
+    def control_pay_invoice(self, body, invoice_id):
+        if invoice_id not in self.invoices:
+            return _not_found('Invoice')
+        return self._control_pay(self.pay_invoice, invoice_id)
+
+
+class Faults:
+    # Latency and error injection for the API routes (not /_fake/...).
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.injected = Counter()
+
+    def apply(self, path):
+        # Returns an error (status, payload) to answer with, or None.
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        if path.startswith('/_fake/') or random.random() >= self.error_rate:
+            return None
+        self.injected[self.error_status] += 1
+        return self.error_status, {'error_code': 'SERVER_ERROR', 'message': 'Injected failure'}
+
+
+class WebhookSender:
+    # POSTs callback payloads to the app, like Xendit's webhook delivery.
+    def __init__(self, url, callback_token='', timeout=10):
+        self.url = url
+        self.callback_token = callback_token
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.deliveries = Counter()
+
+    def deliver(self, payload):
+        # Returns (HTTP status or None on connection error, seconds taken).
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json', 'X-Callback-Token': self.callback_token},
+            method='POST',
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = None
+        with self.lock:
+            self.deliveries[status] += 1
+        return status, time.perf_counter() - start
+
+    def deliver_in_background(self, payload):
+        threading.Thread(target=self.deliver, args=(payload,), daemon=True).start()
+
+
+class FakeXenditHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeXendit/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            status, payload = 400, {'error_code': 'INVALID_JSON_FORMAT', 'message': 'Invalid JSON'}
+        else:
+            error = self.server.faults.apply(self.path)
+            status, payload = error or self.server.state.dispatch(
+                self.command, self.path, body, self.headers.get('X-IDEMPOTENCY-KEY')
+            )
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeXenditServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), verbose=False, faults=None, webhook_url=None, callback_token=''):
+        super().__init__(address, FakeXenditHandler)
+        self.state = FakeXenditState()
+        self.verbose = verbose
+        self.faults = faults or Faults()
+        self.webhooks = WebhookSender(webhook_url, callback_token) if webhook_url else None
+        if self.webhooks:
+            self.state.on_payment = self.webhooks.deliver_in_background
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_xendit(host='127.0.0.1', port=0, verbose=False, faults=None, webhook_url=None, callback_token=''):
+    server = FakeXenditServer(
+        (host, port), verbose=verbose, faults=faults, webhook_url=webhook_url, callback_token=callback_token
+    )
+    threading.Thread(target=server.serve_forever, name='fake-xendit', daemon=True).start()
+    return server
+
+
+def add_fault_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added to every API response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Extra random latency, up to this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of API requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+
+
+def faults_from_arguments(args):
+    return Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake Xendit API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--quiet', action='store_true')
+    add_fault_arguments(parser)
+    parser.add_argument('--webhook-url', help="The app's /callback/xendit/ URL")
+    parser.add_argument('--callback-token', default='', help='Sent as X-Callback-Token')
+    args = parser.parse_args()
+
+    server = FakeXenditServer(
+        (args.host, args.port),
+        verbose=not args.quiet,
+        faults=faults_from_arguments(args),
+        webhook_url=args.webhook_url,
+        callback_token=args.callback_token,
+    )
+    print(f"Fake Xendit listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import json
+import time
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from payments.access import (
+    AccessGrant, cookie_name, denylist, get_request_access, issue_token, revoke_access, verify_token,
+)
+from payments.models import RevokedAccess, UserAccess
+
+from .utils import create_transaction
+
+
+class AccessTokenTests(TestCase):
+    def setUp(self):
+        transaction = create_transaction(status='PAID')
+        self.user_access = UserAccess.objects.create(
+            session_key=transaction.session_key, **transaction.access_defaults()
+        )
+        self.session_key = transaction.session_key
+
+    def grant(self, issued_at=None):
+        return AccessGrant.from_user_access(self.user_access, issued_at=issued_at)
+
+    def test_token_is_bound_to_the_session(self):
+        token = issue_token(self.grant())
+        grant = verify_token(token, self.session_key)
+        self.assertEqual(grant.package.id, self.user_access.package_id)
+        self.assertIsNone(verify_token(token, 'another_session'))
+        self.assertIsNone(verify_token(token[:-2] + 'xx', self.session_key))
+
+    def test_revocation_rejects_older_tokens(self):
+        token = issue_token(self.grant(issued_at=time.time() - 1))
+        revoke_access([self.session_key])
+
+        self.assertIsNone(verify_token(token, self.session_key))
+        self.assertIsNotNone(verify_token(issue_token(self.grant(issued_at=time.time() + 1)), self.session_key))
+
+    def test_revocation_from_another_process_is_synced(self):
+        token = issue_token(self.grant(issued_at=time.time() - 1))
+        RevokedAccess.objects.create(session_key=self.session_key, revoked_at=timezone.now())
+        denylist.synced_at = None
+
+        self.assertIsNone(verify_token(token, self.session_key))
+
+    def test_token_is_issued_from_one_read(self):
+        request = RequestFactory().get('/')
+
+        with mock.patch('payments.access.payment_session_key', return_value=self.session_key), \
+                self.assertNumQueries(1):
+            grant = get_request_access(request)
+
+        self.assertEqual(grant.package.id, self.user_access.package_id)
+        self.assertEqual(verify_token(request._premium_access_token, self.session_key).session_key, self.session_key)
+
+    def test_saving_user_access_revokes_tokens(self):
+        token = issue_token(self.grant(issued_at=time.time() - 1))
+        self.user_access.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_access.save()
+
+        self.assertIsNone(verify_token(token, self.session_key))
+
+
+@override_settings(XENDIT_CALLBACK_TOKEN='', XENDIT_WEBHOOK_QUEUE=False, PAYMENTS_PRECREATE=False)
+class AccessFlowTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_payment_unlocks_paid_content(self):
+        transaction = create_transaction()
+        response = self.client.get(f'/buy/{transaction.package_id}/')
+        transaction_id = self.client.session['current_transaction_id']
+        self.assertRedirects(response, f'/payment/methods/{transaction_id}/', fetch_redirect_response=False)
+        self.assertFalse(self.client.get('/check-access/').json()['has_access'])
+
+        external_id = self.client.session['current_external_id']
+        self.client.post('/callback/xendit/', json.dumps({
+            'id': 'inv_1', 'external_id': external_id, 'status': 'PAID',
+        }), content_type='application/json')
+
+        response = self.client.get('/check-access/')
+        self.assertTrue(response.json()['has_access'])
+        self.assertIn(cookie_name(), response.cookies)
+        self.assertEqual(self.client.get('/paid-content/').status_code, 200)
@@ -0,0 +1,44 @@
+import uuid
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from payments.archive import archive_transactions, get_transaction
+from payments.models import Transaction, TransactionArchive
+
+from .utils import create_transaction
+
+
+class ArchiveTests(TestCase):
+    def settled(self, **fields):
+        transaction = create_transaction(status='PAID', paid_at=timezone.now(), **fields)
+        Transaction.objects.filter(id=transaction.id).update(updated_at=timezone.now() - timedelta(days=120))
+        return transaction
+
+    def test_archived_transaction_is_still_found(self):
+        transaction = self.settled(payment_details={'id': 'va_1'})
+        self.assertEqual(archive_transactions(older_than_days=90), 1)
+
+        self.assertFalse(Transaction.objects.filter(id=transaction.id).exists())
+        restored = get_transaction(external_id=transaction.external_id)
+        self.assertTrue(restored.is_archived)
+        self.assertEqual(restored.payment_details, {'id': 'va_1'})
+
+    def test_recent_transactions_stay(self):
+        create_transaction(status='PAID', paid_at=timezone.now())
+        self.assertEqual(archive_transactions(older_than_days=90), 0)
+
+    def test_rows_the_archive_rejects_are_kept(self):
+        kept = self.settled()
+        archived = self.settled()
+        # Same external_id under another id: the insert conflicts and is
+        # skipped by ignore_conflicts.
+        TransactionArchive.objects.create(
+            id=uuid.uuid4(), external_id=kept.external_id, session_key='other', amount=1,
+            status='PAID', created_at=timezone.now(), data=b'',
+        )
+
+        self.assertEqual(archive_transactions(older_than_days=90), 1)
+        self.assertTrue(Transaction.objects.filter(id=kept.id).exists())
+        self.assertFalse(Transaction.objects.filter(id=archived.id).exists())
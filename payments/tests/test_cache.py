@@ -0,0 +1,64 @@
+import uuid
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from payments import cache as payment_cache
+from payments.models import Transaction, UserAccess
+
+from .utils import create_transaction
+
+
+class PollingCacheTests(TestCase):
+    # QuerySet.update() and bulk_create() skip the post_save receivers, like a
+    # write made by another worker process or a management command.
+
+    def setUp(self):
+        caches['default'].clear()
+        self.transaction = create_transaction()
+
+    def test_pending_status_is_cached_briefly(self):
+        self.assertEqual(payment_cache.get_transaction_status(self.transaction.id), 'PENDING')
+        with self.assertNumQueries(0):
+            self.assertEqual(payment_cache.get_transaction_status(self.transaction.id), 'PENDING')
+
+    def test_saved_payment_drops_cached_pending_status(self):
+        payment_cache.get_transaction_status(self.transaction.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.transaction.status = 'PAID'
+            self.transaction.save()
+
+        response = self.client.get(f'/check-payment/{self.transaction.id}/')
+        self.assertTrue(response.json()['paid'])
+
+    @override_settings(PAYMENTS_CACHE_PENDING_TIMEOUT=0)
+    def test_pending_status_is_not_cached_when_disabled(self):
+        self.assertEqual(payment_cache.get_transaction_status(self.transaction.id), 'PENDING')
+        Transaction.objects.filter(id=self.transaction.id).update(status='PAID')
+
+        self.assertEqual(payment_cache.get_transaction_status(self.transaction.id), 'PAID')
+
+    def test_paid_status_is_served_from_cache(self):
+        Transaction.objects.filter(id=self.transaction.id).update(status='PAID')
+        payment_cache.get_transaction_status(self.transaction.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(payment_cache.get_transaction_status(self.transaction.id), 'PAID')
+
+    def test_unknown_transaction(self):
+        missing = uuid.uuid4()
+        self.assertIsNone(payment_cache.get_transaction_status(missing))
+        self.assertEqual(self.client.get(f'/check-payment/{missing}/').status_code, 404)
+
+    def test_missing_access_is_not_cached(self):
+        session_key = self.transaction.session_key
+        self.assertIsNone(payment_cache.get_user_access(session_key))
+
+        Transaction.objects.filter(id=self.transaction.id).update(status='PAID')
+        self.transaction.refresh_from_db()
+        UserAccess.objects.bulk_create([UserAccess(session_key=session_key, **self.transaction.access_defaults())])
+
+        snapshot = payment_cache.get_user_access(session_key)
+        self.assertEqual(snapshot['package_id'], self.transaction.package_id)
+        with self.assertNumQueries(0):
+            payment_cache.get_user_access(session_key)
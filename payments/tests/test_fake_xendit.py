@@ -0,0 +1,51 @@
+import json
+import urllib.request
+
+from django.test import SimpleTestCase
+
+from payments.testing.fake_xendit import FakeXenditState, Faults, start_fake_xendit
+
+
+class FakeXenditStateTests(SimpleTestCase):
+    def setUp(self):
+        self.state = FakeXenditState()
+
+    def test_idempotent_writes_return_the_first_response(self):
+        body = {'external_id': 'ext_1', 'bank_code': 'BCA', 'expected_amount': 50000}
+        first = self.state.dispatch('POST', '/callback_virtual_accounts', body, idempotency_key='key')
+        second = self.state.dispatch('POST', '/callback_virtual_accounts', body, idempotency_key='key')
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.state.virtual_accounts), 1)
+
+    def test_paying_a_qr_code_produces_its_callback(self):
+        received = []
+        self.state.on_payment = received.append
+        status, qr = self.state.dispatch('POST', '/qr_codes', {'reference_id': 'ext_1', 'amount': 50000})
+        self.assertEqual(status, 201)
+
+        callback = self.state.pay_qr_code(qr['id'])
+        self.assertEqual(received, [callback])
+        self.assertEqual(callback['data']['qr_id'], qr['id'])
+        self.assertEqual(self.state.dispatch('GET', f"/qr_codes/{qr['id']}", {})[1]['status'], 'INACTIVE')
+
+    def test_unknown_route(self):
+        self.assertEqual(self.state.dispatch('GET', '/nothing', {})[0], 404)
+
+
+class FakeXenditServerTests(SimpleTestCase):
+    def test_injected_errors(self):
+        server = start_fake_xendit(faults=Faults(error_rate=1.0, error_status=503))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        request = urllib.request.Request(f'{server.url}/available_virtual_account_banks')
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request, timeout=5)
+        self.assertEqual(error.exception.code, 503)
+
+        # Control routes are never failed.
+        status, qr = server.state.dispatch('POST', '/qr_codes', {'reference_id': 'ext_1', 'amount': 1})
+        request = urllib.request.Request(f"{server.url}/_fake/qr_codes/{qr['id']}/pay", data=b'{}', method='POST')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            self.assertEqual(response.status, 202)
+            self.assertEqual(json.loads(response.read())['message'], 'Payment scheduled')
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from payments.instruments import (
+    InstrumentBusy, _lease_timeout, activate_instrument, instrument_lock, obtain_instrument, store_instrument,
+    va_key,
+)
+from payments.models import Transaction
+
+from .utils import create_transaction
+
+
+def virtual_account(**fields):
+    return {
+        'id': 'va_1',
+        'account_number': '8860800000000001',
+        'bank_code': 'BCA',
+        'status': 'ACTIVE',
+        'expiration_date': (timezone.now() + timedelta(days=1)).isoformat(),
+        **fields,
+    }
+
+
+@override_settings(PAYMENT_CATALOG_REMOTE=False)
+class InstrumentLockTests(TestCase):
+    def setUp(self):
+        self.transaction = create_transaction()
+
+    def test_second_request_fails_fast(self):
+        with instrument_lock(self.transaction.id):
+            with self.assertRaises(InstrumentBusy):
+                with instrument_lock(self.transaction.id):
+                    pass
+        with instrument_lock(self.transaction.id):
+            pass
+
+    def test_lapsed_lease_is_taken_over(self):
+        Transaction.objects.filter(id=self.transaction.id).update(
+            instrument_locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        with instrument_lock(self.transaction.id):
+            pass
+        self.assertIsNone(Transaction.objects.get(id=self.transaction.id).instrument_locked_until)
+
+    @override_settings(PAYMENTS_INSTRUMENT_LOCK_TIMEOUT=0, XENDIT_RETRY_DEADLINE=15, XENDIT_CONNECT_TIMEOUT=5)
+    def test_lease_outlives_the_qr_fallback(self):
+        self.assertGreaterEqual(_lease_timeout(), timedelta(seconds=2 * (15 + 5)))
+
+    @override_settings(PAYMENTS_INSTRUMENT_WAIT=0)
+    def test_busy_instrument_answers_409(self):
+        with instrument_lock(self.transaction.id):
+            response = self.client.post(f'/payment/va/{self.transaction.id}/', {'bank_code': 'BCA'})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()['busy'])
+
+    def test_request_waits_for_pre_creation(self):
+        # Pre-creation of the VA holds the lease when the user picks it.
+        Transaction.objects.filter(id=self.transaction.id).update(
+            instrument_locked_until=timezone.now() + timedelta(minutes=1)
+        )
+
+        def precreation_finishes(seconds):
+            store_instrument(self.transaction.id, va_key('BCA'), virtual_account(id='va_pre'))
+            Transaction.objects.filter(id=self.transaction.id).update(instrument_locked_until=None)
+
+        with mock.patch('payments.instruments.time.sleep', side_effect=precreation_finishes), \
+                mock.patch('payments.services.XenditService.create_virtual_account') as create:
+            response = self.client.post(f'/payment/va/{self.transaction.id}/', {'bank_code': 'BCA'})
+
+        create.assert_not_called()
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(response.json()['va_number'], '8860800000000001')
+        self.assertEqual(Transaction.objects.get(id=self.transaction.id).payment_method, 'VA_BCA')
+
+
+class ObtainInstrumentTests(TestCase):
+    def setUp(self):
+        self.transaction = create_transaction()
+        self.created = []
+
+    def create(self):
+        self.created.append(virtual_account())
+        return self.created[-1]
+
+    def test_valid_instrument_is_reused(self):
+        first = obtain_instrument(self.transaction, va_key('BCA'), 'VA_BCA', self.create)
+        transaction = Transaction.objects.with_payloads('payment_details').get(id=self.transaction.id)
+        second = obtain_instrument(transaction, va_key('BCA'), 'VA_BCA', self.create)
+
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(transaction.va_account_number, '8860800000000001')
+
+    def test_waiter_reuses_the_instrument_of_the_lease_holder(self):
+        Transaction.objects.filter(id=self.transaction.id).update(
+            instrument_locked_until=timezone.now() + timedelta(minutes=1)
+        )
+
+        def holder_finishes(seconds):
+            transaction = Transaction.objects.get(id=self.transaction.id)
+            activate_instrument(transaction, va_key('BCA'), virtual_account(id='va_first'), 'VA_BCA')
+            transaction.instrument_locked_until = None
+            transaction.save()
+
+        with mock.patch('payments.instruments.time.sleep', side_effect=holder_finishes) as sleep:
+            data = obtain_instrument(self.transaction, va_key('BCA'), 'VA_BCA', self.create)
+
+        sleep.assert_called_once()
+        self.assertEqual(data['id'], 'va_first')
+        self.assertEqual(self.created, [])
+
+    def test_rejected_instrument_is_not_stored(self):
+        data = obtain_instrument(
+            self.transaction, va_key('BCA'), 'VA_BCA', self.create, accept=lambda data: False
+        )
+        self.assertEqual(data['id'], 'va_1')
+        self.transaction.refresh_from_db()
+        self.assertIsNone(self.transaction.payment_details)
@@ -0,0 +1,72 @@
+import copy
+import io
+import json
+import logging
+import logging.config
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from payments.log import JsonFormatter, QueueingHandler, log_event
+from payments.webhooks import process_callback
+
+from .utils import create_transaction
+
+
+class LoggingSettingsTests(SimpleTestCase):
+    def tearDown(self):
+        logging.config.dictConfig(settings.LOGGING)
+
+    def test_settings_logging_loads(self):
+        # Python 3.12+ treats QueueHandler subclasses in dictConfig specially;
+        # the settings must load on the runtime Python.
+        for queued in (True, False):
+            config = copy.deepcopy(settings.LOGGING)
+            if not queued:
+                config['handlers']['console'] = {'class': 'logging.StreamHandler', 'formatter': 'json'}
+            with self.subTest(queued=queued):
+                logging.config.dictConfig(config)
+                handler = logging.getLogger('payments').handlers[0]
+                self.assertEqual(isinstance(handler, QueueingHandler), queued)
+
+
+class QueueingHandlerTests(SimpleTestCase):
+    def test_records_are_written_by_the_listener(self):
+        stream = io.StringIO()
+        handler = QueueingHandler(stream=stream)
+        handler.setFormatter(JsonFormatter())
+        logger = logging.getLogger('payments.tests.queueing')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            values = {'attempt': 1}
+            logger.warning('attempt %(attempt)s', values)
+            values['attempt'] = 2
+            log_event(logger, 'test.event', external_id='ext_1')
+        finally:
+            logger.removeHandler(handler)
+            logger.propagate = True
+            handler.close()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        # %-args are resolved when logged, not when the listener writes.
+        self.assertEqual(lines[0]['message'], 'attempt 1')
+        self.assertEqual(lines[1]['event'], 'test.event')
+        self.assertEqual(lines[1]['external_id'], 'ext_1')
+
+
+@override_settings(PAYMENTS_LOG_SAMPLE_RATE=0.0)
+class CallbackSamplingTests(TestCase):
+    def events(self, logs):
+        return [record.msg.event for record in logs.records if hasattr(record.msg, 'event')]
+
+    def test_paid_callback_is_never_sampled(self):
+        transaction = create_transaction()
+        payload = {'id': 'inv_1', 'external_id': transaction.external_id, 'status': 'PAID'}
+
+        with self.assertLogs('payments.webhooks', 'INFO') as logs:
+            process_callback(payload)
+            process_callback(payload)
+            logging.getLogger('payments.webhooks').info('end')
+
+        self.assertEqual(self.events(logs), ['callback.applied'])
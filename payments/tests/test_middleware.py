@@ -0,0 +1,55 @@
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from payments.access import AccessTokenMiddleware, cookie_name
+from payments.metrics import MetricsMiddleware, registry
+from payments.models import Package
+
+
+def counter(name, labels):
+    return registry.counters.get((name, labels), 0)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def test_async_view_queries_are_counted(self):
+        async def view(request):
+            await Package.objects.acount()
+            await Package.objects.acount()
+            return HttpResponse(status=201)
+
+        middleware = MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        requests = counter('payments_http_requests_total', ('unmatched', 'GET', '201'))
+        queries = counter('payments_db_queries_total', ('unmatched',))
+
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(counter('payments_http_requests_total', ('unmatched', 'GET', '201')), requests + 1)
+        self.assertEqual(counter('payments_db_queries_total', ('unmatched',)), queries + 2)
+
+    def test_sync_view_is_labelled_and_counted(self):
+        requests = counter('payments_http_requests_total', ('home', 'GET', '200'))
+        self.client.get('/')
+        self.assertEqual(counter('payments_http_requests_total', ('home', 'GET', '200')), requests + 1)
+
+
+class AccessTokenMiddlewareTests(TestCase):
+    def test_async_response_gets_cookie(self):
+        async def view(request):
+            request._premium_access_token = 'token'
+            return HttpResponse()
+
+        middleware = AccessTokenMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(response.cookies[cookie_name()].value, 'token')
+
+    def test_sync_response_drops_stale_cookie(self):
+        def view(request):
+            request._premium_access_token = None
+            return HttpResponse()
+
+        response = AccessTokenMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response.cookies[cookie_name()]['max-age'], 0)
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from payments.reconciliation import apply_remote_statuses, fetch_remote_status
+from payments.services import XenditService
+
+from .utils import FakeXenditTestCase, create_transaction
+
+
+class VirtualAccountReconciliationTests(FakeXenditTestCase):
+    def create_va_transaction(self, **va_fields):
+        transaction = create_transaction(payment_method='VA_BCA')
+        va = XenditService().create_virtual_account(transaction.external_id, 50000, 'BCA')
+        va.update(va_fields)
+        transaction.payment_details = va
+        transaction.save()
+        return transaction, va
+
+    def test_payment_without_payment_id_found_by_external_id(self):
+        # Paid, but the webhook was lost and no payment id is known.
+        transaction, va = self.create_va_transaction()
+        self.fake.state.pay_virtual_account(va['account_number'])
+
+        status, data = fetch_remote_status(XenditService(), transaction)
+        self.assertEqual(status, 'PAID')
+        self.assertEqual(data['reference_id'], transaction.external_id)
+
+    def test_paid_after_expiration_is_not_expired(self):
+        transaction, va = self.create_va_transaction()
+        self.fake.state.pay_virtual_account(va['account_number'])
+        self.fake.state.virtual_accounts[va['id']]['expiration_date'] = (
+            timezone.now() - timedelta(minutes=1)
+        ).isoformat()
+
+        status, _ = fetch_remote_status(XenditService(), transaction)
+        self.assertEqual(status, 'PAID')
+
+    def test_payment_found_by_payment_id(self):
+        transaction, va = self.create_va_transaction()
+        callback = self.fake.state.pay_virtual_account(va['account_number'])
+        transaction.xendit_payment_id = callback['payment_id']
+
+        status, data = fetch_remote_status(XenditService(), transaction)
+        self.assertEqual(status, 'PAID')
+        apply_remote_statuses([(transaction, status, data)])
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'PAID')
+
+    def test_unknown_payment_id_is_not_paid(self):
+        transaction, _ = self.create_va_transaction()
+        transaction.xendit_payment_id = 'vap_missing'
+
+        status, _ = fetch_remote_status(XenditService(), transaction)
+        self.assertIsNone(status)
+
+    def test_inactive_after_expiration_expires(self):
+        transaction, va = self.create_va_transaction()
+        stored = self.fake.state.virtual_accounts[va['id']]
+        stored['status'] = 'INACTIVE'
+        stored['expiration_date'] = (timezone.now() - timedelta(minutes=1)).isoformat()
+
+        status, _ = fetch_remote_status(XenditService(), transaction)
+        self.assertEqual(status, 'EXPIRED')
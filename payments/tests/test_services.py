@@ -0,0 +1,101 @@
+import inspect
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from payments.services import AsyncXenditService, XenditService
+
+from .utils import FakeXenditTestCase, create_transaction
+
+# Methods that never call Xendit and stay synchronous on the async service.
+LOCAL_METHODS = {
+    'verify_callback_token',
+    'validate_webhook_signature',
+    'get_available_banks',
+    'get_available_qr_types',
+    'generate_qr_code_image',
+    'generate_test_qris_string',
+}
+
+
+class AsyncXenditServiceTests(FakeXenditTestCase):
+    def test_every_upstream_method_is_awaitable(self):
+        for name, method in inspect.getmembers(XenditService, inspect.isfunction):
+            if name.startswith('_') or name in LOCAL_METHODS:
+                continue
+            with self.subTest(method=name):
+                self.assertTrue(inspect.iscoroutinefunction(getattr(AsyncXenditService, name)))
+
+    def test_reads_return_results(self):
+        service = AsyncXenditService()
+        va = async_to_sync(service.create_virtual_account)('ext_va', 50000, 'BCA')
+        qr = async_to_sync(service.create_qr_code_by_type)('ext_qr', 50000)
+        invoice = async_to_sync(service.create_invoice)('ext_inv', 50000, 'Test')
+        self.fake.state.pay_qr_code(qr['id'])
+
+        self.assertEqual(async_to_sync(service.get_virtual_account)(va['id'])['external_id'], 'ext_va')
+        self.assertEqual(async_to_sync(service.get_invoice)(invoice['id'])['status'], 'PENDING')
+        self.assertEqual(async_to_sync(service.get_qr_code_by_id)(qr['id'])['status'], 'INACTIVE')
+        self.assertEqual(len(async_to_sync(service.get_qr_code_payments)(qr['id'])), 1)
+        self.assertIn('BCA', [bank['code'] for bank in async_to_sync(service.fetch_available_banks)()])
+
+
+class XenditCallTests(SimpleTestCase):
+    # Response handling shared by both services, without a server.
+
+    def test_rejected_dana_qr_falls_back_to_linkaja(self):
+        call = XenditService()._qr_code_call('ext_qr', 50000, 'DYNAMIC', 'ID_DANA')
+        result, fallback = call.outcome(SimpleNamespace(status_code=400, text='channel not activated'))
+
+        self.assertIsNone(result)
+        self.assertEqual(fallback.payload['channel_code'], 'ID_LINKAJA')
+        self.assertIsNone(fallback.fallback)
+
+    def test_server_error_does_not_fall_back(self):
+        call = XenditService()._qr_code_call('ext_qr', 50000, 'DYNAMIC', 'ID_DANA')
+        self.assertEqual(call.outcome(SimpleNamespace(status_code=503, text='')), (None, None))
+
+
+class XenditServiceTests(FakeXenditTestCase):
+    def test_card_payment(self):
+        service = XenditService()
+        token = service.tokenize_card('4000000000000010', '12', '2030', '123', 'Test')
+        charge = service.charge_credit_card('ext_card', 50000, token['id'], 'Test')
+        self.assertEqual(charge['status'], 'CAPTURED')
+
+    def test_declined_card(self):
+        service = XenditService()
+        token = service.tokenize_card('4000000000000002', '12', '2030', '123', 'Test')
+        charge = service.charge_credit_card('ext_declined', 50000, token['id'], 'Test')
+        self.assertEqual(charge['status'], 'FAILED')
+
+    def test_resubmitted_card_form_is_charged_once(self):
+        # Every submit tokenizes the card again.
+        service = XenditService()
+        before = len(self.fake.state.charges)
+        charges = [
+            service.charge_credit_card(
+                'ext_card_twice', 50000, service.tokenize_card('4000000000000010', '12', '2030', '123', 'Test')['id'], 'Test'
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual(charges[0]['id'], charges[1]['id'])
+        self.assertEqual(len(self.fake.state.charges), before + 1)
+
+    def test_card_can_be_retried_after_a_decline(self):
+        transaction = create_transaction()
+        card = {'exp_month': '12', 'exp_year': '2030', 'cvn': '123', 'card_holder_name': 'Test'}
+        before = len(self.fake.state.charges)
+
+        declined = self.client.post(f'/payment/card/{transaction.id}/', {'card_number': '4000000000000002', **card})
+        self.assertFalse(declined.json()['success'])
+        paid = self.client.post(f'/payment/card/{transaction.id}/', {'card_number': '4000000000000010', **card})
+        self.assertTrue(paid.json()['success'])
+        self.assertEqual(len(self.fake.state.charges), before + 2)
+
+    def test_replacing_a_virtual_account_creates_a_new_one(self):
+        service = XenditService()
+        first = service.create_virtual_account('ext_va', 50000, 'BCA')
+        self.assertEqual(service.create_virtual_account('ext_va', 50000, 'BCA')['id'], first['id'])
+        self.assertNotEqual(service.create_virtual_account('ext_va', 50000, 'BCA', generation=first['id'])['id'], first['id'])
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.test import TestCase
+from django.utils import timezone
+
+from payments.sessions import cleanup_sessions
+
+
+class CleanupSessionsTests(TestCase):
+    def test_deletes_expired_sessions_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i:03d}', session_data='', expire_date=now - timedelta(days=1)) for i in range(7)]
+            + [Session(session_key='live', session_data='', expire_date=now + timedelta(days=1))]
+        )
+
+        with self.assertNumQueries(6):
+            # Batches of 3, 3 and 1, a SELECT and a DELETE each.
+            deleted = cleanup_sessions(batch_size=3, now=now)
+
+        self.assertEqual(deleted, 7)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
@@ -0,0 +1,161 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from payments.archive import archive_transactions
+from payments.models import Transaction, UserAccess, WebhookEvent
+from payments.webhooks import process_queue
+
+from .utils import create_transaction
+
+
+def invoice_callback(transaction, status='PAID', invoice_id='inv_1'):
+    return {
+        'id': invoice_id,
+        'external_id': transaction.external_id,
+        'status': status,
+        'amount': float(transaction.amount),
+        'payment_method': 'BANK_TRANSFER',
+    }
+
+
+@override_settings(XENDIT_CALLBACK_TOKEN='', XENDIT_WEBHOOK_QUEUE=False)
+class CallbackTests(TestCase):
+    def post(self, payload, **extra):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post('/callback/xendit/', body, content_type='application/json', **extra)
+
+    def setUp(self):
+        self.transaction = create_transaction()
+
+    def test_paid_callback_grants_access(self):
+        self.assertEqual(self.post(invoice_callback(self.transaction)).status_code, 200)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'PAID')
+        self.assertEqual(self.transaction.payment_method, 'BANK_TRANSFER')
+        self.assertTrue(UserAccess.objects.filter(session_key=self.transaction.session_key, is_active=True).exists())
+
+    def test_duplicate_callback_is_acknowledged_without_writes(self):
+        payload = invoice_callback(self.transaction)
+        self.post(payload)
+        paid_at = Transaction.objects.get(id=self.transaction.id).paid_at
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.post(payload).status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(Transaction.objects.get(id=self.transaction.id).paid_at, paid_at)
+
+    def test_late_expired_callback_does_not_undo_payment(self):
+        self.post(invoice_callback(self.transaction))
+        self.assertEqual(self.post(invoice_callback(self.transaction, status='EXPIRED')).status_code, 200)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'PAID')
+        self.assertEqual(WebhookEvent.objects.get(status='EXPIRED').outcome, 'IGNORED')
+        self.assertTrue(UserAccess.objects.get(session_key=self.transaction.session_key).is_active)
+
+    def test_paid_after_expired_is_applied(self):
+        self.post(invoice_callback(self.transaction, status='EXPIRED'))
+        self.post(invoice_callback(self.transaction))
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'PAID')
+
+    def test_unknown_transaction_is_404(self):
+        self.transaction.external_id = 'missing'
+        self.assertEqual(self.post(invoice_callback(self.transaction)).status_code, 404)
+
+    def test_invalid_payloads_are_400(self):
+        for queued in (False, True):
+            for body in ('{not json', '[]', 'null', '"PAID"', '{}'):
+                with self.subTest(queued=queued, body=body), self.settings(XENDIT_WEBHOOK_QUEUE=queued):
+                    self.assertEqual(self.post(body).status_code, 200 if queued and body == '{}' else 400)
+
+    @override_settings(XENDIT_CALLBACK_TOKEN='secret')
+    def test_callback_token_is_checked(self):
+        payload = invoice_callback(self.transaction)
+        self.assertEqual(self.post(payload).status_code, 403)
+        self.assertEqual(self.post(payload, HTTP_X_CALLBACK_TOKEN='secret').status_code, 200)
+
+    def test_virtual_account_callback_matched_by_account_number(self):
+        Transaction.objects.filter(id=self.transaction.id).update(
+            va_account_number='8860800000000001', va_bank_code='BCA'
+        )
+        payload = {
+            'id': 'pay_1',
+            'payment_id': 'vap_1',
+            'callback_virtual_account_id': 'fva_1',
+            'account_number': '8860800000000001',
+            'bank_code': 'BCA',
+            'amount': 50000,
+        }
+        self.assertEqual(self.post(payload).status_code, 200)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'PAID')
+        self.assertEqual(self.transaction.xendit_payment_id, 'vap_1')
+
+
+@override_settings(XENDIT_CALLBACK_TOKEN='', XENDIT_WEBHOOK_QUEUE=True, WEBHOOK_MAX_ATTEMPTS=2)
+class WebhookQueueTests(TestCase):
+    def enqueue(self, payload):
+        response = self.client.post('/callback/xendit/', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def make_due(self):
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+
+    def test_queued_callback_is_applied_by_the_worker(self):
+        transaction = create_transaction()
+        self.enqueue(invoice_callback(transaction))
+        self.enqueue(invoice_callback(transaction))
+        self.assertEqual(WebhookEvent.objects.get().state, 'QUEUED')
+
+        self.assertEqual(process_queue()['done'], 1)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'PAID')
+        self.assertEqual(WebhookEvent.objects.get().state, 'DONE')
+
+    def test_missing_transaction_is_retried_then_dead_lettered(self):
+        self.enqueue({'id': 'inv_1', 'external_id': 'not_created_yet', 'status': 'PAID'})
+
+        self.assertEqual(process_queue()['retried'], 1)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.state, 'QUEUED')
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(process_queue(), {})
+
+        self.make_due()
+        self.assertEqual(process_queue()['dead'], 1)
+        event.refresh_from_db()
+        self.assertEqual((event.state, event.attempts, event.next_attempt_at), ('DEAD', 2, None))
+        self.assertEqual(event.last_error, 'HTTP 404')
+
+    def test_retry_succeeds_once_the_transaction_exists(self):
+        self.enqueue({'id': 'inv_1', 'external_id': 'late_transaction', 'status': 'PAID'})
+        process_queue()
+
+        create_transaction(external_id='late_transaction')
+        self.make_due()
+        self.assertEqual(process_queue()['done'], 1)
+        self.assertEqual(Transaction.objects.get(external_id='late_transaction').status, 'PAID')
+
+    def test_callback_for_archived_transaction_is_closed(self):
+        transaction = create_transaction(status='PAID', paid_at=timezone.now())
+        Transaction.objects.filter(id=transaction.id).update(updated_at=timezone.now() - timedelta(days=120))
+        archive_transactions(older_than_days=90)
+        self.enqueue(invoice_callback(transaction, status='EXPIRED'))
+
+        self.assertEqual(process_queue()['done'], 1)
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.state, event.outcome, event.attempts), ('DONE', 'IGNORED', 1))
+        self.assertIsNotNone(event.processed_at)
+        self.make_due()
+        self.assertEqual(process_queue(), {})
+
+    def test_unmatchable_payload_is_dead_lettered_at_once(self):
+        self.enqueue({'id': 'evt_1', 'status': 'PAID'})
+        self.assertEqual(process_queue()['dead'], 1)
+        self.assertEqual(WebhookEvent.objects.get().attempts, 1)
@@ -0,0 +1,29 @@
+import uuid
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from payments import services
+from payments.models import Package, Transaction
+from payments.testing.fake_xendit import start_fake_xendit
+
+
+class FakeXenditTestCase(TestCase):
+    # Runs a fake Xendit API for the class and points the settings at it.
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake = start_fake_xendit()
+        cls.addClassCleanup(cls.fake.server_close)
+        cls.addClassCleanup(cls.fake.shutdown)
+        cls.enterClassContext(override_settings(XENDIT_API_BASE_URL=cls.fake.url, XENDIT_SECRET_KEY='test'))
+        # Drop the per-process services built for the real API.
+        cls.enterClassContext(mock.patch.object(services, '_service', None))
+        cls.enterClassContext(mock.patch.object(services, '_async_service', None))
+
+
+def create_transaction(package=None, **fields):
+    package = package or Package.objects.create(name='Test Package', description='Test', price=50000, duration_days=30)
+    fields.setdefault('external_id', f'test_{uuid.uuid4().hex[:12]}')
+    fields.setdefault('session_key', f'session_{fields["external_id"]}')
+    return Transaction.objects.create(package=package, amount=package.price, **fields)
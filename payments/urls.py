@@ -1,13 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Under ASGI the payment creation endpoints can be served by their async
+# variants so upstream Xendit latency doesn't pin a worker per request.
+payment_views = async_views if getattr(settings, 'PAYMENTS_ASYNC_VIEWS', False) else views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('buy/<int:package_id>/', views.buy_package, name='buy_package'),
     path('payment/methods/<uuid:transaction_id>/', views.payment_methods, name='payment_methods'),
-    path('payment/va/<uuid:transaction_id>/', views.process_virtual_account, name='process_va'),
-    path('payment/qr/<uuid:transaction_id>/', views.process_qr_payment, name='process_qr'),
-    path('payment/card/<uuid:transaction_id>/', views.process_credit_card, name='process_card'),
+    path('payment/va/<uuid:transaction_id>/', payment_views.process_virtual_account, name='process_va'),
+    path('payment/qr/<uuid:transaction_id>/', payment_views.process_qr_payment, name='process_qr'),
+    path('payment/qr/<uuid:transaction_id>/image/', views.qr_code_image, name='qr_code_image'),
+    path('payment/card/<uuid:transaction_id>/', payment_views.process_credit_card, name='process_card'),
     path('callback/xendit/', views.xendit_callback, name='xendit_callback'),
     path('payment/success/', views.payment_success, name='payment_success'),
     path('payment/failed/', views.payment_failed, name='payment_failed'),
@@ -18,4 +24,8 @@ urlpatterns = [
     path('simulate-payment/<uuid:transaction_id>/', views.simulate_payment_success, name='simulate_payment'),
     path('payments/simulate-payment/<uuid:transaction_id>/', views.simulate_payment, name='universal_simulate_payment'),
     path('payment/simulate-qr/<uuid:transaction_id>/', views.simulate_qr_payment, name='simulate_qr_payment'),
+    path('events/payment/<uuid:transaction_id>/', async_views.payment_events, name='payment_events'),
+    path('events/access/', async_views.access_events, name='access_events'),
+    path('internal/stats/', views.runtime_stats, name='runtime_stats'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,66 +1,146 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpResponse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
 from django.utils import timezone
 from django.urls import reverse
 from django.conf import settings
+import hmac
 import json
 import uuid
 import logging
 
+from . import cache as payment_cache
+from . import metrics as payment_metrics
+from .access import get_request_access
+from .archive import get_transaction
+from .catalog import get_catalog_stats
+from .events import status_event
+from .instruments import (
+    InstrumentBusy, instrument_generation, obtain_instrument, parse_details, qr_key, schedule_precreate, va_key,
+)
+from .log import get_log_stats, log_event
 from .models import Package, Transaction, UserAccess
-from .services import XenditService
+from .qr import CONTENT_TYPES, default_format, get_render_stats, qr_etag, render_qr
+from .reconciliation import apply_remote_statuses, fetch_remote_status, remote_reference
+from .resilience import ProviderUnavailable, get_resilience_stats
+from .sessions import payment_session_key
+from .services import get_pool_stats, get_read_stats, get_xendit_service
+from .webhooks import enqueue_callback, process_callback
 
 logger = logging.getLogger(__name__)
 
+def _va_response(transaction_id, va_data):
+    return JsonResponse({
+        'success': True,
+        'va_number': va_data.get('account_number'),
+        'bank_name': va_data.get('bank_code'),
+        'amount': va_data.get('expected_amount'),
+        'expiry': va_data.get('expiration_date'),
+        'transaction_id': transaction_id
+    })
+
+def _qr_response(transaction_id, qr_type, qr_data):
+    response_data = {
+        'success': True,
+        'qr_id': qr_data.get('id'),
+        'qr_string': qr_data.get('qr_string'),
+        'amount': qr_data.get('amount'),
+        'channel_code': qr_data.get('channel_code'),
+        'expires_at': qr_data.get('expires_at'),
+        'status': qr_data.get('status'),
+        'qr_type': qr_type,
+        'transaction_id': transaction_id,
+        'test_mode': qr_data.get('test_mode', False),
+        'fallback_mode': qr_data.get('fallback_mode', False),
+        'message': f'QRIS QR Code generated successfully! This QR code works with all QRIS-enabled apps.'
+    }
+    
+    # The image is served separately; the QR id in the query string changes
+    # with every new QR so the browser can cache each URL for good.
+    if qr_data.get('qr_string'):
+        response_data['qr_image_url'] = f"{reverse('qr_code_image', args=[transaction_id])}?v={qr_data.get('id')}"
+    
+    return JsonResponse(response_data)
+
+def _provider_unavailable(error):
+    logger.warning(f"Failing fast: {error}")
+    return JsonResponse({
+        'success': False,
+        'message': 'The payment provider is temporarily unavailable. Please try again in a moment.',
+        'provider_unavailable': True
+    }, status=503)
+
+def _instrument_busy(error):
+    logger.info(f"Instrument busy: {error}")
+    return JsonResponse({
+        'success': False,
+        'message': 'This payment method is still being prepared. Please try again in a moment.',
+        'busy': True
+    }, status=409)
+
+def _qr_is_active(qr_data):
+    return bool(qr_data) and qr_data.get('status') == 'ACTIVE'
+
+def _qr_error_message(qr_data):
+    error_msg = 'Failed to create QRIS QR Code'
+    if qr_data:
+        error_msg += f" (Status: {qr_data.get('status', 'Unknown')})"
+    else:
+        error_msg += " - No response from Xendit API"
+    return error_msg
+
+def _card_payment_details(charge_data, card_number):
+    return {
+        'charge_id': charge_data.get('id'),
+        'status': charge_data.get('status'),
+        'last_four': card_number[-4:] if len(card_number) >= 4 else '****'
+    }
+
+def _charge_generation(transaction):
+    # The declined charge's id, so paying again with another card gets a new
+    # idempotency key; resubmits before an answer share the key and are
+    # charged once.
+    details = parse_details(transaction.payment_details)
+    if transaction.payment_method == 'CREDIT_CARD' and details.get('status') not in ('CAPTURED', 'COMPLETED'):
+        return details.get('charge_id') or ''
+    return ''
+
+def _card_fields(request):
+    return (
+        request.POST.get('card_number', '').replace(' ', ''),
+        request.POST.get('exp_month'),
+        request.POST.get('exp_year'),
+        request.POST.get('cvn'),
+        request.POST.get('card_holder_name'),
+    )
+
 def home(request):
     packages = Package.objects.filter(is_active=True)
     
-    user_access = None
-    if request.session.session_key:
-        try:
-            user_access = UserAccess.objects.get(
-                session_key=request.session.session_key,
-                is_active=True
-            )
-            if not user_access.is_valid():
-                user_access.is_active = False
-                user_access.save()
-                user_access = None
-        except UserAccess.DoesNotExist:
-            pass
-    
     context = {
         'packages': packages,
-        'user_access': user_access,
+        'user_access': get_request_access(request),
     }
     return render(request, 'payments/home.html', context)
 
 def buy_package(request, package_id):
     package = get_object_or_404(Package, id=package_id, is_active=True)
     
-    if not request.session.session_key:
-        request.session.create()
+    session_key = payment_session_key(request, create=True)
     
-    try:
-        existing_access = UserAccess.objects.get(
-            session_key=request.session.session_key,
-            is_active=True
-        )
-        if existing_access.is_valid():
-            messages.info(request, 'You already have active access to premium content!')
-            return redirect('paid_content')
-    except UserAccess.DoesNotExist:
-        pass
+    if get_request_access(request):
+        messages.info(request, 'You already have active access to premium content!')
+        return redirect('paid_content')
     
     external_id = f"payment_{uuid.uuid4().hex[:8]}_{package_id}"
     
     transaction = Transaction.objects.create(
         package=package,
         external_id=external_id,
-        session_key=request.session.session_key,
+        session_key=session_key,
         amount=package.price,
         expires_at=timezone.now() + timezone.timedelta(days=1)
     )
@@ -68,68 +148,36 @@ def buy_package(request, package_id):
     request.session['current_transaction_id'] = str(transaction.id)
     request.session['current_external_id'] = external_id
     
+    schedule_precreate(transaction.id)
+    
     return redirect('payment_methods', transaction_id=transaction.id)
 
 @csrf_exempt
 @require_http_methods(["POST"])
 def xendit_callback(request):
+    if settings.XENDIT_CALLBACK_TOKEN and not get_xendit_service().verify_callback_token(
+        request.headers.get('X-Callback-Token', '')
+    ):
+        logger.error("Xendit callback rejected: invalid callback token")
+        return HttpResponse(status=403)
+    
     try:
-        payload = json.loads(request.body.decode('utf-8'))
-        
-        logger.info(f"Xendit callback received: {payload}")
+        if getattr(settings, 'XENDIT_WEBHOOK_QUEUE', False):
+            # Durably enqueue and ack; `manage.py process_webhooks` applies it.
+            return HttpResponse(status=enqueue_callback(request.body))
         
-        external_id = payload.get('external_id')
-        if not external_id:
-            logger.error("No external_id in callback payload")
-            return HttpResponse(status=400)
-        
-        try:
-            transaction = Transaction.objects.get(external_id=external_id)
-        except Transaction.DoesNotExist:
-            logger.error(f"Transaction not found for external_id: {external_id}")
-            return HttpResponse(status=404)
-        
-        transaction.xendit_callback_data = payload
-        status = payload.get('status', '').upper()
-        logger.info(f"Processing payment status: {status} for transaction {external_id}")
-        logger.info(f"Full payload: {json.dumps(payload, indent=2)}")
-        
-        if status in ['PAID', 'COMPLETED', 'SETTLED', 'SUCCESS']:
-            transaction.status = 'PAID'
-            transaction.paid_at = timezone.now()
-            transaction.payment_method = payload.get('payment_method', payload.get('payment_channel', '')).upper()
-            
-            user_access, created = UserAccess.objects.update_or_create(
-                session_key=transaction.session_key,
-                defaults={
-                    'package': transaction.package,
-                    'transaction': transaction,
-                    'expires_at': timezone.now() + timezone.timedelta(days=transaction.package.duration_days),
-                    'is_active': True
-                }
-            )
-            
-            logger.info(f"Payment successful for transaction {external_id}")
-            logger.info(f"User access {'created' if created else 'updated'} for session {transaction.session_key}")
-            
-        elif status in ['EXPIRED', 'INACTIVE']:
-            transaction.status = 'EXPIRED'
-            logger.info(f"Transaction {external_id} expired")
-        elif status in ['FAILED', 'FAILED_CAPTURE']:
-            transaction.status = 'FAILED'
-            logger.info(f"Transaction {external_id} failed")
-        else:
-            logger.warning(f"Unknown payment status: {status} for transaction {external_id}")
+        payload = json.loads(request.body.decode('utf-8'))
         
-        transaction.save()
+        logger.debug("Xendit callback received: %s", payload)
         
-        return HttpResponse(status=200)
+        status_code = process_callback(payload, raw_body=request.body)
+        return HttpResponse(status=status_code)
         
     except json.JSONDecodeError:
         logger.error("Invalid JSON in callback payload")
         return HttpResponse(status=400)
     except Exception as e:
-        logger.error(f"Error processing Xendit callback: {str(e)}")
+        logger.error("Error processing Xendit callback: %s", e)
         return HttpResponse(status=500)
 
 def payment_success(request):
@@ -138,28 +186,15 @@ def payment_success(request):
     
     if current_transaction_id:
         try:
-            current_transaction = Transaction.objects.get(id=current_transaction_id)
+            current_transaction = get_transaction(id=current_transaction_id)
         except Transaction.DoesNotExist:
             pass
     
-    user_access = None
-    if request.session.session_key:
-        try:
-            user_access = UserAccess.objects.get(
-                session_key=request.session.session_key,
-                is_active=True
-            )
-            if not user_access.is_valid():
-                user_access.is_active = False
-                user_access.save()
-                user_access = None
-        except UserAccess.DoesNotExist:
-            pass
-    
     context = {
-        'user_access': user_access,
+        'user_access': get_request_access(request),
         'current_transaction': current_transaction,
         'current_transaction_id': current_transaction_id,
+        'event_stream_enabled': getattr(settings, 'PAYMENTS_EVENT_STREAM', False),
     }
     return render(request, 'payments/payment_success.html', context)
 
@@ -167,70 +202,45 @@ def payment_failed(request):
     return render(request, 'payments/payment_failed.html')
 
 def paid_content(request):
-    if not request.session.session_key:
+    if not payment_session_key(request):
         messages.error(request, 'You need to purchase a package to access this content.')
         return redirect('home')
     
-    try:
-        user_access = UserAccess.objects.get(
-            session_key=request.session.session_key,
-            is_active=True
-        )
-        
-        if not user_access.is_valid():
-            user_access.is_active = False
-            user_access.save()
-            messages.error(request, 'Your access has expired. Please purchase a new package.')
-            return redirect('home')
-        
-        context = {
-            'user_access': user_access,
-        }
-        return render(request, 'payments/paid_content.html', context)
-        
-    except UserAccess.DoesNotExist:
+    user_access = get_request_access(request)
+    if user_access is None:
         messages.error(request, 'You need to purchase a package to access this content.')
         return redirect('home')
+    
+    context = {
+        'user_access': user_access,
+    }
+    return render(request, 'payments/paid_content.html', context)
 
 def check_payment_status(request, transaction_id):
-    try:
-        transaction = Transaction.objects.get(id=transaction_id)
-        return JsonResponse({
-            'status': transaction.status,
-            'paid': transaction.is_paid(),
-            'redirect_url': reverse('paid_content') if transaction.is_paid() else None
-        })
-    except Transaction.DoesNotExist:
+    status = payment_cache.get_transaction_status(transaction_id)
+    if status is None:
         return JsonResponse({'error': 'Transaction not found'}, status=404)
+    
+    return JsonResponse(status_event(status))
 
 def check_user_access(request):
-    if not request.session.session_key:
+    if not payment_session_key(request):
         return JsonResponse({'has_access': False})
     
-    try:
-        user_access = UserAccess.objects.get(
-            session_key=request.session.session_key,
-            is_active=True
-        )
-        
-        if user_access.is_valid():
-            return JsonResponse({
-                'has_access': True,
-                'package_name': user_access.package.name,
-                'expires_at': user_access.expires_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'redirect_url': reverse('paid_content')
-            })
-        else:
-            user_access.is_active = False
-            user_access.save()
-            return JsonResponse({'has_access': False})
-            
-    except UserAccess.DoesNotExist:
+    access = get_request_access(request)
+    if access is None:
         return JsonResponse({'has_access': False})
+    
+    return JsonResponse({
+        'has_access': True,
+        'package_name': access.package.name,
+        'expires_at': access.expires_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'redirect_url': reverse('paid_content')
+    })
 
 def verify_payment(request, transaction_id):
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = Transaction.objects.with_payloads('payment_details').get(id=transaction_id)
         
         if transaction.status == 'PAID':
             return JsonResponse({
@@ -239,61 +249,43 @@ def verify_payment(request, transaction_id):
                 'redirect_url': reverse('paid_content')
             })
         
-        xendit_service = XenditService()
-        if transaction.invoice_id:
-            invoice_data = xendit_service.get_invoice(transaction.invoice_id)
-            
-            if invoice_data:
-                status = invoice_data.get('status', '').upper()
-                logger.info(f"Xendit API status for {transaction.external_id}: {status}")
-                
-                if status in ['PAID', 'SETTLED', 'COMPLETED']:
-                    transaction.status = 'PAID'
-                    transaction.paid_at = timezone.now()
-                    transaction.payment_method = invoice_data.get('payment_method', 'UNKNOWN')
-                    transaction.save()
-                    
-                    user_access, created = UserAccess.objects.update_or_create(
-                        session_key=transaction.session_key,
-                        defaults={
-                            'package': transaction.package,
-                            'transaction': transaction,
-                            'expires_at': timezone.now() + timezone.timedelta(days=transaction.package.duration_days),
-                            'is_active': True
-                        }
-                    )
-                    
-                    logger.info(f"Manual verification successful for {transaction.external_id}")
-                    
-                    return JsonResponse({
-                        'success': True,
-                        'message': 'Payment verified and access granted!',
-                        'redirect_url': reverse('paid_content')
-                    })
-                elif status in ['PENDING', 'UNPAID']:
-                    return JsonResponse({
-                        'success': False,
-                        'message': 'Payment is still pending. Please complete the payment first.',
-                        'status': 'pending'
-                    })
-                else:
-                    return JsonResponse({
-                        'success': False,
-                        'message': f'Payment failed or expired (Status: {status})',
-                        'status': 'failed'
-                    })
-            else:
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Unable to verify payment with Xendit API',
-                    'status': 'error'
-                })
-        else:
+        if remote_reference(transaction) is None:
+            return JsonResponse({
+                'success': False,
+                'message': 'No Xendit payment found for this transaction',
+                'status': 'error'
+            })
+        
+        status, remote_data = fetch_remote_status(get_xendit_service(), transaction)
+        if status is None:
             return JsonResponse({
                 'success': False,
-                'message': 'No invoice ID found for this transaction',
+                'message': 'Unable to verify payment with Xendit API',
                 'status': 'error'
             })
+        
+        logger.info(f"Xendit API status for {transaction.external_id}: {status}")
+        apply_remote_statuses([(transaction, status, remote_data)])
+        
+        if status == 'PAID':
+            logger.info(f"Manual verification successful for {transaction.external_id}")
+            return JsonResponse({
+                'success': True,
+                'message': 'Payment verified and access granted!',
+                'redirect_url': reverse('paid_content')
+            })
+        elif status == 'PENDING':
+            return JsonResponse({
+                'success': False,
+                'message': 'Payment is still pending. Please complete the payment first.',
+                'status': 'pending'
+            })
+        else:
+            return JsonResponse({
+                'success': False,
+                'message': f'Payment failed or expired (Status: {status})',
+                'status': 'failed'
+            })
             
     except Transaction.DoesNotExist:
         return JsonResponse({
@@ -301,6 +293,8 @@ def verify_payment(request, transaction_id):
             'message': 'Transaction not found',
             'status': 'error'
         }, status=404)
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
     except Exception as e:
         logger.error(f"Error verifying payment: {str(e)}")
         return JsonResponse({
@@ -330,12 +324,7 @@ def simulate_payment_success(request, transaction_id):
         
         user_access, created = UserAccess.objects.update_or_create(
             session_key=transaction.session_key,
-            defaults={
-                'package': transaction.package,
-                'transaction': transaction,
-                'expires_at': timezone.now() + timezone.timedelta(days=transaction.package.duration_days),
-                'is_active': True
-            }
+            defaults=transaction.access_defaults()
         )
         
         logger.info(f"Test payment simulated for {transaction.external_id}")
@@ -358,7 +347,7 @@ def payment_methods(request, transaction_id):
         if transaction.status == 'PAID':
             return redirect('paid_content')
         
-        xendit_service = XenditService()
+        xendit_service = get_xendit_service()
         available_banks = xendit_service.get_available_banks()
         available_qr_types = xendit_service.get_available_qr_types()
         
@@ -366,6 +355,7 @@ def payment_methods(request, transaction_id):
             'transaction': transaction,
             'available_banks': available_banks,
             'available_qr_types': available_qr_types,
+            'event_stream_enabled': getattr(settings, 'PAYMENTS_EVENT_STREAM', False),
         }
         return render(request, 'payments/payment_methods.html', context)
         
@@ -377,39 +367,36 @@ def payment_methods(request, transaction_id):
 @require_http_methods(["POST"])
 def process_virtual_account(request, transaction_id):
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = Transaction.objects.with_payloads('payment_details').get(id=transaction_id)
         bank_code = request.POST.get('bank_code')
         customer_name = request.POST.get('customer_name', 'Customer')
         
         if not bank_code:
             return JsonResponse({'success': False, 'message': 'Please select a bank'})
         
-        xendit_service = XenditService()
-        va_data = xendit_service.create_virtual_account(
-            external_id=transaction.external_id,
-            amount=transaction.amount,
-            bank_code=bank_code,
-            customer_name=customer_name
+        xendit_service = get_xendit_service()
+        va_data = obtain_instrument(
+            transaction, va_key(bank_code), f'VA_{bank_code}',
+            lambda: xendit_service.create_virtual_account(
+                external_id=transaction.external_id,
+                amount=transaction.amount,
+                bank_code=bank_code,
+                customer_name=customer_name,
+                generation=instrument_generation(transaction, va_key(bank_code))
+            )
         )
         
         if va_data:
-            transaction.payment_method = f'VA_{bank_code}'
-            transaction.payment_details = json.dumps(va_data)
-            transaction.save()
-            
-            return JsonResponse({
-                'success': True,
-                'va_number': va_data.get('account_number'),
-                'bank_name': va_data.get('bank_code'),
-                'amount': va_data.get('expected_amount'),
-                'expiry': va_data.get('expiration_date'),
-                'transaction_id': transaction_id
-            })
+            return _va_response(transaction_id, va_data)
         else:
             return JsonResponse({'success': False, 'message': 'Failed to create Virtual Account'})
             
     except Transaction.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Transaction not found'})
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
+    except InstrumentBusy as e:
+        return _instrument_busy(e)
     except Exception as e:
         logger.error(f"Error processing VA payment: {str(e)}")
         return JsonResponse({'success': False, 'message': 'An error occurred'})
@@ -418,7 +405,7 @@ def process_virtual_account(request, transaction_id):
 @require_http_methods(["POST"])
 def process_qr_payment(request, transaction_id):
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = Transaction.objects.with_payloads('payment_details').get(id=transaction_id)
         
         if transaction.status == 'PAID':
             return JsonResponse({
@@ -428,53 +415,31 @@ def process_qr_payment(request, transaction_id):
         
         qr_type = request.POST.get('qr_type', 'QRIS_GENERAL')
         
-        xendit_service = XenditService()
+        xendit_service = get_xendit_service()
         
-        qr_data = xendit_service.create_qr_code_by_type(
-            external_id=transaction.external_id,
-            amount=transaction.amount,
-            qr_code_type=qr_type
+        qr_data = obtain_instrument(
+            transaction, qr_key(qr_type), 'QRIS',
+            lambda: xendit_service.create_qr_code_by_type(
+                external_id=transaction.external_id,
+                amount=transaction.amount,
+                qr_code_type=qr_type
+            ),
+            accept=_qr_is_active
         )
         
         if qr_data and qr_data.get('status') == 'ACTIVE':
-            transaction.payment_method = 'QRIS'
-            transaction.payment_details = json.dumps(qr_data)
-            transaction.xendit_qr_id = qr_data.get('id')
-            transaction.save()
-            
-            logger.info(f"✅ QRIS QR Code created for transaction {transaction_id}")
-            logger.info(f"   QR ID: {qr_data.get('id')}")
-            logger.info(f"   Type: {qr_type}")
-            logger.info(f"   Channel: {qr_data.get('channel_code')}")
-            logger.info(f"   Status: {qr_data.get('status')}")
-            
-            response_data = {
-                'success': True,
-                'qr_id': qr_data.get('id'),
-                'qr_string': qr_data.get('qr_string'),
-                'amount': qr_data.get('amount'),
-                'channel_code': qr_data.get('channel_code'),
-                'expires_at': qr_data.get('expires_at'),
-                'status': qr_data.get('status'),
-                'qr_type': qr_type,
-                'transaction_id': transaction_id,
-                'message': f'QRIS QR Code generated successfully! This QR code works with all QRIS-enabled apps.'
-            }
-            
-            if 'qr_code_image' in qr_data and qr_data['qr_code_image']:
-                response_data['qr_code_image'] = qr_data['qr_code_image']
-                logger.info("   QR Code image included in response")
-            else:
-                logger.warning("   No QR Code image available")
+            log_event(
+                logger, 'payment.qr_ready', sampled=True,
+                transaction_id=str(transaction_id),
+                external_id=transaction.external_id,
+                qr_id=qr_data.get('id'),
+                qr_type=qr_type,
+                channel=qr_data.get('channel_code'),
+            )
             
-            return JsonResponse(response_data)
+            return _qr_response(transaction_id, qr_type, qr_data)
         else:
-            error_msg = 'Failed to create QRIS QR Code'
-            if qr_data:
-                error_msg += f" (Status: {qr_data.get('status', 'Unknown')})"
-            else:
-                error_msg += " - No response from Xendit API"
-            
+            error_msg = _qr_error_message(qr_data)
             logger.error(f"❌ {error_msg} for transaction {transaction_id}")
             return JsonResponse({
                 'success': False, 
@@ -486,6 +451,10 @@ def process_qr_payment(request, transaction_id):
             'success': False, 
             'message': 'Transaction not found'
         })
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
+    except InstrumentBusy as e:
+        return _instrument_busy(e)
     except Exception as e:
         logger.error(f"Error processing QR payment: {str(e)}")
         return JsonResponse({
@@ -493,22 +462,39 @@ def process_qr_payment(request, transaction_id):
             'message': 'An error occurred while creating QR code'
         })
 
+@require_http_methods(["GET", "HEAD"])
+def qr_code_image(request, transaction_id):
+    fmt = request.GET.get('format', default_format())
+    if fmt not in CONTENT_TYPES:
+        return HttpResponse(status=400)
+    
+    details = Transaction.objects.filter(
+        id=transaction_id, xendit_qr_id__isnull=False
+    ).values_list('payment_details', flat=True).first()
+    qr_string = parse_details(details).get('qr_string')
+    if not qr_string:
+        return HttpResponse(status=404)
+    
+    etag = qr_etag(qr_string, fmt)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render_qr(qr_string, fmt), content_type=CONTENT_TYPES[fmt])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def process_credit_card(request, transaction_id):
     try:
-        transaction = Transaction.objects.get(id=transaction_id)
+        transaction = Transaction.objects.with_payloads('payment_details').select_related('package').get(id=transaction_id)
         
-        card_number = request.POST.get('card_number', '').replace(' ', '')
-        card_exp_month = request.POST.get('exp_month')
-        card_exp_year = request.POST.get('exp_year')
-        card_cvn = request.POST.get('cvn')
-        card_holder_name = request.POST.get('card_holder_name')
+        card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name = _card_fields(request)
         
         if not all([card_number, card_exp_month, card_exp_year, card_cvn, card_holder_name]):
             return JsonResponse({'success': False, 'message': 'All card details are required'})
         
-        xendit_service = XenditService()
+        xendit_service = get_xendit_service()
         
         token_data = xendit_service.tokenize_card(
             card_number=card_number,
@@ -525,16 +511,13 @@ def process_credit_card(request, transaction_id):
             external_id=transaction.external_id,
             amount=transaction.amount,
             token_id=token_data.get('id'),
-            description=f"Payment for {transaction.package.name}"
+            description=f"Payment for {transaction.package.name}",
+            generation=_charge_generation(transaction)
         )
         
         if charge_data:
             transaction.payment_method = 'CREDIT_CARD'
-            transaction.payment_details = json.dumps({
-                'charge_id': charge_data.get('id'),
-                'status': charge_data.get('status'),
-                'last_four': card_number[-4:] if len(card_number) >= 4 else '****'
-            })
+            transaction.payment_details = _card_payment_details(charge_data, card_number)
             
             if charge_data.get('status') in ['CAPTURED', 'COMPLETED']:
                 transaction.status = 'PAID'
@@ -542,12 +525,7 @@ def process_credit_card(request, transaction_id):
                 
                 user_access, created = UserAccess.objects.update_or_create(
                     session_key=transaction.session_key,
-                    defaults={
-                        'package': transaction.package,
-                        'transaction': transaction,
-                        'expires_at': timezone.now() + timezone.timedelta(days=transaction.package.duration_days),
-                        'is_active': True
-                    }
+                    defaults=transaction.access_defaults()
                 )
                 
                 transaction.save()
@@ -568,6 +546,8 @@ def process_credit_card(request, transaction_id):
             
     except Transaction.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Transaction not found'})
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
     except Exception as e:
         logger.error(f"Error processing credit card payment: {str(e)}")
         return JsonResponse({'success': False, 'message': 'An error occurred during payment processing'})
@@ -597,7 +577,7 @@ def simulate_qr_payment(request, transaction_id):
                 'redirect_url': reverse('paid_content')
             })
         
-        xendit_service = XenditService()
+        xendit_service = get_xendit_service()
         simulation_result = xendit_service.simulate_qr_payment(
             qr_id=transaction.xendit_qr_id,
             amount=transaction.amount
@@ -612,12 +592,7 @@ def simulate_qr_payment(request, transaction_id):
             
             user_access, created = UserAccess.objects.update_or_create(
                 session_key=transaction.session_key,
-                defaults={
-                    'package': transaction.package,
-                    'transaction': transaction,
-                    'expires_at': timezone.now() + timezone.timedelta(days=transaction.package.duration_days),
-                    'is_active': True
-                }
+                defaults=transaction.access_defaults()
             )
             
             logger.info(f"✅ QR Payment simulation successful for {transaction.external_id}")
@@ -648,6 +623,8 @@ def simulate_qr_payment(request, transaction_id):
             'success': False,
             'message': 'Transaction not found'
         })
+    except ProviderUnavailable as e:
+        return _provider_unavailable(e)
     except Exception as e:
         logger.error(f"Error simulating QR payment: {str(e)}")
         return JsonResponse({
@@ -699,12 +676,7 @@ def simulate_payment(request, transaction_id):
         
         user_access, created = UserAccess.objects.update_or_create(
             session_key=transaction.session_key,
-            defaults={
-                'package': transaction.package,
-                'transaction': transaction,
-                'expires_at': timezone.now() + timezone.timedelta(days=transaction.package.duration_days),
-                'is_active': True
-            }
+            defaults=transaction.access_defaults()
         )
         
         logger.info(f"✅ Universal Payment Simulation successful for {transaction.external_id}")
@@ -736,3 +708,30 @@ def simulate_payment(request, transaction_id):
             'success': False,
             'message': 'Payment simulation error occurred'
         }, status=500)
+
+
+def runtime_stats(request):
+    if not (settings.DEBUG or request.user.is_staff):
+        return JsonResponse({'error': 'Not available'}, status=403)
+    
+    return JsonResponse({
+        'xendit_pool': get_pool_stats(),
+        'status_cache': payment_cache.get_cache_stats(),
+        'qr_render_cache': get_render_stats(),
+        'xendit_endpoints': get_resilience_stats(),
+        'xendit_reads': get_read_stats(),
+        'payment_catalog': get_catalog_stats(),
+        'logging': get_log_stats(),
+    })
+
+@require_http_methods(["GET"])
+def metrics(request):
+    token = getattr(settings, 'PAYMENTS_METRICS_TOKEN', '')
+    if token:
+        authorized = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        authorized = settings.DEBUG or request.user.is_staff
+    if not authorized:
+        return HttpResponse(status=403)
+    
+    return HttpResponse(payment_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
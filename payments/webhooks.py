@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .archive import is_archived
+from .log import log_event
+from .models import Transaction, UserAccess, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_STATUS_MAP = {
+    'PAID': 'PAID',
+    'COMPLETED': 'PAID',
+    'SETTLED': 'PAID',
+    'SUCCESS': 'PAID',
+    'SUCCEEDED': 'PAID',
+    'EXPIRED': 'EXPIRED',
+    'INACTIVE': 'EXPIRED',
+    'FAILED': 'FAILED',
+    'FAILED_CAPTURE': 'FAILED',
+}
+
+# Interim statuses some products report before settling; nothing to apply.
+WAITING_STATUSES = ('PENDING', 'ACTIVE')
+
+
+def callback_status(payload):
+    # Fixed VA payment callbacks carry no status field: every one of them
+    # reports a completed payment.
+    data = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    status = (payload.get('status') or data.get('status') or '').upper()
+    if not status and payload.get('payment_id') and payload.get('callback_virtual_account_id'):
+        return 'COMPLETED'
+    return status
+
+
+def event_key(payload, raw_body=None):
+    # Xendit retries re-send the same object id with the same status, so the
+    # pair identifies a delivery. Payloads without an id fall back to a hash
+    # of the body, which still collapses byte-identical retries.
+    data = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    event_id = payload.get('id') or payload.get('payment_id') or data.get('id')
+    if event_id:
+        return f"{payload.get('event', 'callback')}:{event_id}:{callback_status(payload)}"[:255]
+
+    body = raw_body if raw_body is not None else json.dumps(payload, sort_keys=True).encode()
+    return f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+
+def transaction_lookup(payload):
+    # By external_id when the callback carries one; QR payment and VA
+    # callbacks without it are matched through the indexed instrument columns.
+    data = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    if payload.get('external_id'):
+        return {'external_id': payload['external_id']}
+    qr_id = payload.get('qr_id') or data.get('qr_id')
+    if qr_id:
+        return {'xendit_qr_id': qr_id}
+    if payload.get('account_number'):
+        lookup = {'va_account_number': str(payload['account_number'])}
+        if payload.get('bank_code'):
+            lookup['va_bank_code'] = payload['bank_code']
+        return lookup
+    return None
+
+
+def _mark_done(event, external_id, raw_status, transaction=None):
+    event.external_id = external_id
+    event.status = raw_status
+    event.transaction = transaction
+    event.state = 'DONE'
+    event.outcome = 'IGNORED'
+    event.last_error = ''
+    event.processed_at = timezone.now()
+
+
+def _save_event(event):
+    # Returns False when a concurrent delivery of the same event won the
+    # insert.
+    try:
+        with db_transaction.atomic():
+            event.save()
+    except IntegrityError:
+        log_event(logger, 'callback.duplicate', sampled=True, event_key=event.event_key)
+        return False
+    return True
+
+
+def _apply_callback(payload, event):
+    lookup = transaction_lookup(payload)
+    if lookup is None:
+        logger.error("No external_id, QR id or VA account number in callback payload")
+        return 400
+
+    raw_status = callback_status(payload)
+    status = CALLBACK_STATUS_MAP.get(raw_status)
+
+    with db_transaction.atomic():
+        transaction = (
+            Transaction.objects.select_for_update().select_related('package')
+            .filter(**lookup).order_by('-created_at').first()
+        )
+        if transaction is None:
+            if 'va_account_number' not in lookup and is_archived(**lookup):
+                # Only long-settled transactions are archived; acknowledge
+                # so Xendit stops redelivering, and close a queued event.
+                log_event(logger, 'callback.archived', logging.WARNING, raw_status=raw_status, **lookup)
+                _mark_done(event, str(lookup.get('external_id') or '')[:255], raw_status)
+                _save_event(event)
+                return 200
+            log_event(logger, 'callback.unmatched', logging.ERROR, raw_status=raw_status, **lookup)
+            return 404
+
+        external_id = transaction.external_id
+
+        _mark_done(event, external_id, raw_status, transaction)
+
+        if status is None and raw_status in WAITING_STATUSES:
+            log_event(logger, 'callback.waiting', sampled=True, external_id=external_id, raw_status=raw_status)
+        elif status is None:
+            log_event(logger, 'callback.unknown_status', logging.WARNING, external_id=external_id, raw_status=raw_status)
+        elif not transaction.can_transition_to(status):
+            log_event(
+                logger, 'callback.ignored', sampled=True,
+                external_id=external_id,
+                raw_status=raw_status,
+                current_status=transaction.status,
+            )
+        else:
+            event.outcome = 'APPLIED'
+
+        if not _save_event(event) or event.outcome != 'APPLIED':
+            return 200
+
+        transaction.xendit_callback_data = payload
+        transaction.status = status
+        access = None
+
+        if status == 'PAID':
+            transaction.paid_at = timezone.now()
+            transaction.payment_method = payload.get('payment_method', payload.get('payment_channel', '')).upper()
+            if payload.get('callback_virtual_account_id') and payload.get('payment_id'):
+                # Lets the VA payment be looked up again by its id.
+                transaction.xendit_payment_id = payload['payment_id']
+
+            user_access, created = UserAccess.objects.update_or_create(
+                session_key=transaction.session_key,
+                defaults=transaction.access_defaults()
+            )
+            access = 'created' if created else 'updated'
+
+        transaction.save()
+
+        # Every applied state change is logged, unsampled.
+        log_event(
+            logger, 'callback.applied',
+            external_id=external_id,
+            status=status,
+            raw_status=raw_status,
+            payment_method=transaction.payment_method,
+            access=access,
+        )
+
+    return 200
+
+
+# Applies a Xendit callback payload inline and returns the HTTP status to
+# answer with. Duplicate deliveries are acknowledged after a single indexed
+# lookup with no writes; callbacks that would move a transaction backwards
+# (e.g. a late EXPIRED after PAID) are recorded but not applied.
+def process_callback(payload, raw_body=None):
+    if not isinstance(payload, dict):
+        logger.error("Callback payload is not a JSON object")
+        return 400
+
+    key = event_key(payload, raw_body)
+    if WebhookEvent.objects.filter(event_key=key).exists():
+        log_event(logger, 'callback.duplicate', sampled=True, event_key=key)
+        return 200
+
+    return _apply_callback(payload, WebhookEvent(event_key=key))
+
+
+# Queue mode: store the raw body and answer straight away. The
+# process_webhooks command applies queued events with process_queue().
+def enqueue_callback(raw_body):
+    payload = json.loads(raw_body.decode('utf-8'))
+    if not isinstance(payload, dict):
+        logger.error("Callback payload is not a JSON object")
+        return 400
+
+    key = event_key(payload, raw_body)
+    if WebhookEvent.objects.filter(event_key=key).exists():
+        log_event(logger, 'callback.duplicate', sampled=True, event_key=key)
+        return 200
+
+    try:
+        with db_transaction.atomic():
+            WebhookEvent.objects.create(
+                event_key=key,
+                external_id=str(payload.get('external_id') or '')[:255],
+                status=callback_status(payload)[:50],
+                state='QUEUED',
+                payload=raw_body.decode('utf-8'),
+                next_attempt_at=timezone.now(),
+            )
+    except IntegrityError:
+        log_event(logger, 'callback.duplicate', sampled=True, event_key=key)
+    return 200
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, 'WEBHOOK_RETRY_BASE_SECONDS', 5)
+    cap = getattr(settings, 'WEBHOOK_RETRY_MAX_SECONDS', 600)
+    delay = min(cap, base * (2 ** (attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim_batch(batch_size):
+    # Claimed rows get a lease: if the worker dies mid-batch they become
+    # claimable again once next_attempt_at passes.
+    now = timezone.now()
+    lease = timezone.timedelta(seconds=getattr(settings, 'WEBHOOK_LEASE_SECONDS', 300))
+    with db_transaction.atomic():
+        ids = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(state__in=['QUEUED', 'PROCESSING'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        WebhookEvent.objects.filter(id__in=ids).update(
+            state='PROCESSING',
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + lease,
+        )
+    return list(WebhookEvent.objects.filter(id__in=ids).order_by('id'))
+
+
+def _fail(event, error, permanent=False):
+    max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 8)
+    event.last_error = error
+    if permanent or event.attempts >= max_attempts:
+        event.state = 'DEAD'
+        event.next_attempt_at = None
+        log_event(
+            logger, 'webhook.dead_letter', logging.ERROR,
+            event_key=event.event_key, attempts=event.attempts, error=error,
+        )
+    else:
+        event.state = 'QUEUED'
+        event.next_attempt_at = timezone.now() + timezone.timedelta(seconds=_retry_delay(event.attempts))
+        log_event(
+            logger, 'webhook.retry', logging.WARNING,
+            event_key=event.event_key, attempts=event.attempts, error=error,
+        )
+    event.save(update_fields=['state', 'last_error', 'next_attempt_at'])
+
+
+def process_queue(batch_size=None):
+    batch_size = batch_size or getattr(settings, 'WEBHOOK_BATCH_SIZE', 50)
+    counts = Counter()
+
+    for event in claim_batch(batch_size):
+        try:
+            payload = json.loads(event.payload)
+        except json.JSONDecodeError as e:
+            _fail(event, f"Invalid JSON: {e}", permanent=True)
+            counts['dead'] += 1
+            continue
+        if not isinstance(payload, dict):
+            _fail(event, "Payload is not a JSON object", permanent=True)
+            counts['dead'] += 1
+            continue
+
+        try:
+            status_code = _apply_callback(payload, event)
+        except Exception as e:
+            status_code = None
+            error = str(e)
+        else:
+            error = f"HTTP {status_code}"
+
+        if status_code == 200:
+            counts['done'] += 1
+        else:
+            # 400 means the payload can never be applied; anything else
+            # (missing transaction, DB errors) is worth retrying.
+            _fail(event, error, permanent=status_code == 400)
+            counts['dead' if event.state == 'DEAD' else 'retried'] += 1
+
+    return counts